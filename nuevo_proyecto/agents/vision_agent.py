@@ -1,71 +1,54 @@
-import cv2
 import os
-import numpy as np
-from PIL import Image
-import io
+from agents.vision_index import LSHMatcher, compute_descriptors, descriptors_from_image
+from services.cpu_executor import run_cpu
+from services.model_registry import model_registry
 
+# votos mínimos (descriptores que pasan el test de Lowe) para aceptar un producto
+VISION_MIN_VOTES = int(os.getenv("VISION_MIN_VOTES", "15"))
 
-DATASET_PATH = "imagenes_productos"
 
+def get_matcher() -> LSHMatcher:
+    # índice LSH sobre vision_index/, armado una sola vez por proceso
+    return model_registry.get("vision_matcher")
 
-def load_dataset_features():
-    features = {}
 
-    orb = cv2.ORB_create()
+def detect_product_candidates(image_bytes, top_k: int = 3) -> list[dict]:
+    """
+    Productos más parecidos a la foto:
+    [{"product": ..., "votes": ..., "score": ...}], de mayor a menor.
+    """
+    # mismo decodificado y ORB que las fotos del dataset
+    descriptors = compute_descriptors(image_bytes)
 
-    for product_name in os.listdir(DATASET_PATH):
-        product_path = os.path.join(DATASET_PATH, product_name)
-
-        if not os.path.isdir(product_path):
-            continue
-
-        descriptors_list = []
-
-        for img_name in os.listdir(product_path):
-            img_path = os.path.join(product_path, img_name)
-
-            img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-            if img is None:
-                continue
+    if descriptors is None:
+        return []
 
-            keypoints, descriptors = orb.detectAndCompute(img, None)
-            if descriptors is not None:
-                descriptors_list.append(descriptors)
+    return get_matcher().query(descriptors, top_k)
 
-        if descriptors_list:
-            features[product_name] = np.vstack(descriptors_list)
 
-    return features
+def detect_candidates_from_image(img, top_k: int = 3) -> list[dict]:
+    # misma búsqueda sobre una imagen ya decodificada
+    descriptors = descriptors_from_image(img)
 
+    if descriptors is None:
+        return []
 
-DATASET_FEATURES = load_dataset_features()
+    return get_matcher().query(descriptors, top_k)
 
 
 def detect_product_by_image(image_bytes):
-    image = Image.open(io.BytesIO(image_bytes))
-    img = np.array(image)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    candidates = detect_product_candidates(image_bytes, top_k=1)
 
-    orb = cv2.ORB_create()
-    keypoints, descriptors = orb.detectAndCompute(gray, None)
+    if candidates and candidates[0]["votes"] >= VISION_MIN_VOTES:
+        return candidates[0]["product"]
 
-    if descriptors is None:
-        return None
-
-    bf = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=True)
-
-    best_match = None
-    best_score = 0
+    return None
 
-    for product, dataset_desc in DATASET_FEATURES.items():
-        matches = bf.match(descriptors, dataset_desc)
-        score = len(matches)
 
-        if score > best_score:
-            best_score = score
-            best_match = product
+async def detect_product_candidates_async(image_bytes, top_k: int = 3) -> list[dict]:
+    # ORB y matching fuera del event loop
+    return await run_cpu(detect_product_candidates, image_bytes, top_k)
 
-    if best_score > 20:
-        return best_match
 
-    return None
+async def detect_product_by_image_async(image_bytes):
+    return await run_cpu(detect_product_by_image, image_bytes)
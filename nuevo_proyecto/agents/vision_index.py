@@ -0,0 +1,360 @@
+"""
+Índice en disco de descriptores ORB del dataset de productos.
+
+Los descriptores de todas las imágenes de imagenes_productos/ se guardan
+en un solo descriptors.npy (uint8, N x 32) que se abre con memory
+mapping, y manifest.json indica qué filas pertenece a cada producto y
+con qué archivos (mtime, tamaño, sha1) se calcularon. Al reconstruir
+solo se recalculan las carpetas que cambiaron.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from ocr.image_ingest import MAX_IMAGE_SIDE, decode_bounded
+
+DATASET_PATH = os.getenv("VISION_DATASET_PATH", "imagenes_productos")
+VISION_INDEX_DIR = os.getenv("VISION_INDEX_DIR", "vision_index")
+
+# cambiar si cambian los parámetros de ORB o del decodificado
+INDEX_VERSION = f"orb-v1-{MAX_IMAGE_SIDE}"
+
+DESCRIPTOR_SIZE = 32
+
+# parámetros del índice LSH de FLANN para descriptores binarios;
+# key_size 20 mantiene los buckets chicos con cientos de miles de filas
+FLANN_INDEX_LSH = 6
+LSH_INDEX_PARAMS = {
+    "algorithm": FLANN_INDEX_LSH,
+    "table_number": 6,
+    "key_size": 20,
+    "multi_probe_level": 1,
+}
+LSH_SEARCH_PARAMS = {"checks": 50}
+
+# test de Lowe: el vecino más cercano debe ser claramente mejor que el segundo
+RATIO_TEST = float(os.getenv("VISION_RATIO_TEST", "0.75"))
+
+
+# =========================
+# Descriptores
+# =========================
+def compute_descriptors(image_bytes: bytes, orb=None) -> np.ndarray | None:
+    img = decode_bounded(image_bytes, grayscale=True)
+    if img is None:
+        return None
+
+    return descriptors_from_image(img, orb)
+
+
+def descriptors_from_image(img, orb=None) -> np.ndarray | None:
+    # acepta una imagen ya decodificada (color o grises)
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    orb = orb or cv2.ORB_create()
+    _, descriptors = orb.detectAndCompute(img, None)
+
+    return descriptors
+
+
+def _file_info(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def _sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# =========================
+# Índice
+# =========================
+class VisionIndex:
+    """
+    descriptors: matriz (posiblemente memory-mapped) con todas las filas.
+    products: {producto: {"offset", "count", "files"}}
+    """
+
+    def __init__(self, descriptors: np.ndarray, products: dict):
+        self.descriptors = descriptors
+        self.products = products
+
+    def features(self) -> dict[str, np.ndarray]:
+        # vistas sobre el mmap, no copias
+        return {
+            name: self.descriptors[p["offset"] : p["offset"] + p["count"]]
+            for name, p in self.products.items()
+            if p["count"]
+        }
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+
+def _paths(index_dir: str) -> tuple[str, str]:
+    return (
+        os.path.join(index_dir, "descriptors.npy"),
+        os.path.join(index_dir, "manifest.json"),
+    )
+
+
+def load_index(index_dir: str = VISION_INDEX_DIR) -> VisionIndex | None:
+    descriptors_path, manifest_path = _paths(index_dir)
+
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+        if manifest.get("version") != INDEX_VERSION:
+            return None
+
+        products = manifest["products"]
+        descriptors = np.load(descriptors_path, mmap_mode="r")
+
+        rows = sum(p["count"] for p in products.values())
+        if descriptors.ndim != 2 or descriptors.shape != (rows, DESCRIPTOR_SIZE):
+            return None
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        # manifiesto roto o a medio escribir: se reconstruye
+        return None
+
+    return VisionIndex(descriptors, products)
+
+
+def _folder_files(product_path: str) -> dict[str, dict]:
+    files = {}
+
+    for img_name in sorted(os.listdir(product_path)):
+        img_path = os.path.join(product_path, img_name)
+        if os.path.isfile(img_path):
+            files[img_name] = _file_info(img_path)
+
+    return files
+
+
+def _folder_unchanged(product_path: str, files: dict, previous: dict | None) -> bool:
+    """
+    Compara por mtime y tamaño; si solo cambió el mtime
+    (copia, checkout) se confirma con el sha1.
+    """
+    if previous is None or set(files) != set(previous["files"]):
+        return False
+
+    for img_name, info in files.items():
+        old = previous["files"][img_name]
+
+        if info["size"] != old["size"]:
+            return False
+
+        if info["mtime"] != old["mtime"]:
+            if _sha1(os.path.join(product_path, img_name)) != old.get("sha1"):
+                return False
+
+    return True
+
+
+def build_index(
+    dataset_path: str = DATASET_PATH,
+    index_dir: str = VISION_INDEX_DIR,
+    force: bool = False,
+) -> dict:
+    """
+    Reconstruye el índice recalculando solo las carpetas nuevas o
+    modificadas. Devuelve qué productos se recalcularon, reutilizaron
+    o eliminaron.
+    """
+    previous = None if force else load_index(index_dir)
+    previous_products = previous.products if previous is not None else {}
+
+    orb = cv2.ORB_create()
+    blocks = []
+    products = {}
+    report = {"rebuilt": [], "reused": [], "removed": []}
+    offset = 0
+
+    for product_name in sorted(os.listdir(dataset_path)):
+        product_path = os.path.join(dataset_path, product_name)
+
+        if not os.path.isdir(product_path):
+            continue
+
+        files = _folder_files(product_path)
+        old = previous_products.get(product_name)
+
+        if _folder_unchanged(product_path, files, old):
+            block = previous.descriptors[old["offset"] : old["offset"] + old["count"]]
+            for img_name, info in files.items():
+                info["sha1"] = old["files"][img_name].get("sha1")
+            report["reused"].append(product_name)
+        else:
+            descriptors_list = []
+
+            for img_name, info in files.items():
+                img_path = os.path.join(product_path, img_name)
+
+                with open(img_path, "rb") as f:
+                    data = f.read()
+
+                info["sha1"] = hashlib.sha1(data).hexdigest()
+
+                descriptors = compute_descriptors(data, orb)
+                if descriptors is not None:
+                    descriptors_list.append(descriptors)
+
+            block = (
+                np.vstack(descriptors_list)
+                if descriptors_list
+                else np.empty((0, DESCRIPTOR_SIZE), dtype=np.uint8)
+            )
+            report["rebuilt"].append(product_name)
+
+        blocks.append(block)
+        products[product_name] = {
+            "offset": offset,
+            "count": len(block),
+            "files": files,
+        }
+        offset += len(block)
+
+    report["removed"] = sorted(set(previous_products) - set(products))
+
+    if previous is not None and not report["rebuilt"] and not report["removed"]:
+        # nada cambió: solo se actualizan los mtime del manifiesto
+        _write_manifest(index_dir, products)
+        return report
+
+    descriptors = (
+        np.vstack(blocks) if blocks else np.empty((0, DESCRIPTOR_SIZE), dtype=np.uint8)
+    )
+    _write_index(index_dir, descriptors, products)
+
+    return report
+
+
+def _write_manifest(index_dir: str, products: dict):
+    _, manifest_path = _paths(index_dir)
+    tmp_path = manifest_path + ".tmp"
+
+    with open(tmp_path, "w") as f:
+        json.dump({"version": INDEX_VERSION, "products": products}, f)
+
+    os.replace(tmp_path, manifest_path)
+
+
+def _write_index(index_dir: str, descriptors: np.ndarray, products: dict):
+    os.makedirs(index_dir, exist_ok=True)
+    descriptors_path, _ = _paths(index_dir)
+
+    # escribir aparte y reemplazar: quien tenga el mmap abierto no se entera
+    tmp_path = descriptors_path + ".tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(descriptors, dtype=np.uint8))
+    os.replace(tmp_path, descriptors_path)
+
+    _write_manifest(index_dir, products)
+
+
+def load_or_build_index(
+    dataset_path: str = DATASET_PATH, index_dir: str = VISION_INDEX_DIR
+) -> VisionIndex:
+    """
+    Abre el índice guardado; si falta o el dataset cambió,
+    lo actualiza primero (solo las carpetas modificadas).
+    """
+    if os.path.isdir(dataset_path):
+        report = build_index(dataset_path, index_dir)
+
+        if report["rebuilt"] or report["removed"]:
+            print(
+                "Índice de visión actualizado:",
+                f"{len(report['rebuilt'])} recalculados,",
+                f"{len(report['reused'])} reutilizados,",
+                f"{len(report['removed'])} eliminados",
+            )
+
+    index = load_index(index_dir)
+    if index is None:
+        return VisionIndex(np.empty((0, DESCRIPTOR_SIZE), dtype=np.uint8), {})
+
+    return index
+
+
+# =========================
+# Búsqueda aproximada (LSH)
+# =========================
+class LSHMatcher:
+    """
+    Un solo índice LSH con los descriptores de todos los productos.
+    Cada fila sabe a qué producto pertenece; cada descriptor de la
+    consulta que pasa el test de Lowe vota por el producto de su vecino.
+
+    El índice se arma directamente sobre la matriz memory-mapped, sin
+    copiar los descriptores; solo las tablas hash viven en memoria.
+    """
+
+    def __init__(self, index: VisionIndex):
+        self.names = sorted(n for n, p in index.products.items() if p["count"])
+        self.descriptors = index.descriptors
+        self.labels = np.full(len(index.descriptors), -1, dtype=np.int32)
+        self.flann = None
+
+        # el índice de FLANN no garantiza búsquedas concurrentes seguras
+        self._lock = threading.Lock()
+
+        if not self.names:
+            return
+
+        for label, name in enumerate(self.names):
+            p = index.products[name]
+            self.labels[p["offset"] : p["offset"] + p["count"]] = label
+
+        # se mantiene la referencia al mmap: FLANN lee las filas desde ahí
+        self.flann = cv2.flann_Index(self.descriptors, LSH_INDEX_PARAMS)
+
+    def query(
+        self, descriptors: np.ndarray, top_k: int = 3, ratio: float = RATIO_TEST
+    ) -> list[dict]:
+        """
+        Devuelve hasta top_k productos con sus votos y un puntaje
+        (fracción de descriptores de la consulta que votaron por él).
+        """
+        if self.flann is None or descriptors is None or len(descriptors) == 0:
+            return []
+
+        with self._lock:
+            ids, distances = self.flann.knnSearch(
+                descriptors, 2, params=LSH_SEARCH_PARAMS
+            )
+
+        # LSH puede no encontrar vecinos: quedan con índice -1
+        best, second = ids[:, 0], ids[:, 1]
+        keep = best >= 0
+        keep &= (second < 0) | (distances[:, 0] < ratio * distances[:, 1])
+
+        labels = self.labels[best[keep]]
+        votes = np.bincount(labels[labels >= 0], minlength=len(self.names))
+
+        k = min(top_k, int(np.count_nonzero(votes)))
+        if k == 0:
+            return []
+
+        top = np.argsort(-votes, kind="stable")[:k]
+
+        return [
+            {
+                "product": self.names[label],
+                "votes": int(votes[label]),
+                "score": float(votes[label]) / len(descriptors),
+            }
+            for label in top
+        ]
+
+
+def load_matcher() -> LSHMatcher:
+    return LSHMatcher(load_or_build_index())
@@ -12,6 +12,7 @@ from sqlalchemy import (
     Boolean,
     Date,
     DateTime,
+    Index,
     Integer,
     Numeric,
     SmallInteger,
@@ -21,6 +22,8 @@ from sqlalchemy import (
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from database.trigram import trigram_index_enabled
+
 
 class Base(DeclarativeBase):
     """Base class for SQLAlchemy models."""
@@ -36,7 +39,22 @@ class ProductStock(Base):
     """
 
     __tablename__ = "product_stocks"
-    __table_args__ = {"schema": "public"}
+    __table_args__ = (
+        # Trigram indexes for fuzzy search; skipped when pg_trgm is missing
+        Index(
+            "ix_product_stocks_product_name_trgm",
+            "product_name",
+            postgresql_using="gin",
+            postgresql_ops={"product_name": "gin_trgm_ops"},
+        ).ddl_if(callable_=trigram_index_enabled),
+        Index(
+            "ix_product_stocks_brand_trgm",
+            "brand",
+            postgresql_using="gin",
+            postgresql_ops={"brand": "gin_trgm_ops"},
+        ).ddl_if(callable_=trigram_index_enabled),
+        {"schema": "public"},
+    )
 
     # Primary key
     id: Mapped[UUID] = mapped_column(
@@ -0,0 +1,41 @@
+"""
+pg_trgm helpers shared by both ProductStock models and the startup code.
+
+Creating the extension needs superuser or database-owner rights. It is
+attempted, not required: without it the GIN trigram indexes are skipped
+and ProductService.search_products falls back to the in-memory catalog.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+
+def has_pg_trgm(bind) -> bool:
+    """True when pg_trgm is installed in the database of this connection."""
+    row = bind.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    ).first()
+    return row is not None
+
+
+def trigram_index_enabled(ddl, target, bind, **kw) -> bool:
+    """ddl_if hook: only emit CREATE INDEX ... gin_trgm_ops when pg_trgm exists."""
+    return (
+        bind is not None
+        and bind.dialect.name == "postgresql"
+        and has_pg_trgm(bind)
+    )
+
+
+async def ensure_pg_trgm(conn) -> bool:
+    """
+    Try to enable pg_trgm inside a savepoint so a permission error does
+    not abort the surrounding transaction. Returns whether it is available.
+    """
+    try:
+        async with conn.begin_nested():
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        return True
+    except DBAPIError as e:
+        print("⚠️ No se pudo habilitar pg_trgm, búsqueda difusa en memoria:", e)
+        return False
@@ -1,6 +1,9 @@
 import streamlit as st
 import httpx
 import base64
+import json
+import time
+from websockets.sync.client import connect
 
 # =========================
 # Configuración general
@@ -8,6 +11,11 @@ import base64
 st.set_page_config(page_title="Inventario IA", layout="wide")
 
 URL_GRAPHQL = "http://localhost:8000/graphql"
+URL_GRAPHQL_WS = "ws://localhost:8000/graphql"
+
+# los trabajos de detección se consultan cada DETECTION_POLL_SECONDS
+DETECTION_POLL_SECONDS = 1.0
+DETECTION_MAX_WAIT_SECONDS = 300
 
 # =========================
 # Estado del chat
@@ -24,6 +32,10 @@ if "register_images" not in st.session_state:
 if "last_photo" not in st.session_state:
     st.session_state.last_photo = None
 
+# trabajo de detección cuyo producto se confirma desde el chat
+if "detection_job_id" not in st.session_state:
+    st.session_state.detection_job_id = None
+
 # =========================
 # Estilos tipo ChatGPT
 # =========================
@@ -90,6 +102,7 @@ def run_query(query: str, variables=None):
                 json={"query": query, "variables": variables},
                 timeout=60.0,
             )
+            response.raise_for_status()
             return response.json()
     except Exception as e:
         st.error("❌ Error de conexión con el backend")
@@ -98,31 +111,168 @@ def run_query(query: str, variables=None):
 
 
 REPLY_AGENT_MUTATION = """
-mutation ReplyAgent($msg: String!) {
-  replyToAgent(message: $msg)
+mutation ReplyAgent($msg: String!, $jobId: String) {
+  replyToAgent(message: $msg, detectionJobId: $jobId)
+}
+"""
+
+REPLY_AGENT_SUBSCRIPTION = """
+subscription ReplyAgentStream($msg: String!, $jobId: String) {
+  replyToAgentStream(message: $msg, detectionJobId: $jobId)
 }
 """
 
 
 # =========================
-# Función analizar imagen
+# Suscripción GraphQL (streaming)
 # =========================
-def analyze_image(image_bytes):
-    img_b64 = base64.b64encode(image_bytes).decode()
+def stream_subscription(query: str, field: str, variables=None):
+    """
+    Genera los fragmentos de una suscripción GraphQL a medida que llegan
+    (protocolo graphql-transport-ws).
+    """
+    with connect(
+        URL_GRAPHQL_WS, subprotocols=["graphql-transport-ws"], open_timeout=10
+    ) as ws:
+        ws.send(json.dumps({"type": "connection_init"}))
+
+        if json.loads(ws.recv(timeout=10)).get("type") != "connection_ack":
+            raise ConnectionError("El backend no aceptó la conexión")
+
+        ws.send(
+            json.dumps(
+                {
+                    "id": "1",
+                    "type": "subscribe",
+                    "payload": {"query": query, "variables": variables},
+                }
+            )
+        )
+
+        for raw in ws:
+            message = json.loads(raw)
+
+            if message["type"] == "next":
+                payload = message["payload"]
+                if payload.get("errors"):
+                    raise RuntimeError(payload["errors"])
+                yield payload["data"][field]
+
+            elif message["type"] == "error":
+                raise RuntimeError(message.get("payload"))
+
+            elif message["type"] == "complete":
+                break
+
+
+def agent_bubble(content: str) -> str:
+    return f"""
+        <div style="
+            background:#1f2937;
+            color:white;
+            padding:10px;
+            border-radius:12px;
+            margin:6px 0;
+            max-width:70%;">
+            {content}
+        </div>
+        """
+
+
+# =========================
+# Detección en segundo plano
+# =========================
+REGISTER_VIEWS = ["front", "side_left", "side_right"]
+
+
+SUBMIT_DETECTION_MUTATION = """
+mutation SubmitDetection($images: [ProductImageInput!]!) {
+  submitProductDetection(images: $images) { id status }
+}
+"""
+
+DETECTION_JOB_QUERY = """
+query DetectionJob($id: String!) {
+  detectionJob(id: $id) { status result error product { name } }
+}
+"""
+
+
+def graphql_error(res) -> str | None:
+    errors = res.get("errors") if res else None
+    if errors:
+        return "; ".join(e.get("message", str(e)) for e in errors)
+    return None
+
+
+def wait_for_job(job_id: str):
+    """
+    Consulta el trabajo hasta que termina. Cada consulta es corta, así
+    una detección lenta no choca con el timeout de la conexión.
+    Devuelve None si no terminó a tiempo.
+    """
+    deadline = time.monotonic() + DETECTION_MAX_WAIT_SECONDS
+
+    while time.monotonic() < deadline:
+        res = run_query(DETECTION_JOB_QUERY, {"id": job_id})
+
+        if res is None:
+            return {"status": "error", "error": "sin conexión con el backend"}
+
+        error = graphql_error(res)
+        if error:
+            return {"status": "error", "error": error}
+
+        job = (res.get("data") or {}).get("detectionJob")
+
+        if job is None:
+            return {"status": "error", "error": "el trabajo ya no existe"}
+
+        if job["status"] in ("done", "error"):
+            return job
+
+        time.sleep(DETECTION_POLL_SECONDS)
+
+    return None
 
-    mutation = """
-    mutation Detect($img: String!) {
-      detectProductFromImage(image: $img)
-    }
+
+def detect_product(images: dict[str, bytes]):
+    """
+    Encola la detección de las vistas {vista: bytes}, espera el trabajo
+    y deja el producto pendiente de confirmar con su id.
     """
+    payload = [
+        {"imageType": view, "image": base64.b64encode(img).decode()}
+        for view, img in images.items()
+    ]
+
+    res = run_query(SUBMIT_DETECTION_MUTATION, {"images": payload})
+    data = (res.get("data") or {}) if res else {}
+
+    if not data.get("submitProductDetection"):
+        st.error(graphql_error(res) or "❌ Error al analizar las imágenes")
+        return
+
+    job_id = data["submitProductDetection"]["id"]
 
-    res = run_query(mutation, {"img": img_b64})
+    with st.spinner("🔍 Analizando las imágenes del producto..."):
+        job = wait_for_job(job_id)
 
-    if res and res.get("data"):
-        response_text = res["data"]["detectProductFromImage"]
-        st.session_state.chat.append({"role": "agent", "content": response_text})
+    if job is None:
+        st.error("❌ El análisis de las imágenes no terminó a tiempo")
+    elif job["status"] == "error":
+        st.error(f"❌ Error al analizar las imágenes: {job['error']}")
     else:
-        st.error("❌ Error al analizar la imagen")
+        st.session_state.detection_job_id = job_id if job["product"] else None
+        st.session_state.chat.append({"role": "agent", "content": job["result"]})
+
+
+def analyze_image(image_bytes):
+    detect_product({"front": image_bytes})
+
+
+def analyze_images(images_bytes):
+    detect_product(dict(zip(REGISTER_VIEWS, images_bytes)))
 
 
 # =========================
@@ -162,20 +312,7 @@ with main_left:
                         unsafe_allow_html=True,
                     )
                 else:
-                    st.markdown(
-                        f"""
-                        <div style="
-                            background:#1f2937;
-                            color:white;
-                            padding:10px;
-                            border-radius:12px;
-                            margin:6px 0;
-                            max-width:70%;">
-                            {msg["content"]}
-                        </div>
-                        """,
-                        unsafe_allow_html=True,
-                    )
+                    st.markdown(agent_bubble(msg["content"]), unsafe_allow_html=True)
 
         # barra de escritura dentro del mismo panel
         col_input, col_file, col_send = st.columns([6, 1, 1])
@@ -272,7 +409,7 @@ if send_clicked:
                     }
                 )
 
-                analyze_image(st.session_state.register_images[0])
+                analyze_images(st.session_state.register_images)
 
                 st.session_state.register_mode = False
                 st.session_state.register_images = []
@@ -290,13 +427,40 @@ if send_clicked:
     elif user_text:
 
         st.session_state.chat.append({"role": "user", "content": user_text})
+        variables = {"msg": user_text, "jobId": st.session_state.detection_job_id}
 
-        res = run_query(REPLY_AGENT_MUTATION, {"msg": user_text})
-
-        if res and res.get("data"):
-            response_text = res["data"]["replyToAgent"]
+        # mostrar la respuesta a medida que el agente la genera
+        response_text = ""
+        streaming_failed = False
+        with chat_messages:
+            placeholder = st.empty()
+
+        try:
+            for token in stream_subscription(
+                REPLY_AGENT_SUBSCRIPTION, "replyToAgentStream", variables
+            ):
+                response_text += token
+                placeholder.markdown(agent_bubble(response_text), unsafe_allow_html=True)
+        except Exception as e:
+            print("ERROR streaming:", e)
+            streaming_failed = True
+
+        # sin streaming: respuesta completa por la mutación. Si ya llegó
+        # parte de la respuesta el mensaje se procesó; reenviarlo podría
+        # repetir una acción como "guardar producto"
+        if streaming_failed and response_text:
+            response_text += "\n\n⚠️ La respuesta se interrumpió."
+        elif not response_text:
+            res = run_query(REPLY_AGENT_MUTATION, variables)
+            if res and res.get("data"):
+                response_text = res["data"]["replyToAgent"]
+
+        if response_text:
             st.session_state.chat.append({"role": "agent", "content": response_text})
 
+            if response_text.startswith("✅ Producto registrado"):
+                st.session_state.detection_job_id = None
+
             if "imagen frontal" in response_text.lower():
                 st.session_state.register_mode = True
                 st.session_state.register_images = []
@@ -0,0 +1,210 @@
+"""
+Caché de respuestas de la IA.
+
+LRU en memoria con expiración (TTL) y, opcionalmente, un archivo SQLite
+local para que las entradas sobrevivan a un reinicio. La clave combina
+el texto normalizado, el modelo y la versión del prompt.
+
+Desde código async se usan aget/aset: la memoria se consulta en el
+event loop y el archivo SQLite en un hilo.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+
+# vacío = solo memoria
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+
+
+def make_cache_key(text: str, model: str, prompt_version: str) -> str:
+    normalized = " ".join(text.lower().split())
+    raw = f"{model}|{prompt_version}|{normalized}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# =========================
+# Respaldo en SQLite
+# =========================
+class SQLiteCacheBackend:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self.purge_expired()
+
+    def get(self, key: str) -> tuple[str, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None or row[1] < time.time():
+            return None
+
+        return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),)
+            )
+            self._conn.commit()
+
+
+# =========================
+# LRU con TTL
+# =========================
+class TTLCache:
+
+    def __init__(
+        self,
+        maxsize: int = LLM_CACHE_SIZE,
+        ttl: float = LLM_CACHE_TTL,
+        backend: SQLiteCacheBackend | None = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+
+        self._data: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def get(self, key: str):
+        """
+        Devuelve el valor guardado o None si no existe o ya expiró.
+        """
+        value = self._get_memory(key)
+
+        if value is None and self.backend is not None:
+            value = self._get_backend(key)
+
+        if value is None:
+            self._count_miss()
+
+        return value
+
+    async def aget(self, key: str):
+        value = self._get_memory(key)
+
+        if value is None and self.backend is not None:
+            value = await asyncio.to_thread(self._get_backend, key)
+
+        if value is None:
+            self._count_miss()
+
+        return value
+
+    def set(self, key: str, value):
+        raw, expires_at = self._set_memory(key, value)
+
+        if self.backend is not None:
+            self.backend.set(key, raw, expires_at)
+
+    async def aset(self, key: str, value):
+        raw, expires_at = self._set_memory(key, value)
+
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, key, raw, expires_at)
+
+    def _get_memory(self, key: str):
+        now = time.time()
+
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is not None and item[1] >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return json.loads(item[0])
+
+            if item is not None:
+                del self._data[key]
+
+        return None
+
+    def _get_backend(self, key: str):
+        stored = self.backend.get(key)
+        if stored is None:
+            return None
+
+        with self._lock:
+            self._store(key, stored[0], stored[1])
+            self.hits += 1
+            self.disk_hits += 1
+
+        return json.loads(stored[0])
+
+    def _count_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def _set_memory(self, key: str, value) -> tuple[str, float]:
+        raw = json.dumps(value)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._store(key, raw, expires_at)
+
+        return raw, expires_at
+
+    def _store(self, key: str, raw: str, expires_at: float):
+        self._data[key] = (raw, expires_at)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def build_default_cache() -> TTLCache:
+    backend = SQLiteCacheBackend(LLM_CACHE_PATH) if LLM_CACHE_PATH else None
+    return TTLCache(backend=backend)
+
+
+llm_cache = build_default_cache()
@@ -1,6 +1,13 @@
-import httpx
 import base64
+import json
+import os
 from difflib import get_close_matches
+from llm.cache import TTLCache, llm_cache, make_cache_key
+from llm.http_client import get_http_client
+from llm.singleflight import llm_singleflight, make_flight_key
+from llm.scheduler import LLMQueueFull, Priority, llm_scheduler
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
 
 KNOWN_PRODUCTS = [
     "ricacao",
@@ -42,29 +49,102 @@ Reglas de comportamiento:
 6. Siempre responde en español.
 """
 
+BUSY_MESSAGE = "⚠️ La IA está ocupada en este momento, intenta nuevamente en unos segundos."
+
+# Cambiar la versión cuando se modifique el prompt invalida la caché
+ENTITIES_PROMPT_VERSION = "v1"
+PRODUCT_ENTITIES_PROMPT_VERSION = "v1"
+
 
 class LLMClient:
-    def __init__(self):
-        self.url = "http://localhost:11434/api/generate"
+    def __init__(self, cache: TTLCache | None = None):
+        self.url = OLLAMA_URL
         self.model = "mistral"
+        self.cache = cache if cache is not None else llm_cache
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
 
     # =========================
     # Método interno para llamar a Ollama
     # =========================
-    async def _call_ollama(self, prompt: str) -> str:
+    async def _generate(
+        self,
+        prompt: str,
+        model: str | None = None,
+        priority: Priority = Priority.SMALL_TALK,
+    ) -> str:
+        model = model or self.model
+
+        # llamadas idénticas en curso comparten una sola generación
+        return await llm_singleflight.do(
+            make_flight_key(prompt, model, priority),
+            lambda: self._post_generate(prompt, model, priority),
+        )
+
+    async def _post_generate(self, prompt: str, model: str, priority: Priority) -> str:
+        async with llm_scheduler.slot(priority):
+            client = get_http_client()
+            response = await client.post(
+                self.url,
+                json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": False,
+                },
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data.get("response", "").strip()
+
+    async def _stream_generate(
+        self,
+        prompt: str,
+        model: str | None = None,
+        priority: Priority = Priority.SMALL_TALK,
+    ):
+        """
+        Consume la respuesta NDJSON de Ollama con "stream": True
+        y entrega cada fragmento de texto apenas llega.
+        """
+        async with llm_scheduler.slot(priority):
+            client = get_http_client()
+            async with client.stream(
+                "POST",
+                self.url,
+                json={
+                    "model": model or self.model,
+                    "prompt": prompt,
+                    "stream": True,
+                },
+            ) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+
+                    chunk = json.loads(line)
+
+                    # Ollama informa los errores dentro del stream
+                    if "error" in chunk:
+                        raise RuntimeError(chunk["error"])
+
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+
+                    if chunk.get("done"):
+                        break
+
+    async def _call_ollama(
+        self, prompt: str, priority: Priority = Priority.SMALL_TALK
+    ) -> str:
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.url,
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                    },
-                    timeout=60,
-                )
-                data = response.json()
-                return data.get("response", "").strip()
+            return await self._generate(prompt, priority=priority)
+        except LLMQueueFull as e:
+            print("IA saturada:", e)
+            return BUSY_MESSAGE
         except Exception as e:
             print("Error Ollama:", e)
             return "⚠️ Error en la IA."
@@ -72,7 +152,14 @@ class LLMClient:
     # =========================
     # Extraer productos desde texto
     # =========================
-    async def extract_entities(self, prompt: str):
+    async def extract_entities(
+        self, prompt: str, priority: Priority = Priority.INVENTORY
+    ):
+        cache_key = make_cache_key(prompt, self.model, ENTITIES_PROMPT_VERSION)
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
         ia_prompt = f"""
 Devuelve SOLO un JSON válido con formato:
 {{"products": ["producto1"]}}
@@ -80,15 +167,16 @@ Devuelve SOLO un JSON válido con formato:
 Texto:
 {prompt}
 """
-        response = await self._call_ollama(ia_prompt)
+        response = await self._call_ollama(ia_prompt, priority)
 
         try:
-            import json
-
-            return json.loads(response)
+            result = json.loads(response)
         except Exception:
             return {"products": []}
 
+        await self.cache.aset(cache_key, result)
+        return result
+
     # =========================
     # Analizar imagen (solo nombre)
     # =========================
@@ -108,7 +196,7 @@ Imagen en base64:
 {img_b64}
 """
 
-        return await self._call_ollama(prompt)
+        return await self._call_ollama(prompt, Priority.INVENTORY)
 
     # =========================
     # Respuesta de inventario
@@ -127,13 +215,42 @@ Imagen en base64:
     - Indica el estado del stock
     - Da una recomendación si es necesario
     """
-        return await self.generate_text(prompt)
+        return await self.generate_text(prompt, Priority.INVENTORY)
 
     # =========================
     # Texto general del agente
     # =========================
-    async def generate_text(self, prompt: str) -> str:
-        final_prompt = f"""
+    async def generate_text(
+        self, prompt: str, priority: Priority = Priority.SMALL_TALK
+    ) -> str:
+        final_prompt = self._agent_prompt(prompt)
+        return await self._call_ollama(final_prompt, priority)
+
+    # =========================
+    # Texto general del agente (streaming)
+    # =========================
+    async def stream_text(self, prompt: str, priority: Priority = Priority.SMALL_TALK):
+        final_prompt = self._agent_prompt(prompt)
+        streamed = False
+
+        try:
+            async for token in self._stream_generate(final_prompt, priority=priority):
+                streamed = True
+                yield token
+        except LLMQueueFull as e:
+            print("IA saturada:", e)
+            yield BUSY_MESSAGE
+        except Exception as e:
+            print("Error Ollama (stream):", e)
+
+            if streamed:
+                yield "\n\n⚠️ La respuesta se interrumpió."
+            else:
+                # sin streaming: la respuesta completa en una sola llamada
+                yield await self._call_ollama(final_prompt, priority)
+
+    def _agent_prompt(self, prompt: str) -> str:
+        return f"""
     {INVENTORY_SYSTEM_PROMPT}
 
     Instrucción del sistema:
@@ -142,7 +259,6 @@ Imagen en base64:
     Mensaje o contexto:
     {prompt}
     """
-        return await self._call_ollama(final_prompt)
 
     # =========================
     # LIMPIAR NOMBRE DE PRODUCTO
@@ -156,6 +272,12 @@ Imagen en base64:
             "nombre_producto": "..."
         }
         """
+        model = "mistral:latest"
+
+        cache_key = make_cache_key(raw_text, model, PRODUCT_ENTITIES_PROMPT_VERSION)
+        cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
 
         prompt = f"""
     Eres un agente inteligente de inventario.
@@ -188,24 +310,13 @@ Imagen en base64:
     """
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": "mistral:latest",
-                        "prompt": prompt,
-                        "stream": False,
-                    },
-                    timeout=60,
-                )
-
-                data = response.json()
-                text = data.get("response", "").strip()
-
-                # Intentar convertir a JSON
-                import json
-
-                return json.loads(text)
+            text = await self._generate(prompt, model, Priority.PIPELINE)
+
+            # Intentar convertir a JSON
+            result = json.loads(text)
+
+            await self.cache.aset(cache_key, result)
+            return result
 
         except Exception as e:
             print("Error extrayendo entidades:", e)
@@ -0,0 +1,154 @@
+"""
+Cola de admisión con prioridades delante de Ollama.
+
+Limita cuántas generaciones corren a la vez y atiende primero a las
+de mayor prioridad (extracción del pipeline > respuestas de inventario >
+conversación). Si la cola está llena la llamada se rechaza enseguida
+en lugar de esperar hasta el timeout.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+
+
+class Priority(IntEnum):
+    PIPELINE = 0
+    INVENTORY = 1
+    SMALL_TALK = 2
+
+
+# máximo de llamadas en espera de cada prioridad (cada una cuenta solo
+# las suyas): una cola de conversación llena no frena al registro de
+# productos, y la conversación se rechaza antes
+DEFAULT_QUEUE_LIMITS = {
+    Priority.PIPELINE: int(os.getenv("LLM_QUEUE_LIMIT_PIPELINE", "32")),
+    Priority.INVENTORY: int(os.getenv("LLM_QUEUE_LIMIT_INVENTORY", "16")),
+    Priority.SMALL_TALK: int(os.getenv("LLM_QUEUE_LIMIT_SMALL_TALK", "8")),
+}
+
+
+class LLMQueueFull(Exception):
+    """La cola de la IA está llena para esta prioridad."""
+
+
+class _PriorityStats:
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        self.generation_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_wait_ms": 1000 * self.wait_seconds / self.admitted
+            if self.admitted
+            else 0.0,
+            "avg_generation_ms": 1000 * self.generation_seconds / self.admitted
+            if self.admitted
+            else 0.0,
+            "max_wait_ms": 1000 * self.max_wait_seconds,
+        }
+
+
+class LLMScheduler:
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        queue_limits: dict[Priority, int] | None = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_limits = queue_limits or dict(DEFAULT_QUEUE_LIMITS)
+
+        self._running = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._queued = {p: 0 for p in Priority}
+        self._seq = itertools.count()
+        self._stats = {p: _PriorityStats() for p in Priority}
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority):
+        """
+        Espera un turno para generar. Lanza LLMQueueFull si ya hay
+        queue_limits[priority] llamadas de esta prioridad en espera.
+        """
+        stats = self._stats[priority]
+        queued_at = time.perf_counter()
+
+        await self._acquire(priority)
+
+        started_at = time.perf_counter()
+        waited = started_at - queued_at
+        stats.admitted += 1
+        stats.wait_seconds += waited
+        stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+
+        try:
+            yield
+        finally:
+            stats.generation_seconds += time.perf_counter() - started_at
+            self._release()
+
+    async def _acquire(self, priority: Priority):
+        if self._running < self.max_concurrency and not self._waiters:
+            self._running += 1
+            return
+
+        if self._queued[priority] >= self.queue_limits[priority]:
+            self._stats[priority].rejected += 1
+            raise LLMQueueFull(f"Cola de IA llena ({priority.name})")
+
+        future = asyncio.get_running_loop().create_future()
+        item = (int(priority), next(self._seq), future)
+        heapq.heappush(self._waiters, item)
+        self._queued[priority] += 1
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # ya tenía el turno asignado: se lo pasa al siguiente
+                self._release()
+            elif item in self._waiters:
+                self._waiters.remove(item)
+                heapq.heapify(self._waiters)
+                self._queued[priority] -= 1
+            raise
+
+    def _release(self):
+        self._running -= 1
+
+        while self._waiters and self._running < self.max_concurrency:
+            priority, _, future = heapq.heappop(self._waiters)
+            self._queued[Priority(priority)] -= 1
+
+            if future.done():
+                continue
+
+            self._running += 1
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "queued": len(self._waiters),
+            "max_concurrency": self.max_concurrency,
+            "priorities": {
+                p.name: {"queued": self._queued[p], **s.as_dict()}
+                for p, s in self._stats.items()
+            },
+        }
+
+
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,57 @@
+"""
+Coalescencia de llamadas idénticas a la IA (single-flight).
+
+Si varias corrutinas piden la misma generación al mismo tiempo,
+solo la primera llama a Ollama; las demás esperan ese mismo resultado.
+No guarda nada una vez terminada la llamada, así que no hay datos viejos.
+
+La prioridad es parte de la clave: una llamada de la conversación que
+ya está en la cola no hace esperar a una del pipeline con el mismo prompt.
+"""
+
+import asyncio
+import hashlib
+
+
+def make_flight_key(prompt: str, model: str, priority: int) -> str:
+    return hashlib.sha256(f"{model}|{int(priority)}|{prompt}".encode()).hexdigest()
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory):
+        task = self._inflight.get(key)
+
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.coalesced += 1
+
+        # shield: si un cliente cancela, los demás siguen esperando
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+        # evita el aviso "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+        }
+
+
+llm_singleflight = SingleFlight()
@@ -1,16 +1,39 @@
 import strawberry
+import asyncio
 import base64
 from fastapi import FastAPI
 from strawberry.fastapi import GraphQLRouter
-from planner.inventory_planner import run_inventory_pipeline
+from planner.inventory_planner import IMAGE_VIEWS, run_multi_image_pipeline
 from database.db import AsyncSessionLocal, engine, Base
+from database.trigram import ensure_pg_trgm
 from services.product_service import ProductService
 from services.search_service import SearchService
+from services.vector_index import vector_index
 from llm.llm_client import LLMClient
+from llm.http_client import close_http_client, start_http_client
+from llm.scheduler import Priority, llm_scheduler
+from ocr.ocr_cache import ocr_cache
+from ocr.ocr_engine import ocr_engine
+from ocr.ocr_reader import variant_stats
+from services.model_registry import model_registry, warmup_names
+from services.product_classifier import classifier_batcher
+from services.tracing import stage_stats
+from services.job_service import JobQueueFull, detection_jobs
+from services.cpu_executor import (
+    BUSY_IMAGES_MESSAGE,
+    ExecutorSaturated,
+    cpu_executor,
+    run_cpu,
+)
 import re
+from functools import partial
+from typing import AsyncGenerator
 
 LAST_DETECTED_PRODUCT = {}
 
+# un solo cliente de IA para toda la aplicación
+llm_client = LLMClient()
+
 
 # =========================
 # GraphQL Types
@@ -22,6 +45,111 @@ class ProductType:
     stock: int
 
 
+@strawberry.type
+class CacheStatsType:
+    hits: int
+    misses: int
+    disk_hits: int
+    size: int
+    maxsize: int
+    hit_rate: float
+
+
+@strawberry.type
+class PriorityStatsType:
+    priority: str
+    queued: int
+    admitted: int
+    rejected: int
+    avg_wait_ms: float
+    avg_generation_ms: float
+    max_wait_ms: float
+
+
+@strawberry.type
+class SchedulerStatsType:
+    running: int
+    queued: int
+    max_concurrency: int
+    priorities: list[PriorityStatsType]
+
+
+@strawberry.type
+class OCRVariantStatsType:
+    variant: str
+    runs: int
+    selected: int
+    early_exits: int
+    avg_confidence: float
+    avg_chars: float
+    avg_ms: float
+
+
+@strawberry.type
+class OCRCacheStatsType:
+    hits: int
+    near_hits: int
+    misses: int
+    size: int
+    maxsize: int
+    hit_rate: float
+
+
+@strawberry.type
+class StageStatsType:
+    name: str
+    count: int
+    avg_ms: float
+    p50_ms: float
+    p95_ms: float
+    max_ms: float
+
+
+@strawberry.type
+class SearchResultType:
+    query: str
+    products: list[str]
+
+
+@strawberry.type
+class DetectedProductType:
+    name: str
+    brand: str | None
+    size: str | None
+    price: str | None
+    expiration_date: str | None
+    views: list[str]
+
+
+@strawberry.type
+class DetectionJobType:
+    id: str
+    status: str  # queued | running | done | error
+    result: str | None
+    product: DetectedProductType | None
+    error: str | None
+    created_at: float
+    started_at: float | None
+    finished_at: float | None
+    confirmed_at: float | None
+
+
+def detection_job_type(job: dict) -> DetectionJobType:
+    product = job["product"]
+    return DetectionJobType(
+        **{
+            **job,
+            "product": DetectedProductType(**product) if product else None,
+        }
+    )
+
+
+@strawberry.input
+class ProductImageInput:
+    image_type: str  # front | side_left | side_right
+    image: str  # base64
+
+
 # =========================
 # Queries
 # =========================
@@ -42,10 +170,20 @@ class Query:
                 for p in products
             ]
 
+    @strawberry.field
+    async def searchProducts(self, query: str, limit: int = 10) -> list[ProductType]:
+        # búsqueda difusa en PostgreSQL (pg_trgm), acotada a `limit` filas
+        async with AsyncSessionLocal() as session:
+            rows = await ProductService(session).search_products(query, limit)
+            return [
+                ProductType(id=row.id, name=row.product_name, stock=row.quantity_on_hand)
+                for row in rows
+            ]
+
     @strawberry.field
     async def searchIntelligent(self, query: str) -> str:
         async with AsyncSessionLocal() as session:
-            llm = LLMClient()
+            llm = llm_client
             product_service = ProductService(session)
             search_service = SearchService(llm, product_service)
 
@@ -55,26 +193,81 @@ class Query:
             if not products:
                 return "❌ No encontré productos relacionados en el inventario."
 
-            inventory = await product_service.list_products()
-            for p in inventory:
-                if p.product_name.lower() == products[0].lower():
-                    return await llm.generate_inventory_response(
-                        product_name=p.product_name,
-                        stock=p.quantity_on_hand,
-                        question=query,
-                    )
+            catalog = await product_service.get_catalog()
+            p = catalog.get_by_name(products[0])
+            if p:
+                stock = await product_service.get_stock([p.id])
+                return await llm.generate_inventory_response(
+                    product_name=p.product_name,
+                    stock=stock.get(p.id, 0),
+                    question=query,
+                )
 
             return "❌ El producto fue detectado, pero no existe en el inventario."
 
+    @strawberry.field
+    async def searchMany(self, queries: list[str]) -> list[SearchResultType]:
+        async with AsyncSessionLocal() as session:
+            llm = llm_client
+            product_service = ProductService(session)
+            search_service = SearchService(llm, product_service)
+
+            results = await search_service.search_many(queries)
+
+            return [
+                SearchResultType(query=query, products=products)
+                for query, products in zip(queries, results)
+            ]
+
     @strawberry.field
     async def askInventory(self, question: str) -> str:
         async with AsyncSessionLocal() as session:
-            llm = LLMClient()
+            llm = llm_client
             product_service = ProductService(session)
             search_service = SearchService(llm, product_service)
 
             return await search_service.ask_inventory(question)
 
+    @strawberry.field
+    def llmCacheStats(self) -> CacheStatsType:
+        return CacheStatsType(**llm_client.cache_stats())
+
+    @strawberry.field
+    def llmSchedulerStats(self) -> SchedulerStatsType:
+        stats = llm_scheduler.stats()
+        return SchedulerStatsType(
+            running=stats["running"],
+            queued=stats["queued"],
+            max_concurrency=stats["max_concurrency"],
+            priorities=[
+                PriorityStatsType(priority=name, **values)
+                for name, values in stats["priorities"].items()
+            ],
+        )
+
+    @strawberry.field
+    def ocrVariantStats(self) -> list[OCRVariantStatsType]:
+        return [
+            OCRVariantStatsType(variant=name, **values)
+            for name, values in variant_stats().items()
+        ]
+
+    @strawberry.field
+    def ocrCacheStats(self) -> OCRCacheStatsType:
+        return OCRCacheStatsType(**ocr_cache.stats())
+
+    @strawberry.field
+    async def detectionJob(self, id: str) -> DetectionJobType | None:
+        job = await detection_jobs.get(id)
+        return detection_job_type(job) if job else None
+
+    @strawberry.field
+    def pipelineStats(self) -> list[StageStatsType]:
+        return [
+            StageStatsType(name=name, **values)
+            for name, values in stage_stats().items()
+        ]
+
     @strawberry.field
     async def productById(self, id: str) -> ProductType | None:
         async with AsyncSessionLocal() as session:
@@ -91,6 +284,281 @@ class Query:
             )
 
 
+# =========================
+# Lógica del agente
+# =========================
+async def save_detected_product(
+    product_service, product: dict, images: dict[str, str]
+):
+    return await product_service.create_product_with_images(
+        name=product["name"],
+        stock=1,
+        images=images,
+        brand=product.get("brand"),
+        size=product.get("size"),
+        price=product.get("price"),
+        expiration_date=product.get("expiration_date"),
+    )
+
+
+async def plan_agent_reply(
+    message: str,
+    product_service,
+    search_service,
+    detection_job_id: str | None = None,
+) -> dict:
+    """
+    Decide qué responder a un mensaje del chat.
+    Devuelve {"text": ...} si la respuesta ya está lista
+    o {"prompt": ...} si hay que generarla con la IA.
+
+    Con detection_job_id los cambios y la confirmación se aplican al
+    producto de ese trabajo; sin él, al de la última detección síncrona.
+    """
+    global LAST_DETECTED_PRODUCT
+
+    msg = message.lower()
+
+    # =========================
+    # SALUDO
+    # =========================
+    if msg in [
+        "hola",
+        "buenas",
+        "buenos dias",
+        "buenas tardes",
+        "como estas",
+        "qué tal",
+    ]:
+        prompt = """
+    Eres un asistente profesional de inventario.
+
+    Saluda de forma breve, natural y profesional.
+    Indica que puedes ayudar a registrar productos
+    o consultar el inventario.
+    """
+        return {"prompt": prompt}
+
+    # =========================
+    # INTENCIÓN: REGISTRAR PRODUCTO
+    # =========================
+    if any(word in msg for word in ["registrar", "agregar", "nuevo producto"]):
+        prompt = """
+    Eres un asistente inteligente de inventario.
+
+    El usuario quiere registrar un producto nuevo.
+
+    Explícale de forma clara y profesional cómo hacerlo.
+    Debes pedirle exactamente estas 3 fotos:
+
+    1) Foto frontal → nombre y marca del producto
+    2) Lateral izquierdo → ingredientes
+    3) Lateral derecho → tabla nutricional
+    """
+        return {"prompt": prompt}
+
+    # =========================
+    # ACTUALIZAR DATOS DEL PRODUCTO DETECTADO
+    # =========================
+
+    if detection_job_id:
+        pending = await detection_jobs.pending_product(detection_job_id)
+    else:
+        pending = LAST_DETECTED_PRODUCT
+
+    if pending:
+        updated = None
+
+        price_match = re.search(r"precio\s+(\d+(\.\d+)?)", msg)
+        date_match = re.search(r"venc[e]?\s+(\d{4}-\d{2}-\d{2})", msg)
+        size_match = re.search(r"tamañ?o\s+(\d+\s?(g|kg|ml|l))", msg)
+
+        # actualizar precio
+        if price_match:
+            pending["price"] = price_match.group(1)
+            updated = f"✅ Precio actualizado a {price_match.group(1)}"
+
+        # actualizar fecha de vencimiento
+        elif date_match:
+            pending["expiration_date"] = date_match.group(1)
+            updated = f"✅ Fecha de vencimiento actualizada a {date_match.group(1)}"
+
+        # actualizar tamaño
+        elif size_match:
+            pending["size"] = size_match.group(1)
+            updated = f"✅ Tamaño actualizado a {size_match.group(1)}"
+
+        if updated:
+            if detection_job_id:
+                await detection_jobs.update_product(detection_job_id, pending)
+            return {"text": updated}
+
+    # =========================
+    # CONFIRMAR GUARDADO DEL PRODUCTO
+    # =========================
+    if "guardar producto" in msg or "listo" in msg:
+
+        if detection_job_id:
+            # solo una confirmación guarda el producto del trabajo
+            product = await detection_jobs.confirm(
+                detection_job_id, partial(save_detected_product, product_service)
+            )
+        elif LAST_DETECTED_PRODUCT:
+            product = await save_detected_product(
+                product_service,
+                LAST_DETECTED_PRODUCT,
+                LAST_DETECTED_PRODUCT["images"],
+            )
+            LAST_DETECTED_PRODUCT = {}
+        else:
+            product = None
+
+        if product is None:
+            return {"text": "No hay ningún producto pendiente para guardar."}
+
+        return {
+            "text": (
+                f"✅ Producto registrado correctamente:\n" f"{product.product_name}"
+            )
+        }
+
+    # =========================
+    # CONSULTAS DE INVENTARIO (INTELIGENTES)
+    # =========================
+    if any(
+        word in msg
+        for word in [
+            "tenemos",
+            "hay",
+            "stock",
+            "disponible",
+            "inventario",
+            "productos",
+            "lista",
+        ]
+    ):
+        # AQUÍ se usa el search_service
+        reply = await search_service.build_inventory_reply(message)
+        return {**reply, "priority": Priority.INVENTORY}
+
+    # =========================
+    # RESPUESTA GENERAL DEL AGENTE
+    # =========================
+    prompt = f"""
+    Eres un asistente profesional de inventario.
+
+    Tu función es:
+    - Ayudar a registrar productos
+    - Consultar stock
+    - Responder preguntas sobre inventario
+
+    Siempre orienta la conversación hacia el inventario.
+
+    Pregunta del usuario:
+    {message}
+
+    Responde de forma breve, clara y profesional.
+    """
+    return {"prompt": prompt}
+
+
+def detected_product(result: dict, views: list[str]) -> dict | None:
+    """Datos del producto que el pipeline deja pendiente de confirmar."""
+    if result["status"] not in ["need_info", "confirm"]:
+        return None
+
+    return {
+        "name": result["product_name"],
+        "brand": result.get("brand"),
+        "size": result.get("size"),
+        "price": result.get("precio"),
+        "expiration_date": result.get("fecha_vencimiento"),
+        "views": views,
+    }
+
+
+def describe_detection(result: dict, product: dict | None) -> str:
+    """Arma el mensaje del chat con el producto detectado por el pipeline."""
+    status = result["status"]
+    raw_text = result.get("raw_text", "")
+
+    if status == "error":
+        return (
+            f"⚠️ {result['message']}\n\n"
+            f"🧾 Texto detectado por OCR:\n{raw_text}"
+        )
+
+    if product is not None:
+
+        summary = f"""
+            📦 Producto detectado:
+
+            Marca: {product.get("brand", "No detectada")}
+            Nombre: {product.get("name")}
+            Tamaño: {product.get("size", "No detectado")}
+            Precio: {product.get("price", "No detectado")}
+            Fecha de vencimiento: {product.get("expiration_date", "No detectada")}
+            """
+
+        return (
+            summary
+            + """
+                Revisa la información detectada.
+
+                Si deseas actualizar algún campo, puedes escribir por ejemplo:
+                - precio 1.25
+                - vence 2026-08-01
+                - tamaño 600g
+
+                Cuando todo esté correcto, escribe:
+                👉 guardar producto
+                """
+        )
+
+
+async def detect_from_images(images_b64: dict[str, str]) -> tuple[str, dict | None]:
+    """
+    Decodifica las vistas, corre el pipeline y devuelve la respuesta del
+    chat y el producto detectado. Lo usan las mutaciones síncronas y los
+    trabajos en segundo plano.
+    """
+    async with AsyncSessionLocal() as session:
+        product_service = ProductService(session)
+
+        decoded = await asyncio.gather(
+            *(run_cpu(base64.b64decode, img) for img in images_b64.values())
+        )
+
+        # ejecutar pipeline con todas las vistas
+        result = await run_multi_image_pipeline(
+            dict(zip(images_b64, decoded)), product_service
+        )
+
+        product = detected_product(result, list(images_b64))
+        return describe_detection(result, product), product
+
+
+async def detect_and_remember(images_b64: dict[str, str]) -> str:
+    """
+    Detección síncrona: el producto queda pendiente en
+    LAST_DETECTED_PRODUCT junto con sus imágenes.
+    """
+    global LAST_DETECTED_PRODUCT
+
+    message, product = await detect_from_images(images_b64)
+    if product is not None:
+        LAST_DETECTED_PRODUCT = {**product, "images": images_b64}
+
+    return message
+
+
+def invalid_views(images: list[ProductImageInput]) -> str | None:
+    invalid = [i.image_type for i in images if i.image_type not in IMAGE_VIEWS]
+    if invalid:
+        return f"⚠️ Tipo de imagen no válido: {', '.join(invalid)}"
+    return None
+
+
 # =========================
 # Mutations
 # =========================
@@ -111,221 +579,202 @@ class Mutation:
 
     @strawberry.mutation
     async def analyzeImage(self, image: str) -> str:
-        llm = LLMClient()
+        llm = llm_client
         image_bytes = base64.b64decode(image)
         return await llm.analyze_image_and_recommend(image_bytes)
 
     @strawberry.mutation
     async def detectProductFromImage(self, image: str) -> str:
-        global LAST_DETECTED_PRODUCT
-        async with AsyncSessionLocal() as session:
-            product_service = ProductService(session)
-
-            image_bytes = base64.b64decode(image)
+        try:
+            return await detect_and_remember({"front": image})
+        except ExecutorSaturated as e:
+            print("Procesamiento de imágenes saturado:", e)
+            return BUSY_IMAGES_MESSAGE
 
-            # ejecutar pipeline
-            result = await run_inventory_pipeline(image_bytes, product_service)
-            
-
-            status = result["status"]
-            raw_text = result.get("raw_text", "")
-
-            if status == "error":
-                return (
-                    f"⚠️ {result['message']}\n\n"
-                    f"🧾 Texto detectado por OCR:\n{raw_text}"
-                )
-
-            if status in ["need_info", "confirm"]:
-
-                
+    @strawberry.mutation
+    async def detectProductFromImages(self, images: list[ProductImageInput]) -> str:
+        error = invalid_views(images)
+        if error:
+            return error
 
-                LAST_DETECTED_PRODUCT = {
-                    "name": result["product_name"],
-                    "brand": result.get("brand"),
-                    "size": result.get("size"),
-                    "price": result.get("precio"),
-                    "expiration_date": result.get("fecha_vencimiento"),
-                    "image": image,
-                }
+        try:
+            return await detect_and_remember({i.image_type: i.image for i in images})
+        except ExecutorSaturated as e:
+            print("Procesamiento de imágenes saturado:", e)
+            return BUSY_IMAGES_MESSAGE
 
-                summary = f"""
-            📦 Producto detectado:
+    @strawberry.mutation
+    async def submitProductDetection(
+        self, images: list[ProductImageInput]
+    ) -> DetectionJobType:
+        """
+        Encola la detección y devuelve el trabajo al instante;
+        el resultado se consulta con detectionJob o detectionJobUpdates.
+        """
+        error = invalid_views(images)
+        if error:
+            raise ValueError(error)
+
+        try:
+            job_id = await detection_jobs.submit(
+                {i.image_type: i.image for i in images}
+            )
+        except JobQueueFull as e:
+            print("Cola de detección llena:", e)
+            raise ValueError(BUSY_IMAGES_MESSAGE)
 
-            Marca: {LAST_DETECTED_PRODUCT.get("brand", "No detectada")}
-            Nombre: {LAST_DETECTED_PRODUCT.get("name")}
-            Tamaño: {LAST_DETECTED_PRODUCT.get("size", "No detectado")}
-            Precio: {LAST_DETECTED_PRODUCT.get("price", "No detectado")}
-            Fecha de vencimiento: {LAST_DETECTED_PRODUCT.get("expiration_date", "No detectada")}
-            """
+        return detection_job_type(await detection_jobs.get(job_id))
 
-                return (
-                    summary
-                    + """
-                Revisa la información detectada.
+    @strawberry.mutation
+    async def confirmDetectionJob(self, id: str) -> ProductType | None:
+        """
+        Guarda el producto detectado por el trabajo.
+        None si no tiene un producto pendiente o ya se guardó.
+        """
+        async with AsyncSessionLocal() as session:
+            product = await detection_jobs.confirm(
+                id, partial(save_detected_product, ProductService(session))
+            )
 
-                Si deseas actualizar algún campo, puedes escribir por ejemplo:
-                - precio 1.25
-                - vence 2026-08-01
-                - tamaño 600g
+            if product is None:
+                return None
 
-                Cuando todo esté correcto, escribe:
-                👉 guardar producto
-                """
-                )
+            return ProductType(
+                id=str(product.id),
+                name=product.product_name,
+                stock=product.quantity_on_hand,
+            )
 
     @strawberry.mutation
-    async def replyToAgent(self, message: str) -> str:
-        global LAST_DETECTED_PRODUCT
+    async def replyToAgent(
+        self, message: str, detection_job_id: str | None = None
+    ) -> str:
         async with AsyncSessionLocal() as session:
-            llm = LLMClient()
+            llm = llm_client
             product_service = ProductService(session)
             search_service = SearchService(llm, product_service)
 
-            msg = message.lower()
-
-            # =========================
-            # SALUDO
-            # =========================
-            if msg in [
-                "hola",
-                "buenas",
-                "buenos dias",
-                "buenas tardes",
-                "como estas",
-                "qué tal",
-            ]:
-                prompt = """
-    Eres un asistente profesional de inventario.
-
-    Saluda de forma breve, natural y profesional.
-    Indica que puedes ayudar a registrar productos
-    o consultar el inventario.
-    """
-                return await llm.generate_text(prompt)
+            reply = await plan_agent_reply(
+                message, product_service, search_service, detection_job_id
+            )
 
-            # =========================
-            # INTENCIÓN: REGISTRAR PRODUCTO
-            # =========================
-            if any(word in msg for word in ["registrar", "agregar", "nuevo producto"]):
-                prompt = """
-    Eres un asistente inteligente de inventario.
+            if "text" in reply:
+                return reply["text"]
 
-    El usuario quiere registrar un producto nuevo.
+            priority = reply.get("priority", Priority.SMALL_TALK)
+            return await llm.generate_text(reply["prompt"], priority)
 
-    Explícale de forma clara y profesional cómo hacerlo.
-    Debes pedirle exactamente estas 3 fotos:
 
-    1) Foto frontal → nombre y marca del producto
-    2) Lateral izquierdo → ingredientes
-    3) Lateral derecho → tabla nutricional
-    """
-                return await llm.generate_text(prompt)
-
-            # =========================
-            # ACTUALIZAR DATOS DEL PRODUCTO DETECTADO
-            # =========================
-
-            if LAST_DETECTED_PRODUCT:
-
-                # actualizar precio
-                price_match = re.search(r"precio\s+(\d+(\.\d+)?)", msg)
-                if price_match:
-                    LAST_DETECTED_PRODUCT["price"] = price_match.group(1)
-                    return f"✅ Precio actualizado a {price_match.group(1)}"
-
-                # actualizar fecha de vencimiento
-                date_match = re.search(r"venc[e]?\s+(\d{4}-\d{2}-\d{2})", msg)
-                if date_match:
-                    LAST_DETECTED_PRODUCT["expiration_date"] = date_match.group(1)
-                    return (
-                        f"✅ Fecha de vencimiento actualizada a {date_match.group(1)}"
-                    )
-
-                # actualizar tamaño
-                size_match = re.search(r"tamañ?o\s+(\d+\s?(g|kg|ml|l))", msg)
-                if size_match:
-                    LAST_DETECTED_PRODUCT["size"] = size_match.group(1)
-                    return f"✅ Tamaño actualizado a {size_match.group(1)}"
-
-            # =========================
-            # CONFIRMAR GUARDADO DEL PRODUCTO
-            # =========================
-            if "guardar producto" in msg or "listo" in msg:
-
-               
-
-                if not LAST_DETECTED_PRODUCT:
-                    return "No hay ningún producto pendiente para guardar."
-
-                product = await product_service.create_product_with_image(
-                    name=LAST_DETECTED_PRODUCT["name"],
-                    stock=1,
-                    image_b64=LAST_DETECTED_PRODUCT["image"],
-                    brand=LAST_DETECTED_PRODUCT.get("brand"),
-                    size=LAST_DETECTED_PRODUCT.get("size"),
-                    price=LAST_DETECTED_PRODUCT.get("price"),
-                    expiration_date=LAST_DETECTED_PRODUCT.get("expiration_date"),
-                )
+# =========================
+# Subscriptions (streaming)
+# =========================
+@strawberry.type
+class Subscription:
 
-                LAST_DETECTED_PRODUCT = {}
+    @strawberry.subscription
+    async def replyToAgentStream(
+        self, message: str, detection_job_id: str | None = None
+    ) -> AsyncGenerator[str, None]:
+        async with AsyncSessionLocal() as session:
+            product_service = ProductService(session)
+            search_service = SearchService(llm_client, product_service)
 
-                return (
-                    f"✅ Producto registrado correctamente:\n" f"{product.product_name}"
-                )
+            reply = await plan_agent_reply(
+                message, product_service, search_service, detection_job_id
+            )
 
-            # =========================
-            # CONSULTAS DE INVENTARIO (INTELIGENTES)
-            # =========================
-            if any(
-                word in msg
-                for word in [
-                    "tenemos",
-                    "hay",
-                    "stock",
-                    "disponible",
-                    "inventario",
-                    "productos",
-                    "lista",
-                ]
-            ):
-                # AQUÍ se usa el search_service
-                return await search_service.ask_inventory(message)
-
-            # =========================
-            # RESPUESTA GENERAL DEL AGENTE
-            # =========================
-            prompt = f"""
-    Eres un asistente profesional de inventario.
+            if "text" in reply:
+                yield reply["text"]
+                return
 
-    Tu función es:
-    - Ayudar a registrar productos
-    - Consultar stock
-    - Responder preguntas sobre inventario
+            priority = reply.get("priority", Priority.SMALL_TALK)
+            async for token in llm_client.stream_text(reply["prompt"], priority):
+                yield token
 
-    Siempre orienta la conversación hacia el inventario.
+    @strawberry.subscription
+    async def askInventoryStream(self, question: str) -> AsyncGenerator[str, None]:
+        async with AsyncSessionLocal() as session:
+            product_service = ProductService(session)
+            search_service = SearchService(llm_client, product_service)
 
-    Pregunta del usuario:
-    {message}
+            async for token in search_service.ask_inventory_stream(question):
+                yield token
 
-    Responde de forma breve, clara y profesional.
-    """
-            return await llm.generate_text(prompt)
+    @strawberry.subscription
+    async def detectionJobUpdates(
+        self, id: str
+    ) -> AsyncGenerator[DetectionJobType, None]:
+        async for job in detection_jobs.updates(id):
+            yield detection_job_type(job)
 
 
 # =========================
 # App
 # =========================
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+schema = strawberry.Schema(query=Query, mutation=Mutation, subscription=Subscription)
 
 app = FastAPI()
 app.include_router(GraphQLRouter(schema), prefix="/graphql")
 
 
+@app.get("/health")
+def health():
+    models = model_registry.status()
+    # el OCR vive en los workers; aquí solo cuentan los modelos precargados
+    states = {models[name]["state"] for name in warmup_names() if name in models}
+    states.add("ready" if ocr_engine.ready else "loading")
+
+    if "error" in states:
+        status = "degraded"
+    elif states - {"ready"}:
+        status = "warming_up"
+    else:
+        status = "ok"
+
+    return {
+        "status": status,
+        "ocr_workers_ready": ocr_engine.ready,
+        "models": models,
+        "executors": {"cpu": cpu_executor.stats(), "ocr": ocr_engine.stats()},
+        "classifier": classifier_batcher.stats(),
+        "llm_cache": llm_client.cache_stats(),
+        "detection_jobs": detection_jobs.stats(),
+    }
+
+
 # =========================
-# Startup
+# Startup / Shutdown
 # =========================
 @app.on_event("startup")
 async def startup():
+    await start_http_client()
+
     async with engine.begin() as conn:
+        # los índices GIN de búsqueda necesitan pg_trgm; sin permisos
+        # para crearlo se sigue con la búsqueda en memoria
+        await ensure_pg_trgm(conn)
         await conn.run_sync(Base.metadata.create_all)
+
+    # cargar catálogo e índice de vectores antes de la primera consulta
+    try:
+        async with AsyncSessionLocal() as session:
+            catalog = await ProductService(session).get_catalog()
+            await vector_index.ensure(catalog)
+    except Exception as e:
+        print("⚠️ No se pudo precargar el catálogo:", e)
+
+    # los workers de OCR y el resto de modelos se cargan en segundo plano
+    asyncio.create_task(ocr_engine.start())
+    asyncio.create_task(model_registry.warm_up(warmup_names()))
+
+    # trabajos de detección pendientes de una ejecución anterior
+    await detection_jobs.start(detect_from_images)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await detection_jobs.shutdown()
+    await vector_index.flush()
+    await close_http_client()
+    ocr_engine.shutdown()
+    cpu_executor.shutdown()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, Enum, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
@@ -10,5 +10,6 @@ class ProductImage(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_stock_id = Column(UUID(as_uuid=True), ForeignKey("product_stocks.id"))
+    image_type = Column(Enum("front", "side_left", "side_right", name="image_type_enum"))
     image_path = Column(String, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
@@ -1,12 +1,28 @@
-from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy import Column, String, Integer, DateTime, Date, Numeric, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
 from database.db import Base
+from database.trigram import trigram_index_enabled
 
 
 class ProductStock(Base):
     __tablename__ = "product_stocks"
+    __table_args__ = (
+        # búsquedas por similitud (solo si pg_trgm está instalado)
+        Index(
+            "ix_product_stocks_product_name_trgm",
+            "product_name",
+            postgresql_using="gin",
+            postgresql_ops={"product_name": "gin_trgm_ops"},
+        ).ddl_if(callable_=trigram_index_enabled),
+        Index(
+            "ix_product_stocks_brand_trgm",
+            "brand",
+            postgresql_using="gin",
+            postgresql_ops={"brand": "gin_trgm_ops"},
+        ).ddl_if(callable_=trigram_index_enabled),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     product_id = Column(String(255), nullable=False)
@@ -26,3 +42,9 @@ class ProductStock(Base):
 
     created_at = Column(DateTime, server_default=func.now())
     last_updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    # datos detectados por el agente
+    brand = Column(String(255))
+    size = Column(String(50))
+    price = Column(Numeric(10, 2))
+    expiration_date = Column(Date)
@@ -0,0 +1,146 @@
+"""
+Entrada de imágenes con resolución acotada.
+
+Las fotos de celular llegan con 12MP o más. Aquí se leen las dimensiones
+desde la cabecera, se decodifican directamente reducidas
+(IMREAD_REDUCED_*) y el lado más largo se limita a MAX_IMAGE_SIDE, así la
+memoria y el CPU por foto no dependen de la cámara. Opcionalmente se
+recorta la zona con texto antes del OCR.
+"""
+
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", "1600"))
+
+# recortar a la zona con texto antes del OCR ("1" para activar)
+OCR_ROI_CROP = os.getenv("OCR_ROI_CROP", "0") == "1"
+
+_REDUCED_COLOR = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+_REDUCED_GRAYSCALE = {
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+}
+
+
+def image_size(image_bytes: bytes) -> tuple[int, int] | None:
+    # PIL solo lee la cabecera, no decodifica los pixeles
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def _decode_flag(longest: int | None, max_side: int, grayscale: bool) -> int:
+    full = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+
+    if not longest:
+        return full
+
+    reduced = _REDUCED_GRAYSCALE if grayscale else _REDUCED_COLOR
+
+    # el mayor factor que todavía deja la imagen por encima del límite
+    for factor in (8, 4, 2):
+        if longest // factor >= max_side:
+            return reduced[factor]
+
+    return full
+
+
+def cap_size(img, max_side: int = MAX_IMAGE_SIDE):
+    h, w = img.shape[:2]
+    longest = max(h, w)
+
+    if longest <= max_side:
+        return img
+
+    scale = max_side / longest
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def decode_bounded(
+    image_bytes: bytes, max_side: int = MAX_IMAGE_SIDE, grayscale: bool = False
+):
+    """
+    Decodifica la imagen con el lado más largo limitado a max_side.
+    Devuelve None si los bytes no son una imagen.
+    """
+    size = image_size(image_bytes)
+    flag = _decode_flag(max(size) if size else None, max_side, grayscale)
+
+    nparr = np.frombuffer(image_bytes, np.uint8)
+    img = cv2.imdecode(nparr, flag)
+
+    if img is None:
+        return None
+
+    return cap_size(img, max_side)
+
+
+# =========================
+# Recorte a la zona con texto
+# =========================
+def crop_text_region(img, margin: float = 0.05):
+    """
+    Busca zonas con bordes densos (letras) y recorta la imagen al
+    rectángulo que las contiene. Si no encuentra nada útil devuelve
+    la imagen completa.
+    """
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    h, w = gray.shape[:2]
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, kernel)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    # unir las letras de una misma línea
+    line_kernel = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(9, w // 40), max(3, h // 200))
+    )
+    closed = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, line_kernel)
+
+    contours, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = 0.0005 * w * h
+    boxes = [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= min_area]
+
+    if not boxes:
+        return img
+
+    x0 = min(x for x, _, _, _ in boxes)
+    y0 = min(y for _, y, _, _ in boxes)
+    x1 = max(x + bw for x, _, bw, _ in boxes)
+    y1 = max(y + bh for _, y, _, bh in boxes)
+
+    pad_x = int(margin * w)
+    pad_y = int(margin * h)
+    x0, y0 = max(0, x0 - pad_x), max(0, y0 - pad_y)
+    x1, y1 = min(w, x1 + pad_x), min(h, y1 + pad_y)
+
+    # si el texto ocupa casi toda la foto no vale la pena recortar
+    if (x1 - x0) * (y1 - y0) > 0.9 * w * h:
+        return img
+
+    return img[y0:y1, x0:x1]
+
+
+def load_for_ocr(image_bytes: bytes, roi_crop: bool = OCR_ROI_CROP):
+    img = decode_bounded(image_bytes)
+
+    if img is None:
+        return None
+
+    if roi_crop:
+        img = crop_text_region(img)
+
+    return img
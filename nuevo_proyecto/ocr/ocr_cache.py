@@ -0,0 +1,200 @@
+"""
+Caché de resultados de OCR por hash perceptual.
+
+La clave es un dHash de 64 bits de la foto reducida a grises, así una
+foto repetida (la misma imagen reenviada por el frontend, otra vista ya
+leída) devuelve el texto sin volver a pasar por PaddleOCR. Con OCR_CACHE_MAX_DISTANCE > 0 también se aceptan fotos cuyos
+hashes difieren en pocos bits.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "1024"))
+
+# bits distintos tolerados entre dos hashes. Por defecto 0 (misma foto):
+# dos productos distintos fotografiados sobre el mismo mostrador pueden
+# quedar a pocos bits y devolverían el texto del otro producto
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "0"))
+
+# vacío = solo memoria
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "")
+
+
+# =========================
+# Hash perceptual
+# =========================
+def image_hash(image_bytes: bytes) -> int | None:
+    """
+    dHash: compara cada pixel con su vecino de la derecha
+    en una miniatura de 9x8 en escala de grises.
+    """
+    nparr = np.frombuffer(image_bytes, np.uint8)
+
+    # decodificar ya reducido a 1/8 evita armar la foto completa
+    gray = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+# =========================
+# Respaldo en SQLite
+# =========================
+class SQLiteOCRBackend:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                hash TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def load(self, limit: int) -> list[tuple[int, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, text FROM ocr_cache ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+        # de la más vieja a la más nueva para respetar el orden LRU
+        return [(int(h, 16), text) for h, text in reversed(rows)]
+
+    def set(self, key: int, text: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (hash, text, created_at) VALUES (?, ?, ?)",
+                (f"{key:016x}", text, time.time()),
+            )
+            self._conn.commit()
+
+
+# =========================
+# LRU con tolerancia
+# =========================
+class OCRCache:
+
+    def __init__(
+        self,
+        maxsize: int = OCR_CACHE_SIZE,
+        max_distance: int = OCR_CACHE_MAX_DISTANCE,
+        backend: SQLiteOCRBackend | None = None,
+    ):
+        self.maxsize = maxsize
+        self.max_distance = max_distance
+        self.backend = backend
+
+        self._data: OrderedDict[int, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        if backend is not None:
+            for key, text in backend.load(maxsize):
+                self._store(key, text)
+
+    def get(self, key: int | None) -> str | None:
+        """
+        Devuelve el texto de la foto con hash más cercano,
+        o None si ninguna está dentro de la tolerancia.
+        """
+        if key is None:
+            return None
+
+        with self._lock:
+            text = self._data.get(key)
+
+            if text is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return text
+
+            if self.max_distance <= 0:
+                self.misses += 1
+                return None
+
+            best_key = None
+            best_distance = self.max_distance + 1
+
+            for stored in self._data:
+                distance = hamming(key, stored)
+                if distance < best_distance:
+                    best_key = stored
+                    best_distance = distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(best_key)
+            self.hits += 1
+            self.near_hits += 1
+            return self._data[best_key]
+
+    def set(self, key: int | None, text: str):
+        if key is None:
+            return
+
+        with self._lock:
+            self._store(key, text)
+
+        if self.backend is not None:
+            self.backend.set(key, text)
+
+    def _store(self, key: int, text: str):
+        self._data[key] = text
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def build_default_cache() -> OCRCache:
+    backend = SQLiteOCRBackend(OCR_CACHE_PATH) if OCR_CACHE_PATH else None
+    return OCRCache(backend=backend)
+
+
+ocr_cache = build_default_cache()
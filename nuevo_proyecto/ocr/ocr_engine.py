@@ -0,0 +1,186 @@
+"""
+Motor de OCR en procesos separados.
+
+Cada proceso del pool carga su propio PaddleOCR una sola vez y las
+variantes de una misma foto (original, grises, ampliada) se leen en
+paralelo, así el tiempo por foto se acerca al de una sola pasada y el
+event loop no queda bloqueado.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from ocr import ocr_reader
+from ocr.ocr_cache import image_hash, ocr_cache
+from services.cpu_executor import ExecutorSaturated, run_cpu
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(3, os.cpu_count() or 1))))
+
+# fotos en proceso o en espera antes de rechazar nuevas
+OCR_MAX_PENDING = int(os.getenv("OCR_MAX_PENDING", "8"))
+
+
+# =========================
+# Funciones del proceso worker
+# =========================
+def _init_worker():
+    # cada proceso crea su PaddleOCR; una lectura en blanco
+    # termina de cargar los modelos antes de la primera foto
+    ocr_reader.get_ocr().ocr(np.full((32, 32, 3), 255, dtype=np.uint8))
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+def _cached_text(image_bytes: bytes) -> tuple[int | None, str | None]:
+    # hash y búsqueda (que puede recorrer toda la caché) en un hilo
+    key = image_hash(image_bytes)
+    return key, ocr_cache.get(key)
+
+
+def _read_variant(image_bytes: bytes, variant: str) -> tuple[str, float, float]:
+    img = ocr_reader.decode_image(image_bytes)
+    if img is None:
+        return "", 0.0, 0.0
+
+    return ocr_reader.timed_read(img, variant)
+
+
+# =========================
+# Motor
+# =========================
+class OCREngine:
+
+    def __init__(
+        self, max_workers: int = OCR_WORKERS, max_pending: int = OCR_MAX_PENDING
+    ):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pool: ProcessPoolExecutor | None = None
+        self.ready = False
+
+        self._pending = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # "spawn" evita heredar el estado de PaddleOCR del proceso padre
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    async def start(self):
+        """
+        Levanta los workers y espera a que cada uno tenga su OCR cargado.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+
+        try:
+            await asyncio.gather(
+                *(loop.run_in_executor(pool, _ping) for _ in range(self.max_workers))
+            )
+            self.ready = True
+        except Exception as e:
+            print("⚠️ No se pudieron iniciar los workers de OCR:", e)
+
+    async def extract_text(
+        self, image_bytes: bytes, strategy: str | None = None
+    ) -> str:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated("Cola de OCR llena")
+
+        self._pending += 1
+        try:
+            # foto ya leída: no hace falta OCR
+            key, cached = await run_cpu(_cached_text, image_bytes)
+            if cached is not None:
+                return cached
+
+            texto = await self._extract_uncached(image_bytes, strategy)
+            if texto.strip():
+                # puede escribir en SQLite: fuera del event loop
+                await asyncio.to_thread(ocr_cache.set, key, texto)
+
+            return texto
+        finally:
+            self._pending -= 1
+
+    async def _extract_uncached(
+        self, image_bytes: bytes, strategy: str | None
+    ) -> str:
+        strategy = strategy or ocr_reader.OCR_STRATEGY
+        variants = ocr_reader.VARIANTS
+        lecturas = {}
+
+        if strategy == "adaptive":
+            # primero la variante barata; solo si no alcanza
+            # se leen las demás en paralelo
+            first = variants[0]
+            lecturas.update(await self._read_variants(image_bytes, [first]))
+
+            if ocr_reader.is_confident(*lecturas[first]):
+                return ocr_reader.choose_text(lecturas)
+
+            variants = variants[1:]
+
+        lecturas.update(await self._read_variants(image_bytes, variants))
+
+        return ocr_reader.choose_text(lecturas)
+
+    async def _read_variants(
+        self, image_bytes: bytes, variants: list[str]
+    ) -> dict[str, tuple[str, float]]:
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+
+        try:
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(pool, _read_variant, image_bytes, variant)
+                    for variant in variants
+                )
+            )
+        except BrokenProcessPool:
+            # un worker murió: la próxima llamada arma un pool nuevo
+            self.shutdown()
+            raise
+
+        lecturas = {}
+        for variant, (texto, confianza, seconds) in zip(variants, results):
+            # las estadísticas viven en el proceso de la API
+            ocr_reader.record_variant(variant, texto, confianza, seconds)
+            lecturas[variant] = (texto, confianza)
+
+        return lecturas
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "workers": self.max_workers,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self.ready = False
+
+
+ocr_engine = OCREngine()
+
+
+async def extract_text_async(image_bytes: bytes, strategy: str | None = None) -> str:
+    return await ocr_engine.extract_text(image_bytes, strategy)
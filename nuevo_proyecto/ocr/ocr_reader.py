@@ -1,21 +1,44 @@
-from paddleocr import PaddleOCR
-import numpy as np
 import cv2
+import os
 import re
+import threading
+import time
+from ocr.image_ingest import MAX_IMAGE_SIDE, decode_bounded, load_for_ocr
+from ocr.ocr_cache import image_hash, ocr_cache
+from services.model_registry import model_registry
+from services import tracing
 
-# Inicializar OCR
-ocr = PaddleOCR(lang="es", use_angle_cls=True)
+
+# OCR: se carga con la primera lectura a través del registro de modelos,
+# así el proceso de la API no lo carga si solo lo usan los workers de ocr_engine
+def load_ocr():
+    from paddleocr import PaddleOCR
+
+    return PaddleOCR(lang="es", use_angle_cls=True)
+
+
+def get_ocr():
+    return model_registry.get("paddle_ocr")
+
+
+# "adaptive": se detiene en la primera variante con texto confiable
+# "all": siempre lee las tres variantes
+OCR_STRATEGY = os.getenv("OCR_STRATEGY", "adaptive")
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "0.85"))
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "20"))
+
+# lado más largo permitido a la variante ampliada
+OCR_MAX_UPSCALED_SIDE = int(os.getenv("OCR_MAX_UPSCALED_SIDE", str(MAX_IMAGE_SIDE * 3 // 2)))
 
 
 def preprocess_image(image_bytes: bytes):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    img = decode_bounded(image_bytes)
 
     if img is None:
         return None
 
     # Aumentar resolución
-    img = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
+    img = upscale(img, 2)
 
     # Escala de grises
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
@@ -38,45 +61,175 @@ def preprocess_image(image_bytes: bytes):
     return cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
 
 
-def extract_text(image_bytes: bytes):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+# variantes que se prueban sobre cada foto, de la más barata a la más cara
+VARIANTS = ["original", "grayscale", "upscaled"]
 
-    if img is None:
-        return ""
 
-    versiones = []
+def decode_image(image_bytes: bytes):
+    return load_for_ocr(image_bytes)
+
+
+def upscale(img, factor: float):
+    # nunca más allá de OCR_MAX_UPSCALED_SIDE
+    factor = min(factor, OCR_MAX_UPSCALED_SIDE / max(img.shape[:2]))
+
+    if factor <= 1:
+        return img
+
+    return cv2.resize(img, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC)
 
+
+def build_variant(img, variant: str):
     # versión 1: imagen original
-    versiones.append(img)
+    if variant == "original":
+        return img
 
     # versión 2: escala de grises
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    versiones.append(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+    if variant == "grayscale":
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
 
     # versión 3: aumento de tamaño
-    resized = cv2.resize(img, None, fx=1.5, fy=1.5, interpolation=cv2.INTER_CUBIC)
-    versiones.append(resized)
+    if variant == "upscaled":
+        return upscale(img, 1.5)
+
+    raise ValueError(f"Variante de OCR desconocida: {variant}")
+
+
+def read_variant(version) -> tuple[str, float]:
+    """
+    Devuelve el texto limpio y la confianza media de las líneas aceptadas.
+    """
+    result = get_ocr().ocr(version)
+    textos = []
+    confianzas = []
+
+    if result and result[0]:
+        for linea in result[0]:
+            texto = linea[1][0]
+            confianza = linea[1][1]
+            if confianza > 0.5:
+                textos.append(texto)
+                confianzas.append(confianza)
+
+    texto_total = " ".join(textos).lower()
+    texto_total = re.sub(r"[^a-z0-9\s\.\,\/\$]", " ", texto_total)
+    confianza_media = sum(confianzas) / len(confianzas) if confianzas else 0.0
+
+    return texto_total, confianza_media
+
+
+def is_confident(texto: str, confianza: float) -> bool:
+    return (
+        confianza >= OCR_MIN_CONFIDENCE
+        and len(texto.strip()) >= OCR_MIN_CHARS
+    )
+
 
-    mejor_texto = ""
-    mayor_longitud = 0
+def choose_text(lecturas: dict[str, tuple[str, float]]) -> str:
+    """
+    Elige entre las variantes leídas la de más texto ponderado
+    por su confianza y registra la elección en las estadísticas.
+    """
+    if not lecturas:
+        return ""
+
+    elegida = max(
+        lecturas,
+        key=lambda variant: len(lecturas[variant][0].strip()) * lecturas[variant][1],
+    )
+    record_selection(elegida, early_exit=len(lecturas) < len(VARIANTS))
+
+    return lecturas[elegida][0]
+
+
+# =========================
+# Estadísticas por variante
+# =========================
+class _VariantStats:
+
+    def __init__(self):
+        self.runs = 0
+        self.selected = 0
+        self.early_exits = 0
+        self.confidence = 0.0
+        self.chars = 0
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "runs": self.runs,
+            "selected": self.selected,
+            "early_exits": self.early_exits,
+            "avg_confidence": self.confidence / self.runs if self.runs else 0.0,
+            "avg_chars": self.chars / self.runs if self.runs else 0.0,
+            "avg_ms": 1000 * self.seconds / self.runs if self.runs else 0.0,
+        }
+
+
+_variant_stats = {variant: _VariantStats() for variant in VARIANTS}
+_stats_lock = threading.Lock()
+
+
+def record_variant(variant: str, texto: str, confianza: float, seconds: float):
+    with _stats_lock:
+        stats = _variant_stats[variant]
+        stats.runs += 1
+        stats.confidence += confianza
+        stats.chars += len(texto.strip())
+        stats.seconds += seconds
+
+    # también queda en la traza del pipeline (si hay una activa)
+    tracing.record(f"ocr.{variant}", seconds)
+
+
+def record_selection(variant: str, early_exit: bool):
+    with _stats_lock:
+        stats = _variant_stats[variant]
+        stats.selected += 1
+        if early_exit:
+            stats.early_exits += 1
+
+
+def variant_stats() -> dict:
+    with _stats_lock:
+        return {variant: s.as_dict() for variant, s in _variant_stats.items()}
+
+
+# =========================
+# Lectura completa
+# =========================
+def timed_read(img, variant: str) -> tuple[str, float, float]:
+    start = time.perf_counter()
+    texto, confianza = read_variant(build_variant(img, variant))
+    return texto, confianza, time.perf_counter() - start
+
+
+def extract_text(image_bytes: bytes, strategy: str | None = None):
+    # foto ya leída (o casi igual): no hace falta OCR
+    key = image_hash(image_bytes)
+    cached = ocr_cache.get(key)
+    if cached is not None:
+        return cached
+
+    img = decode_image(image_bytes)
+
+    if img is None:
+        return ""
 
-    for version in versiones:
-        result = ocr.ocr(version)
-        textos = []
+    strategy = strategy or OCR_STRATEGY
+    lecturas = {}
 
-        if result and result[0]:
-            for linea in result[0]:
-                texto = linea[1][0]
-                confianza = linea[1][1]
-                if confianza > 0.5:
-                    textos.append(texto)
+    for variant in VARIANTS:
+        texto, confianza, seconds = timed_read(img, variant)
+        record_variant(variant, texto, confianza, seconds)
+        lecturas[variant] = (texto, confianza)
 
-        texto_total = " ".join(textos).lower()
-        texto_total = re.sub(r"[^a-z0-9\s\.\,\/\$]", " ", texto_total)
+        if strategy == "adaptive" and is_confident(texto, confianza):
+            break
 
-        if len(texto_total) > mayor_longitud:
-            mayor_longitud = len(texto_total)
-            mejor_texto = texto_total
+    texto_final = choose_text(lecturas)
+    if texto_final.strip():
+        ocr_cache.set(key, texto_final)
 
-    return mejor_texto
+    return texto_final
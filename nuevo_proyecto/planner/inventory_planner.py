@@ -1,89 +1,178 @@
-from ocr.ocr_reader import extract_text
+from ocr.ocr_engine import extract_text_async
 from agents.parser_agent import parse_product_data
 from agents.verifier_agent import verify_product_data
 from services.llm_service import extract_product_entities
 from difflib import get_close_matches
-from services.product_service import ProductService
+from planner.recognition import recognize_product
+from services.catalog_index import CatalogSnapshot, catalog_index
+from services.product_service import ProductService, correct_name_in_catalog
 from database.db import AsyncSessionLocal
+from services.tracing import span, start_trace
+import asyncio
+import os
 import re
 
+# vistas que pide el registro, en orden de preferencia
+IMAGE_VIEWS = ["front", "side_left", "side_right"]
+
+# agregar "timings" (ms por etapa) a todos los resultados
+PIPELINE_TIMINGS = os.getenv("PIPELINE_TIMINGS", "0") == "1"
+
 
 # IMPORTANTE:
 # función async porque usa IA
-async def run_inventory_pipeline(image_bytes, product_service=None):
+async def run_inventory_pipeline(
+    image_bytes, product_service=None, include_timings: bool = PIPELINE_TIMINGS
+):
+    return await run_multi_image_pipeline(
+        {"front": image_bytes}, product_service, include_timings
+    )
+
+
+async def load_catalog(product_service=None) -> CatalogSnapshot:
+    """
+    Snapshot del catálogo compartido por el proceso. Solo se abre
+    una sesión si todavía no se cargó nunca.
+    """
+    snapshot = catalog_index.snapshot()
+    if snapshot is not None:
+        return snapshot
+
+    if product_service is not None:
+        return await product_service.get_catalog()
 
-    # =========================
-    # 1. OCR
-    # =========================
-    raw_text = extract_text(image_bytes)
+    async with AsyncSessionLocal() as session:
+        return await ProductService(session).get_catalog()
 
-    size_match = re.search(r"(\d+(\.\d+)?)\s?(ml|l|g|kg)", raw_text.lower())
-    regex_size = size_match.group(0) if size_match else None
 
-    # =========================
-    # 2. IA: marca + producto
-    # =========================
-    entities = await extract_product_entities(raw_text)
+def _first_found(parsed_views: list[dict], field: str):
+    for parsed in parsed_views:
+        if parsed.get(field):
+            return parsed[field]
+    return None
 
-    brand = entities.get("marca", "desconocido")
-    product_name = entities.get("nombre_producto", "producto_desconocido")
 
-    # =========================
-    # Limpieza simple del nombre
-    # =========================
-    if product_name and product_name != "producto_desconocido":
-        words = product_name.split()
-        product_name = " ".join(words[:2])  # máximo 2 palabras
+async def run_multi_image_pipeline(
+    images: dict[str, bytes],
+    product_service=None,
+    include_timings: bool = PIPELINE_TIMINGS,
+):
+    """
+    images: {"front": bytes, "side_left": bytes, "side_right": bytes}
+    Las vistas se leen en paralelo; nombre y marca salen de la frontal
+    y tamaño, precio y vencimiento de cualquier vista.
+    Con include_timings el resultado trae "timings" (ms por etapa).
+    """
+    with start_trace("inventory_pipeline") as trace:
+        result = await _run_pipeline(images, product_service)
 
-    # =========================
-    # 2.1 Corrección con base de datos
-    # =========================
-    async with AsyncSessionLocal() as session:
-        product_service = ProductService(session)
-        product_name = await product_service.correct_product_name(product_name)
+    trace.dump()
+
+    if include_timings:
+        timings = trace.timings()
+        print("TIMINGS (ms):", {k: round(v, 1) for k, v in timings.items()})
+        result["timings"] = timings
+
+    return result
+
+
+async def _run_pipeline(images: dict[str, bytes], product_service=None):
+    views = [v for v in IMAGE_VIEWS if v in images]
+    views += [v for v in images if v not in views]
+
+    # un solo snapshot en memoria para todas las correcciones:
+    # no hay consultas a la base de datos por foto
+    async with span("catalog"):
+        catalog = await load_catalog(product_service)
 
     # =========================
-    # Corrección por palabras clave
+    # 1. Reconocimiento + OCR (todas las vistas a la vez)
     # =========================
-    async with AsyncSessionLocal() as session:
-        product_service = ProductService(session)
-        products = await product_service.list_products()
+    # la vista principal pasa por OCR, visión y clasificador;
+    # las demás solo por OCR
+    main_view = views[0]
 
-        detected_words = product_name.lower().split()
+    async with span("recognition"):
+        recognition, *other_texts = await asyncio.gather(
+            recognize_product(images[main_view], catalog),
+            *(extract_text_async(images[v]) for v in views[1:]),
+        )
 
-        best_match = None
-        best_score = 0
+    texts = [recognition["raw_text"], *other_texts]
+    raw_texts = dict(zip(views, texts))
 
-        for p in products:
-            db_words = p.product_name.lower().split()
+    raw_text = "\n".join(t for t in texts if t)
 
-            score = len(set(detected_words) & set(db_words))
+    # la frontal tiene nombre y marca; si no se leyó nada, todo el texto
+    name_text = raw_texts.get("front") or raw_text
 
-            if score > best_score:
-                best_score = score
-                best_match = p.product_name
+    size_matches = [
+        re.search(r"(\d+(\.\d+)?)\s?(ml|l|g|kg)", t.lower()) for t in texts
+    ]
+    regex_size = next((m.group(0) for m in size_matches if m), None)
 
-        if best_match and best_score > 0:
-            product_name = best_match
+    known_product = recognition["product"]
+
+    if known_product is not None:
+        # =========================
+        # 2. Producto conocido: sin IA
+        # =========================
+        entities = {
+            "marca": known_product.brand or "desconocido",
+            "nombre_producto": known_product.product_name,
+            "fuente": recognition["source"],
+            "confianza": recognition["confidence"],
+        }
+
+        brand = entities["marca"]
+        product_name = known_product.product_name
+    else:
+        # =========================
+        # 2. IA: marca + producto
+        # =========================
+        async with span("llm_extraction"):
+            entities = await extract_product_entities(name_text)
+
+        brand = entities.get("marca", "desconocido")
+        product_name = entities.get("nombre_producto", "producto_desconocido")
+
+        # =========================
+        # Limpieza simple del nombre
+        # =========================
+        if product_name and product_name != "producto_desconocido":
+            words = product_name.split()
+            product_name = " ".join(words[:2])  # máximo 2 palabras
+
+        # =========================
+        # 2.1 Corrección con el catálogo
+        # =========================
+        with span("name_correction"):
+            product_name = correct_name_in_catalog(catalog, product_name)
+
+            # =========================
+            # Corrección por palabras clave
+            # =========================
+            best_match = None
+            if product_name and product_name != "producto_desconocido":
+                best_match = catalog.best_token_overlap(product_name)
+
+            if best_match:
+                product_name = best_match.product_name
 
     # =========================
     # NOMBRE FINAL (CLAVE)
     # =========================
     final_product_name = product_name
 
-    print("RAW OCR:", raw_text)
-    print("ENTITIES:", entities)
-    print("---------------------------")
-
     # =========================
     # 3. Parser (para precio, fechas, etc.)
     # =========================
-    parsed = parse_product_data(raw_text)
+    with span("parse"):
+        parsed_views = [parse_product_data(t) for t in texts]
 
-    size = parsed.get("size") or regex_size
-    precio = parsed.get("precio")
-    fecha_vencimiento = parsed.get("fecha_vencimiento")
-    descripcion = parsed.get("descripcion")
+        size = _first_found(parsed_views, "size") or regex_size
+        precio = _first_found(parsed_views, "precio")
+        fecha_vencimiento = _first_found(parsed_views, "fecha_vencimiento")
 
     # =========================
     # 4. Verificación
@@ -95,7 +184,8 @@ async def run_inventory_pipeline(image_bytes, product_service=None):
         "fecha_vencimiento": fecha_vencimiento,
     }
 
-    verification = verify_product_data(product_data)
+    with span("verify"):
+        verification = verify_product_data(product_data)
 
     # =========================
     # 5. Respuesta: error
@@ -105,6 +195,7 @@ async def run_inventory_pipeline(image_bytes, product_service=None):
             "status": "error",
             "message": "No se pudo detectar información suficiente del producto.",
             "raw_text": raw_text,
+            "raw_texts": raw_texts,
         }
 
     # =========================
@@ -127,24 +218,22 @@ Puedes:
 3) Indicar si el producto no tiene ese campo
 """
 
-        print("FINAL PRODUCT NAME:", final_product_name)
-        print("FINAL SIZE:", size)
-
         return {
             "status": "need_info",
             "brand": brand,
             "product_name": final_product_name,
             "size": size,
+            "precio": precio,
+            "fecha_vencimiento": fecha_vencimiento,
             "missing": missing_fields,
             "message": message,
             "raw_text": raw_text,
+            "raw_texts": raw_texts,
         }
 
     # =========================
     # 7. Confirmación final
     # =========================
-    print("NAME IN MESSAGE:", final_product_name)
-
     return {
         "status": "confirm",
         "brand": brand,
@@ -153,4 +242,5 @@ Puedes:
         "precio": precio,
         "fecha_vencimiento": fecha_vencimiento,
         "raw_text": raw_text,
+        "raw_texts": raw_texts,
     }
@@ -0,0 +1,228 @@
+"""
+Reconocimiento del producto combinando OCR, visión (ORB) y clasificador.
+
+Los tres reconocedores arrancan a la vez sobre la misma foto (visión y
+clasificador comparten el decodificado; el OCR decodifica en su worker).
+Un acierto de solo imagen no alcanza: el clasificador siempre reparte la
+probabilidad entre productos conocidos, así que un producto nuevo puede
+salir con confianza alta. Se acepta si el OCR lo confirma o si la suma
+de votos de varios reconocedores llega a ENSEMBLE_MIN_SCORE; solo
+entonces el pipeline no necesita la IA para el nombre.
+"""
+
+import asyncio
+import os
+
+from rapidfuzz import fuzz
+
+from agents.vision_agent import detect_candidates_from_image
+from ocr.image_ingest import decode_bounded
+from ocr.ocr_engine import extract_text_async
+from services.catalog_index import CatalogEntry, CatalogSnapshot
+from services.cpu_executor import ExecutorSaturated, run_cpu
+from services.fuzzy_matcher import fuzzy_matcher
+from services.product_classifier import classifier_batcher
+from services.tracing import span
+
+RECOGNITION_ENSEMBLE = os.getenv("RECOGNITION_ENSEMBLE", "1") == "1"
+
+# confianza (0..1) a partir de la cual un solo reconocedor alcanza
+VISION_HIT_CONFIDENCE = float(os.getenv("VISION_HIT_CONFIDENCE", "0.9"))
+CLASSIFIER_HIT_CONFIDENCE = float(os.getenv("CLASSIFIER_HIT_CONFIDENCE", "0.9"))
+OCR_HIT_CONFIDENCE = float(os.getenv("OCR_HIT_CONFIDENCE", "0.95"))
+
+# votos de ORB que equivalen a confianza 1.0
+VISION_STRONG_VOTES = int(os.getenv("VISION_STRONG_VOTES", "60"))
+
+# suma mínima de confianzas para aceptar el voto combinado
+ENSEMBLE_MIN_SCORE = float(os.getenv("ENSEMBLE_MIN_SCORE", "1.2"))
+
+
+# =========================
+# Votos de cada reconocedor
+# =========================
+def _vision_votes(candidates: list[dict], catalog: CatalogSnapshot) -> dict:
+    votes = {}
+
+    for candidate in candidates:
+        entry = catalog.get_by_name(candidate["product"])
+        if entry is not None:
+            votes[entry.id] = min(1.0, candidate["votes"] / VISION_STRONG_VOTES)
+
+    return votes
+
+
+def _classifier_votes(prediction: tuple[str, float], catalog: CatalogSnapshot) -> dict:
+    name, confidence = prediction
+    entry = catalog.get_by_name(name)
+
+    return {entry.id: confidence} if entry is not None else {}
+
+
+def _ocr_votes(text: str, catalog: CatalogSnapshot) -> dict:
+    if not text.strip() or not len(catalog):
+        return {}
+
+    result = fuzzy_matcher.match_many(
+        catalog, [text], limit=3, cutoff=80, scorer=fuzz.partial_ratio
+    )
+
+    return {
+        entry.id: score / 100
+        for entry, score in result.matches(0)
+        # nombres muy cortos aparecen por casualidad dentro de cualquier texto
+        if len(entry.normalized_name) >= 4
+    }
+
+
+def _best(votes: dict) -> tuple[str, float] | None:
+    if not votes:
+        return None
+    entry_id = max(votes, key=votes.get)
+    return entry_id, votes[entry_id]
+
+
+# =========================
+# Etapa de reconocimiento
+# =========================
+async def _timed(coro, name: str):
+    async with span(name):
+        return await coro
+
+
+async def _safe(coro, default):
+    # un reconocedor sin modelo o saturado no debe tumbar a los demás
+    try:
+        return await coro
+    except asyncio.CancelledError:
+        raise
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        print("Reconocedor no disponible:", e)
+        return default
+
+
+async def recognize_product(image_bytes: bytes, catalog: CatalogSnapshot) -> dict:
+    """
+    Devuelve:
+    {
+        "raw_text": texto del OCR,
+        "product": CatalogEntry o None,
+        "source": "vision" | "classifier" | "ocr" | "ensemble" | None,
+        "confidence": float,
+        "votes": {recognizer: {product_id: confianza}},
+    }
+    """
+    ocr_task = asyncio.create_task(_timed(extract_text_async(image_bytes), "ocr"))
+
+    if not RECOGNITION_ENSEMBLE:
+        return _result(await ocr_task, None, None, 0.0, {})
+
+    image_tasks = {}
+    votes = {}
+    hit = None
+    pending = set()
+    raw_text = None
+
+    try:
+        async with span("decode"):
+            img = await run_cpu(decode_bounded, image_bytes)
+
+        if img is not None:
+            image_tasks = {
+                asyncio.create_task(
+                    _safe(
+                        _timed(run_cpu(detect_candidates_from_image, img), "vision"),
+                        [],
+                    )
+                ): "vision",
+                asyncio.create_task(
+                    _safe(
+                        _timed(classifier_batcher.predict_image(img), "classifier"),
+                        ("", 0.0),
+                    )
+                ): "classifier",
+            }
+            pending = set(image_tasks)
+
+        # visión y clasificador: el primero que acierte con confianza alta
+        # y que el OCR confirme gana; el otro se cancela
+        while pending and hit is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in done:
+                recognizer = image_tasks[task]
+
+                if recognizer == "vision":
+                    votes["vision"] = _vision_votes(task.result(), catalog)
+                    threshold = VISION_HIT_CONFIDENCE
+                else:
+                    votes["classifier"] = _classifier_votes(task.result(), catalog)
+                    threshold = CLASSIFIER_HIT_CONFIDENCE
+
+                best = _best(votes[recognizer])
+                if not best or best[1] < threshold:
+                    continue
+
+                if raw_text is None:
+                    raw_text = await ocr_task
+                    votes["ocr"] = _ocr_votes(raw_text, catalog)
+
+                if best[0] in votes["ocr"]:
+                    hit = (best[0], recognizer, best[1])
+                    break
+    except BaseException:
+        ocr_task.cancel()
+        raise
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if hit is not None:
+        entry_id, source, confidence = hit
+        return _result(raw_text, _entry(catalog, entry_id), source, confidence, votes)
+
+    # el OCR siempre hace falta para tamaño, precio y vencimiento
+    if raw_text is None:
+        raw_text = await ocr_task
+        votes["ocr"] = _ocr_votes(raw_text, catalog)
+
+    best = _best(votes["ocr"])
+    if best and best[1] >= OCR_HIT_CONFIDENCE:
+        return _result(raw_text, _entry(catalog, best[0]), "ocr", best[1], votes)
+
+    # sin confirmación: sumar las confianzas por producto; un solo
+    # reconocedor no llega (máximo 1.0), hacen falta al menos dos
+    totals = {}
+    for recognizer_votes in votes.values():
+        for entry_id, confidence in recognizer_votes.items():
+            totals[entry_id] = totals.get(entry_id, 0.0) + confidence
+
+    best = _best(totals)
+    if best and best[1] >= ENSEMBLE_MIN_SCORE:
+        return _result(raw_text, _entry(catalog, best[0]), "ensemble", best[1], votes)
+
+    return _result(raw_text, None, None, 0.0, votes)
+
+
+def _entry(catalog: CatalogSnapshot, entry_id: str) -> CatalogEntry:
+    return catalog.entries[catalog.by_id[entry_id]]
+
+
+def _result(
+    raw_text: str,
+    product: CatalogEntry | None,
+    source: str | None,
+    confidence: float,
+    votes: dict,
+) -> dict:
+    return {
+        "raw_text": raw_text,
+        "product": product,
+        "source": source,
+        "confidence": confidence,
+        "votes": votes,
+    }
@@ -0,0 +1,69 @@
+"""
+Compare latency and throughput of the Keras and TFLite classifier runtimes.
+
+Runs single-image predictions (latency) and batched predictions
+(throughput) on random inputs for every available runtime.
+"""
+
+import sys
+import os
+import argparse
+import time
+
+# Add project root to PYTHONPATH
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+import numpy as np
+
+from services.product_classifier import IMG_SIZE, KerasRuntime, TFLiteRuntime
+
+
+def benchmark(runtime, runs: int, batch_size: int) -> dict:
+    single = np.random.rand(1, IMG_SIZE, IMG_SIZE, 3).astype(np.float32)
+    batch = np.random.rand(batch_size, IMG_SIZE, IMG_SIZE, 3).astype(np.float32)
+
+    # calentar
+    runtime.predict(single)
+    runtime.predict(batch)
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        runtime.predict(single)
+    latency = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        runtime.predict(batch)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latency_ms": 1000 * latency,
+        "throughput_per_s": runs * batch_size / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    runtimes = []
+    for runtime_cls in (KerasRuntime, TFLiteRuntime):
+        try:
+            runtimes.append(runtime_cls())
+        except Exception as e:
+            print(f"⚠️ {runtime_cls.backend} no disponible:", e)
+
+    for runtime in runtimes:
+        result = benchmark(runtime, args.runs, args.batch_size)
+        print(
+            f"{runtime.backend:>7}: "
+            f"{result['latency_ms']:.1f} ms/imagen, "
+            f"{result['throughput_per_s']:.1f} imágenes/s (lote {args.batch_size})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Build or update the on-disk ORB descriptor index used by vision_agent.
+
+Only product folders whose images changed since the last build are
+recomputed. Use --force to rebuild everything.
+"""
+
+import sys
+import os
+import argparse
+
+# Add project root to PYTHONPATH
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from agents.vision_index import DATASET_PATH, VISION_INDEX_DIR, build_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--output", default=VISION_INDEX_DIR)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    report = build_index(args.dataset, args.output, force=args.force)
+
+    print(f"✅ Recalculados: {len(report['rebuilt'])} {report['rebuilt']}")
+    print(f"♻️ Reutilizados: {len(report['reused'])}")
+    print(f"🗑️ Eliminados: {len(report['removed'])} {report['removed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Bulk product registration from a directory tree of photos.
+
+Every folder whose images are named after the registration views
+(front, side_left, side_right) becomes one product; in folders without
+view names each image is a product on its own (front view). Photos go
+through the same recognition pipeline as detectProductFromImages, new
+products are inserted in batches, and a checkpoint file records every
+finished product so an interrupted run resumes where it stopped.
+
+Example:
+    python scripts/bulk_ingest.py fotos_tienda --workers 4 --batch-size 25
+"""
+
+import sys
+import os
+import argparse
+import asyncio
+import json
+import time
+
+# Add project root to PYTHONPATH
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from database.db import AsyncSessionLocal
+from llm.http_client import close_http_client
+from ocr.ocr_engine import ocr_engine
+from planner.inventory_planner import IMAGE_VIEWS, load_catalog, run_multi_image_pipeline
+from services.cpu_executor import ExecutorSaturated, cpu_executor
+from services.catalog_index import normalize_text
+from services.product_service import ProductService
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+DEFAULT_CHECKPOINT = "bulk_ingest.checkpoint.jsonl"
+
+# pipeline results that are registered as new products
+SAVE_STATUSES = ("confirm", "need_info")
+
+# placeholders the pipeline returns when it could not read a name
+UNKNOWN_NAMES = ("producto_desconocido", "no_detectado")
+
+# wait before retrying a product when the OCR/CPU queues are full
+SATURATED_RETRY_SECONDS = 0.5
+
+
+# --------------------------------------------------
+# Discovery
+# --------------------------------------------------
+def _view_of(filename: str) -> str | None:
+    name = filename.lower()
+
+    for view in IMAGE_VIEWS:
+        if view in name:
+            return view
+
+    return None
+
+
+def find_products(root: str) -> list[tuple[str, dict[str, str]]]:
+    """
+    Returns (key, {view: path}) for every product under root, in a
+    stable order. The key (path relative to root) identifies the product
+    in the checkpoint.
+    """
+    products = []
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+
+        images = sorted(f for f in filenames if f.lower().endswith(IMAGE_EXTENSIONS))
+        views = {}
+
+        for filename in images:
+            view = _view_of(filename)
+            if view is not None and view not in views:
+                views[view] = os.path.join(dirpath, filename)
+
+        if views:
+            products.append((os.path.relpath(dirpath, root), views))
+            continue
+
+        for filename in images:
+            path = os.path.join(dirpath, filename)
+            products.append((os.path.relpath(path, root), {"front": path}))
+
+    return products
+
+
+def _read_images(views: dict[str, str]) -> dict[str, bytes]:
+    images = {}
+
+    for view, path in views.items():
+        with open(path, "rb") as f:
+            images[view] = f.read()
+
+    return images
+
+
+# --------------------------------------------------
+# Checkpoint
+# --------------------------------------------------
+def load_checkpoint(path: str, retry_errors: bool = False) -> set[str]:
+    done = set()
+
+    if not os.path.exists(path):
+        return done
+
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # last line of a run that was killed mid-write
+                continue
+
+            if retry_errors and entry["status"] == "error":
+                done.discard(entry["key"])
+            else:
+                done.add(entry["key"])
+
+    return done
+
+
+# --------------------------------------------------
+# Ingestion
+# --------------------------------------------------
+class BulkIngester:
+
+    def __init__(self, args, total: int):
+        self.args = args
+        self.total = total
+
+        # (checkpoint entry, pipeline result, images to save)
+        self.pending: list[tuple[dict, dict, dict[str, bytes] | None]] = []
+        self.names: set[str] = set()
+        self.catalog = None
+
+        self.counts = {"saved": 0, "exists": 0, "error": 0}
+        self.processed = 0
+        self.images = 0
+        self.started_at = time.perf_counter()
+
+        self._flush_lock = asyncio.Lock()
+        self._checkpoint = open(args.checkpoint, "a")
+
+    async def process(self, key: str, views: dict[str, str]):
+        images = await asyncio.to_thread(_read_images, views)
+
+        while True:
+            try:
+                result = await run_multi_image_pipeline(images)
+                break
+            except ExecutorSaturated:
+                await asyncio.sleep(SATURATED_RETRY_SECONDS)
+
+        self.images += len(images)
+        self.processed += 1
+
+        status = result["status"]
+        name = result.get("product_name")
+
+        # product ids are derived from the lowercased name, so duplicates
+        # are checked on the normalized form
+        normalized = normalize_text(name)
+
+        if status not in SAVE_STATUSES:
+            entry = {"key": key, "status": "error", "message": result.get("message")}
+            images = None
+        elif not normalized or name in UNKNOWN_NAMES:
+            entry = {
+                "key": key,
+                "status": "error",
+                "message": "No se detectó el nombre del producto.",
+            }
+            images = None
+        elif normalized in self.names or self.catalog.get_by_name(name) is not None:
+            entry = {"key": key, "status": "exists", "product": name}
+            images = None
+        else:
+            entry = {"key": key, "status": "saved", "product": name}
+            self.names.add(normalized)
+
+        self.pending.append((entry, result, images))
+        self.report_progress()
+
+        if len(self.pending) >= self.args.batch_size:
+            await self.flush()
+
+    async def _save(self, items: list[dict]):
+        async with AsyncSessionLocal() as session:
+            await ProductService(session).create_products_bulk(items)
+
+    async def _save_each(self, to_save: list[tuple[dict, dict]]):
+        """
+        Fallback when a batch fails: saves the products one by one so a
+        single bad product does not block the rest of the batch.
+        """
+        for entry, item in to_save:
+            try:
+                await self._save([item])
+            except Exception as e:
+                print(f"❌ {entry['key']}:", e)
+                self.names.discard(normalize_text(entry["product"]))
+                entry.update(status="error", message=str(e))
+
+    async def flush(self):
+        """
+        Inserts the pending products in one transaction and only then
+        marks them as done in the checkpoint.
+        """
+        async with self._flush_lock:
+            batch, self.pending = self.pending, []
+            if not batch:
+                return
+
+            to_save = [
+                (
+                    entry,
+                    {
+                        "name": entry["product"],
+                        "stock": self.args.stock,
+                        "images": images,
+                        "brand": result.get("brand"),
+                        "size": result.get("size"),
+                        "price": result.get("precio"),
+                        "expiration_date": result.get("fecha_vencimiento"),
+                    },
+                )
+                for entry, result, images in batch
+                if entry["status"] == "saved"
+            ]
+
+            if to_save and not self.args.dry_run:
+                try:
+                    await self._save([item for _, item in to_save])
+                except Exception as e:
+                    print(
+                        f"⚠️ Error guardando un lote de {len(to_save)} productos, "
+                        "se reintentan de a uno:",
+                        e,
+                    )
+                    await self._save_each(to_save)
+
+            for entry, _, _ in batch:
+                self.counts[entry["status"]] += 1
+
+            if self.args.dry_run:
+                return
+
+            for entry, _, _ in batch:
+                self._checkpoint.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+            self._checkpoint.flush()
+            os.fsync(self._checkpoint.fileno())
+
+    def report_progress(self, force: bool = False):
+        if not force and self.processed % self.args.report_every:
+            return
+
+        elapsed = time.perf_counter() - self.started_at
+        rate = self.images / elapsed if elapsed else 0.0
+
+        print(
+            f"📦 {self.processed}/{self.total} productos | "
+            f"{self.images} imágenes en {elapsed:.1f}s | {rate:.2f} imágenes/s"
+        )
+
+    def close(self):
+        self._checkpoint.close()
+
+
+async def worker(ingester: BulkIngester, queue: asyncio.Queue):
+    while True:
+        item = await queue.get()
+        try:
+            if item is None:
+                return
+
+            key, views = item
+            try:
+                await ingester.process(key, views)
+            except Exception as e:
+                print(f"❌ {key}:", e)
+        finally:
+            queue.task_done()
+
+
+async def ingest(args):
+    products = find_products(args.root)
+    done = load_checkpoint(args.checkpoint, args.retry_errors)
+    todo = [(key, views) for key, views in products if key not in done]
+
+    print(
+        f"🔎 {len(products)} productos encontrados, "
+        f"{len(products) - len(todo)} ya procesados, {len(todo)} pendientes"
+    )
+
+    if not todo:
+        return
+
+    ingester = BulkIngester(args, len(todo))
+    ingester.catalog = await load_catalog()
+
+    # queue bounded to the pool size: photos are read only when a worker is free
+    queue = asyncio.Queue(maxsize=args.workers)
+    workers = [
+        asyncio.create_task(worker(ingester, queue)) for _ in range(args.workers)
+    ]
+
+    try:
+        for item in todo:
+            await queue.put(item)
+
+        for _ in workers:
+            await queue.put(None)
+
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+
+        await ingester.flush()
+        ingester.close()
+
+        ingester.report_progress(force=True)
+        print(
+            f"✅ Guardados: {ingester.counts['saved']} | "
+            f"ya existían: {ingester.counts['exists']} | "
+            f"errores: {ingester.counts['error']}"
+        )
+
+        await close_http_client()
+        ocr_engine.shutdown()
+        cpu_executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("root", help="folder with the product photos")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--stock", type=int, default=0)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--report-every", type=int, default=10)
+    parser.add_argument(
+        "--retry-errors",
+        action="store_true",
+        help="process again the products that failed in a previous run",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="run the pipeline without saving"
+    )
+    args = parser.parse_args()
+
+    asyncio.run(ingest(args))
+
+
+if __name__ == "__main__":
+    main()
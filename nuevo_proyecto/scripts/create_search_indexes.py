@@ -0,0 +1,45 @@
+"""
+Add trigram search indexes to an existing product_stocks table.
+
+create_all() only creates missing tables, so databases created before
+the pg_trgm indexes were added to the models need this migration.
+"""
+
+import sys
+import os
+import asyncio
+
+# Add project root to PYTHONPATH
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+from sqlalchemy import text
+
+from database.connection import get_engine
+
+
+STATEMENTS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS ix_product_stocks_product_name_trgm
+    ON public.product_stocks USING gin (product_name gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_product_stocks_brand_trgm
+    ON public.product_stocks USING gin (brand gin_trgm_ops)
+    """,
+]
+
+
+async def create_search_indexes():
+    engine = get_engine()
+
+    async with engine.begin() as conn:
+        for statement in STATEMENTS:
+            await conn.execute(text(statement))
+
+    print("✅ Índices de búsqueda creados correctamente.")
+
+
+if __name__ == "__main__":
+    asyncio.run(create_search_indexes())
@@ -11,6 +11,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(PROJECT_ROOT)
 
 from database.connection import get_engine
+from database.trigram import ensure_pg_trgm
 from database.models.product_stock import Base as ProductStockBase
 from database.models.product_image import ProductImage  # noqa: F401
 
@@ -19,6 +20,7 @@ async def create_tables():
     engine = get_engine()
 
     async with engine.begin() as conn:
+        await ensure_pg_trgm(conn)
         await conn.run_sync(ProductStockBase.metadata.create_all)
 
     print("✅ Tablas creadas correctamente.")
@@ -0,0 +1,78 @@
+"""
+Export the Keras product classifier (product_classifier.h5) to TFLite.
+
+With --int8 the model is fully quantized to int8 using images from the
+training dataset as representative data.
+"""
+
+import sys
+import os
+import argparse
+
+# Add project root to PYTHONPATH
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(PROJECT_ROOT)
+
+import numpy as np
+import tensorflow as tf
+
+from services.product_classifier import (
+    CLASSIFIER_H5_PATH,
+    CLASSIFIER_TFLITE_PATH,
+    preprocess,
+)
+
+
+def representative_dataset(dataset_path: str, limit: int = 200):
+    count = 0
+
+    for product_name in sorted(os.listdir(dataset_path)):
+        product_path = os.path.join(dataset_path, product_name)
+        if not os.path.isdir(product_path):
+            continue
+
+        for img_name in sorted(os.listdir(product_path)):
+            with open(os.path.join(product_path, img_name), "rb") as f:
+                img = preprocess(f.read())
+
+            if img is None:
+                continue
+
+            yield [np.expand_dims(img, axis=0)]
+
+            count += 1
+            if count >= limit:
+                return
+
+
+def export(model_path: str, output_path: str, int8: bool, dataset_path: str):
+    model = tf.keras.models.load_model(model_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: representative_dataset(dataset_path)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+    size_mb = os.path.getsize(output_path) / 1024 / 1024
+    print(f"✅ Modelo exportado a {output_path} ({size_mb:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=CLASSIFIER_H5_PATH)
+    parser.add_argument("--output", default=CLASSIFIER_TFLITE_PATH)
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--dataset", default="imagenes_productos")
+    args = parser.parse_args()
+
+    export(args.model, args.output, args.int8, args.dataset)
+
+
+if __name__ == "__main__":
+    main()
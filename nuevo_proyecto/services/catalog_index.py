@@ -0,0 +1,281 @@
+"""
+Índice en memoria del catálogo de productos.
+
+Se construye a partir de product_stocks, se actualiza de forma
+incremental cuando ProductService registra productos y se vuelve a leer
+cada CATALOG_TTL_SECONDS para ver lo que registraron otros procesos.
+Solo guarda datos que casi no cambian (nombre, marca, tamaño): el stock
+se consulta siempre en la base de datos.
+"""
+
+import asyncio
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+
+CATALOG_TTL_SECONDS = float(os.getenv("CATALOG_TTL_SECONDS", "300"))
+
+
+# =========================
+# Normalización de texto
+# =========================
+def normalize_text(text: str | None) -> str:
+    if not text:
+        return ""
+
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+
+    return text.strip()
+
+
+def tokenize(text: str | None) -> list[str]:
+    return normalize_text(text).split()
+
+
+def trigrams(normalized: str) -> set[str]:
+    return {normalized[i : i + 3] for i in range(len(normalized) - 2)}
+
+
+# =========================
+# Entrada del catálogo
+# =========================
+@dataclass(frozen=True)
+class CatalogEntry:
+    id: str
+    product_name: str
+    brand: str | None
+    size: str | None
+    normalized_name: str
+
+    @classmethod
+    def from_product(cls, product) -> "CatalogEntry":
+        return cls(
+            id=str(product.id),
+            product_name=product.product_name,
+            brand=getattr(product, "brand", None),
+            size=getattr(product, "size", None),
+            normalized_name=normalize_text(product.product_name),
+        )
+
+
+# =========================
+# Snapshot inmutable
+# =========================
+class CatalogSnapshot:
+    """
+    Vista de solo lectura del catálogo.
+    Cada escritura genera un snapshot nuevo con version + 1,
+    así quien ya tiene uno en mano nunca lo ve cambiar.
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.entries: list[CatalogEntry] = []
+        self.by_id: dict[str, int] = {}
+        self.by_name: dict[str, int] = {}
+        self.token_postings: dict[str, frozenset[int]] = {}
+        self.trigram_postings: dict[str, frozenset[int]] = {}
+
+    @classmethod
+    def build(cls, products, version: int = 1) -> "CatalogSnapshot":
+        snapshot = cls(version)
+
+        tokens: dict[str, set[int]] = {}
+        grams: dict[str, set[int]] = {}
+
+        for product in products:
+            entry = CatalogEntry.from_product(product)
+            if entry.id in snapshot.by_id:
+                continue
+
+            pos = len(snapshot.entries)
+            snapshot.entries.append(entry)
+            snapshot.by_id[entry.id] = pos
+            snapshot.by_name.setdefault(entry.normalized_name, pos)
+
+            for token in entry.normalized_name.split():
+                tokens.setdefault(token, set()).add(pos)
+
+            for gram in trigrams(entry.normalized_name):
+                grams.setdefault(gram, set()).add(pos)
+
+        snapshot.token_postings = {k: frozenset(v) for k, v in tokens.items()}
+        snapshot.trigram_postings = {k: frozenset(v) for k, v in grams.items()}
+
+        return snapshot
+
+    def with_entry(self, entry: CatalogEntry) -> "CatalogSnapshot":
+        return self.with_entries([entry])
+
+    def with_entries(self, entries: list[CatalogEntry]) -> "CatalogSnapshot":
+        """
+        Devuelve un snapshot nuevo con las entradas agregadas o
+        reemplazadas. Los diccionarios se copian una vez por lote (no por
+        entrada) y solo se rehacen las listas de postings que cambian.
+        """
+        new = CatalogSnapshot(self.version + 1)
+        new.entries = list(self.entries)
+        new.by_id = dict(self.by_id)
+        new.by_name = dict(self.by_name)
+        new.token_postings = dict(self.token_postings)
+        new.trigram_postings = dict(self.trigram_postings)
+
+        for entry in entries:
+            pos = new.by_id.get(entry.id)
+
+            if pos is not None:
+                new._discard(pos, new.entries[pos])
+                new.entries[pos] = entry
+            else:
+                pos = len(new.entries)
+                new.entries.append(entry)
+                new.by_id[entry.id] = pos
+
+            new.by_name.setdefault(entry.normalized_name, pos)
+
+            for token in set(entry.normalized_name.split()):
+                new.token_postings[token] = new.token_postings.get(
+                    token, frozenset()
+                ) | {pos}
+
+            for gram in trigrams(entry.normalized_name):
+                new.trigram_postings[gram] = new.trigram_postings.get(
+                    gram, frozenset()
+                ) | {pos}
+
+        return new
+
+    def _discard(self, pos: int, entry: CatalogEntry):
+        if self.by_name.get(entry.normalized_name) == pos:
+            del self.by_name[entry.normalized_name]
+
+        for token in set(entry.normalized_name.split()):
+            self.token_postings[token] = self.token_postings[token] - {pos}
+
+        for gram in trigrams(entry.normalized_name):
+            self.trigram_postings[gram] = self.trigram_postings[gram] - {pos}
+
+    # =========================
+    # Consultas
+    # =========================
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_by_name(self, name: str) -> CatalogEntry | None:
+        pos = self.by_name.get(normalize_text(name))
+        return self.entries[pos] if pos is not None else None
+
+    def find_substring(self, text: str) -> list[CatalogEntry]:
+        """
+        Productos cuyo nombre contiene el texto.
+        Los trigramas del texto acotan las filas a revisar.
+        """
+        needle = normalize_text(text)
+        if not needle:
+            return []
+
+        needle_grams = trigrams(needle)
+
+        if needle_grams:
+            positions = None
+            for gram in needle_grams:
+                posting = self.trigram_postings.get(gram)
+                if not posting:
+                    return []
+                positions = posting if positions is None else positions & posting
+            candidates = sorted(positions)
+        else:
+            candidates = range(len(self.entries))
+
+        return [
+            self.entries[pos]
+            for pos in candidates
+            if needle in self.entries[pos].normalized_name
+        ]
+
+    def best_token_overlap(self, text: str) -> CatalogEntry | None:
+        """
+        Producto que comparte más palabras con el texto;
+        ante un empate gana el que se registró primero.
+        """
+        counts: Counter[int] = Counter()
+
+        for token in set(tokenize(text)):
+            counts.update(self.token_postings.get(token, ()))
+
+        if not counts:
+            return None
+
+        best = max(counts.values())
+        pos = min(p for p, c in counts.items() if c == best)
+
+        return self.entries[pos]
+
+
+# =========================
+# Índice de proceso
+# =========================
+class CatalogIndex:
+
+    def __init__(self, ttl: float = CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        self._snapshot: CatalogSnapshot | None = None
+        self._loaded_at = 0.0
+        self._pending: list[CatalogEntry] = []
+        self._loading = False
+        self._lock = asyncio.Lock()
+
+    def _expired(self) -> bool:
+        return time.monotonic() - self._loaded_at > self.ttl
+
+    def snapshot(self) -> CatalogSnapshot | None:
+        # vencido: quien lo pida pasa por ensure_loaded y se relee
+        if self._snapshot is None or self._expired():
+            return None
+        return self._snapshot
+
+    async def ensure_loaded(self, product_service) -> CatalogSnapshot:
+        if self.snapshot() is not None:
+            return self._snapshot
+
+        async with self._lock:
+            if self.snapshot() is None:
+                self._loading = True
+                try:
+                    products = await product_service.list_catalog_rows()
+                    snapshot = CatalogSnapshot.build(products)
+
+                    # escrituras que llegaron mientras se leía la tabla
+                    if self._pending:
+                        snapshot = snapshot.with_entries(self._pending)
+
+                    self._snapshot = snapshot
+                    self._loaded_at = time.monotonic()
+                finally:
+                    self._pending = []
+                    self._loading = False
+
+        return self._snapshot
+
+    def upsert(self, product):
+        self.upsert_many([product])
+
+    def upsert_many(self, products):
+        entries = [CatalogEntry.from_product(p) for p in products]
+
+        if self._loading:
+            self._pending.extend(entries)
+
+        if self._snapshot is not None:
+            self._snapshot = self._snapshot.with_entries(entries)
+
+    def invalidate(self):
+        self._snapshot = None
+
+
+catalog_index = CatalogIndex()
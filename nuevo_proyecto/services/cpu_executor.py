@@ -0,0 +1,94 @@
+"""
+Executor acotado para el trabajo de CPU (decodificar imágenes, ORB,
+predicción del clasificador).
+
+Todo lo que bloquea corre en estos hilos y no en el event loop, así el
+chat y las consultas siguen respondiendo mientras se procesan fotos. Si
+ya hay demasiadas tareas pendientes se rechaza la nueva con
+ExecutorSaturated para que el cliente reintente.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+CPU_MAX_PENDING = int(os.getenv("CPU_MAX_PENDING", "32"))
+
+BUSY_IMAGES_MESSAGE = (
+    "⚠️ Hay muchas imágenes en proceso, intenta nuevamente en unos segundos."
+)
+
+
+class ExecutorSaturated(Exception):
+    """Hay demasiadas tareas de CPU en espera."""
+
+
+class BoundedExecutor:
+
+    def __init__(
+        self,
+        max_workers: int = CPU_WORKERS,
+        max_pending: int = CPU_MAX_PENDING,
+        name: str = "cpu",
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+
+        # solo se modifica desde el event loop
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, func, *args, **kwargs):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(f"Executor {self.name} saturado")
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        self._pending += 1
+
+        # el lugar se libera cuando termina el hilo, no cuando se cancela
+        # a quien espera: una tarea cancelada sigue ocupando el worker
+        future.add_done_callback(lambda _: self._release(loop))
+
+        result = await asyncio.wrap_future(future)
+        self.completed += 1
+
+        return result
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        # se llama desde el hilo del worker
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:
+            # el loop ya se cerró
+            pass
+
+    def _decrement(self):
+        self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "workers": self.max_workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+cpu_executor = BoundedExecutor()
+
+
+async def run_cpu(func, *args, **kwargs):
+    return await cpu_executor.run(func, *args, **kwargs)
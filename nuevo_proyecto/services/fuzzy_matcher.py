@@ -0,0 +1,96 @@
+"""
+Fuzzy matching por lotes contra el catálogo.
+
+Todas las consultas se puntúan en una sola llamada a rapidfuzz.process.cdist
+(multihilo) contra los nombres ya preprocesados del snapshot del catálogo.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+from services.catalog_index import CatalogEntry, CatalogSnapshot
+
+
+@dataclass
+class MatchResult:
+    """
+    indices[i, j] es la posición en el catálogo del j-ésimo mejor
+    resultado de la consulta i, y scores[i, j] su puntaje (0-100).
+    Los empates se ordenan por posición en el catálogo.
+    """
+
+    indices: np.ndarray
+    scores: np.ndarray
+    entries: list[CatalogEntry]
+
+    def matches(self, row: int) -> list[tuple[CatalogEntry, float]]:
+        return [
+            (self.entries[pos], float(score))
+            for pos, score in zip(self.indices[row], self.scores[row])
+            if score > 0
+        ]
+
+    def best(self, row: int) -> tuple[CatalogEntry, float] | None:
+        found = self.matches(row)
+        return found[0] if found else None
+
+
+class FuzzyMatcher:
+
+    def __init__(self, workers: int = -1):
+        self.workers = workers
+        self._catalog: CatalogSnapshot | None = None
+        self._choices: list[str] = []
+
+    def _choices_for(self, catalog: CatalogSnapshot) -> list[str]:
+        # se preprocesa una sola vez por snapshot
+        if catalog is not self._catalog:
+            self._choices = [
+                utils.default_process(e.product_name) for e in catalog.entries
+            ]
+            self._catalog = catalog
+
+        return self._choices
+
+    def match_many(
+        self,
+        catalog: CatalogSnapshot,
+        queries: list[str],
+        limit: int = 5,
+        cutoff: float = 0,
+        scorer=fuzz.partial_ratio,
+    ) -> MatchResult:
+        choices = self._choices_for(catalog)
+        k = min(limit, len(choices))
+
+        if not queries or k == 0:
+            empty = np.zeros((len(queries), 0))
+            return MatchResult(
+                empty.astype(np.intp), empty.astype(np.float32), catalog.entries
+            )
+
+        scores = process.cdist(
+            [utils.default_process(q) for q in queries],
+            choices,
+            scorer=scorer,
+            processor=None,
+            score_cutoff=cutoff,
+            dtype=np.float32,
+            workers=self.workers,
+        )
+
+        # top-k por fila sin ordenar toda la matriz
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+
+        # mayor puntaje primero; a igual puntaje, el que está antes en el catálogo
+        order = np.lexsort((top, -top_scores), axis=1)
+        indices = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return MatchResult(indices, top_scores, catalog.entries)
+
+
+fuzzy_matcher = FuzzyMatcher()
@@ -0,0 +1,451 @@
+"""
+Trabajos de detección de productos en segundo plano.
+
+submit() guarda las imágenes en una tabla SQLite local y devuelve el id
+al instante; un grupo fijo de workers (DETECTION_WORKERS) procesa la
+cola, así una ráfaga de fotos espera en la tabla y no en la conexión
+HTTP del cliente. Los trabajos que quedaron a medias por un reinicio
+vuelven a la cola al iniciar.
+
+El producto detectado queda en la fila del trabajo (con sus imágenes)
+hasta que se confirma con el id del trabajo; así varios trabajos en
+paralelo no se pisan entre sí.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable
+
+from services.cpu_executor import ExecutorSaturated
+
+DETECTION_JOBS_PATH = os.getenv("DETECTION_JOBS_PATH", "detection_jobs.db")
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "2"))
+
+# trabajos en espera a partir de los cuales se rechazan nuevos
+DETECTION_MAX_QUEUED = int(os.getenv("DETECTION_MAX_QUEUED", "200"))
+
+# los trabajos terminados se borran después de este tiempo
+DETECTION_JOB_TTL = float(os.getenv("DETECTION_JOB_TTL", "86400"))
+
+# espera antes de reintentar si el OCR o la CPU están saturados
+SATURATED_RETRY_SECONDS = 1.0
+
+FINISHED_STATUSES = ("done", "error")
+
+
+class JobQueueFull(Exception):
+    """Hay demasiados trabajos en espera."""
+
+
+# =========================
+# Tabla de trabajos en SQLite
+# =========================
+class SQLiteJobStore:
+
+    def __init__(self, path: str = DETECTION_JOBS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS detection_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                images TEXT,
+                result TEXT,
+                product TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                confirmed_at REAL
+            )
+            """
+        )
+        # tablas creadas antes de guardar el producto detectado
+        columns = {
+            row["name"]
+            for row in self._conn.execute("PRAGMA table_info(detection_jobs)")
+        }
+        for column, kind in (("product", "TEXT"), ("confirmed_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(
+                    f"ALTER TABLE detection_jobs ADD COLUMN {column} {kind}"
+                )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_detection_jobs_status "
+            "ON detection_jobs (status, created_at)"
+        )
+        self._conn.commit()
+
+    def _write(self, sql: str, params: tuple) -> int:
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def create(self, job_id: str, images: dict[str, str]):
+        self._write(
+            "INSERT INTO detection_jobs (id, status, images, created_at) "
+            "VALUES (?, 'queued', ?, ?)",
+            (job_id, json.dumps(images), time.time()),
+        )
+
+    def mark_running(self, job_id: str):
+        self._write(
+            "UPDATE detection_jobs SET status = 'running', started_at = ? WHERE id = ?",
+            (time.time(), job_id),
+        )
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        result: str | None,
+        product: dict | None,
+        error: str | None,
+    ):
+        # sin producto que confirmar las imágenes ya no hacen falta:
+        # la tabla no crece con cada foto
+        self._write(
+            "UPDATE detection_jobs SET status = ?, result = ?, product = ?, "
+            "error = ?, finished_at = ?, "
+            "images = CASE WHEN ? THEN images END WHERE id = ?",
+            (
+                status,
+                result,
+                json.dumps(product) if product is not None else None,
+                error,
+                time.time(),
+                product is not None,
+                job_id,
+            ),
+        )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result, product, error, created_at, "
+                "started_at, finished_at, confirmed_at "
+                "FROM detection_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        job = dict(row)
+        if job["product"] is not None:
+            job["product"] = json.loads(job["product"])
+
+        return job
+
+    def images(self, job_id: str) -> dict[str, str] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT images FROM detection_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        if row is None or row["images"] is None:
+            return None
+
+        return json.loads(row["images"])
+
+    def pending_product(self, job_id: str) -> dict | None:
+        """Producto detectado por el trabajo que aún no se confirmó."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT product FROM detection_jobs WHERE id = ? "
+                "AND status = 'done' AND confirmed_at IS NULL",
+                (job_id,),
+            ).fetchone()
+
+        if row is None or row["product"] is None:
+            return None
+
+        return json.loads(row["product"])
+
+    def update_product(self, job_id: str, product: dict) -> bool:
+        return bool(
+            self._write(
+                "UPDATE detection_jobs SET product = ? "
+                "WHERE id = ? AND status = 'done' AND confirmed_at IS NULL",
+                (json.dumps(product), job_id),
+            )
+        )
+
+    def claim_product(self, job_id: str) -> tuple[dict, dict[str, str]] | None:
+        """
+        Marca el producto como confirmado y devuelve (producto, imágenes).
+        Solo un llamador lo obtiene aunque se confirme dos veces a la vez.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE detection_jobs SET confirmed_at = ? "
+                "WHERE id = ? AND status = 'done' AND confirmed_at IS NULL "
+                "AND product IS NOT NULL AND images IS NOT NULL",
+                (time.time(), job_id),
+            )
+            self._conn.commit()
+
+            if not cursor.rowcount:
+                return None
+
+            row = self._conn.execute(
+                "SELECT product, images FROM detection_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+        return json.loads(row["product"]), json.loads(row["images"])
+
+    def release_product(self, job_id: str):
+        # el guardado falló: el producto vuelve a quedar pendiente
+        self._write(
+            "UPDATE detection_jobs SET confirmed_at = NULL WHERE id = ?", (job_id,)
+        )
+
+    def complete_product(self, job_id: str):
+        self._write("UPDATE detection_jobs SET images = NULL WHERE id = ?", (job_id,))
+
+    def requeue_unfinished(self) -> list[str]:
+        """
+        Devuelve a la cola los trabajos que estaban en espera o a medias,
+        en el orden en que llegaron.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE detection_jobs SET status = 'queued', started_at = NULL "
+                "WHERE status = 'running'"
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id FROM detection_jobs WHERE status = 'queued' "
+                "ORDER BY created_at"
+            ).fetchall()
+
+        return [row["id"] for row in rows]
+
+    def purge_finished(self, ttl: float = DETECTION_JOB_TTL):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM detection_jobs WHERE status IN ('done', 'error') "
+                "AND finished_at < ?",
+                (time.time() - ttl,),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# =========================
+# Cola y workers
+# =========================
+class DetectionJobService:
+
+    def __init__(
+        self,
+        store: SQLiteJobStore | None = None,
+        workers: int = DETECTION_WORKERS,
+        max_queued: int = DETECTION_MAX_QUEUED,
+    ):
+        self._store = store
+        self.workers = workers
+        self.max_queued = max_queued
+
+        self._handler: Callable[
+            [dict[str, str]], Awaitable[tuple[str, dict | None]]
+        ] | None = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+
+        # un evento por trabajo observado, se dispara en cada cambio de estado
+        self._events: dict[str, asyncio.Event] = {}
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def store(self) -> SQLiteJobStore:
+        # la tabla se abre recién al usarla
+        if self._store is None:
+            self._store = SQLiteJobStore()
+        return self._store
+
+    async def start(
+        self,
+        handler: Callable[[dict[str, str]], Awaitable[tuple[str, dict | None]]],
+    ):
+        """
+        handler recibe {vista: imagen_base64} y devuelve el mensaje
+        para el chat y el producto detectado (o None).
+        """
+        self._handler = handler
+        self._queue = asyncio.Queue()
+
+        await asyncio.to_thread(self.store.purge_finished)
+        pending = await asyncio.to_thread(self.store.requeue_unfinished)
+
+        for job_id in pending:
+            self._queue.put_nowait(job_id)
+
+        if pending:
+            print(f"Trabajos de detección reanudados: {len(pending)}")
+
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def submit(self, images: dict[str, str]) -> str:
+        if self._queue is None:
+            raise RuntimeError("El servicio de trabajos no está iniciado")
+
+        if self._queue.qsize() >= self.max_queued:
+            self.rejected += 1
+            raise JobQueueFull(f"{self._queue.qsize()} trabajos en espera")
+
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self.store.create, job_id, images)
+        self._queue.put_nowait(job_id)
+
+        return job_id
+
+    async def get(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def pending_product(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self.store.pending_product, job_id)
+
+    async def update_product(self, job_id: str, product: dict) -> bool:
+        return await asyncio.to_thread(self.store.update_product, job_id, product)
+
+    async def confirm(
+        self,
+        job_id: str,
+        save: Callable[[dict, dict[str, str]], Awaitable],
+    ):
+        """
+        Guarda el producto detectado por el trabajo con save(producto,
+        imágenes). Devuelve lo que devuelva save, o None si el trabajo no
+        tiene un producto pendiente.
+        """
+        claimed = await asyncio.to_thread(self.store.claim_product, job_id)
+        if claimed is None:
+            return None
+
+        try:
+            saved = await save(*claimed)
+        except BaseException:
+            await asyncio.to_thread(self.store.release_product, job_id)
+            raise
+
+        await asyncio.to_thread(self.store.complete_product, job_id)
+        return saved
+
+    async def updates(self, job_id: str):
+        """
+        Genera el estado del trabajo cada vez que cambia,
+        hasta que termina.
+        """
+        last_status = None
+
+        while True:
+            event = self._events.setdefault(job_id, asyncio.Event())
+            job = await self.get(job_id)
+
+            if job is None:
+                return
+
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield job
+
+            if job["status"] in FINISHED_STATUSES:
+                return
+
+            try:
+                # por si el cambio lo hizo otro proceso
+                await asyncio.wait_for(event.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+
+    def _notify(self, job_id: str):
+        event = self._events.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run_job(job_id)
+            except Exception as e:
+                print(f"Error en el trabajo de detección {job_id}:", e)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str):
+        images = await asyncio.to_thread(self.store.images, job_id)
+        if images is None:
+            return
+
+        await asyncio.to_thread(self.store.mark_running, job_id)
+        self._notify(job_id)
+
+        self.running += 1
+        try:
+            while True:
+                try:
+                    result, product = await self._handler(images)
+                    break
+                except ExecutorSaturated:
+                    # el trabajo sigue en la tabla: esperar en vez de fallar
+                    await asyncio.sleep(SATURATED_RETRY_SECONDS)
+        except asyncio.CancelledError:
+            # apagado: queda como "running" y se reanuda al iniciar
+            raise
+        except Exception as e:
+            self.failed += 1
+            await asyncio.to_thread(
+                self.store.finish, job_id, "error", None, None, str(e)
+            )
+        else:
+            self.completed += 1
+            await asyncio.to_thread(
+                self.store.finish, job_id, "done", result, product, None
+            )
+        finally:
+            self.running -= 1
+            self._notify(job_id)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+
+detection_jobs = DetectionJobService()
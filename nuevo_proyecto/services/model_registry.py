@@ -0,0 +1,134 @@
+"""
+Registro de modelos pesados (OCR, clasificador, features de visión).
+
+Ningún modelo se carga al importar: cada uno se construye la primera vez
+que se pide con get(), o antes con warm_up() en segundo plano al iniciar
+la API. Todos los hilos del proceso comparten la misma instancia.
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+import time
+from typing import Callable
+
+# modelos que la API precarga al iniciar (separados por coma); el
+# clasificador no viene en el repo (train_model.py), agregarlo con
+# MODEL_WARMUP=product_classifier,vision_matcher cuando exista el modelo
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "vision_matcher")
+
+# después de una carga fallida no se reintenta hasta pasado este tiempo
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "30"))
+
+
+class ModelUnavailable(RuntimeError):
+    """El modelo falló al cargar hace poco; todavía no se reintenta."""
+
+
+class _ModelEntry:
+
+    def __init__(self, loader: Callable | str):
+        self.loader = loader
+        self.instance = None
+        self.state = "pending"  # pending | loading | ready | error
+        self.error: str | None = None
+        self.failed_at = 0.0
+        self.load_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def resolve_loader(self) -> Callable:
+        # "modulo:funcion" se importa recién al cargar el modelo
+        if isinstance(self.loader, str):
+            module_name, func_name = self.loader.split(":")
+            return getattr(importlib.import_module(module_name), func_name)
+        return self.loader
+
+
+class ModelRegistry:
+
+    def __init__(self):
+        self._entries: dict[str, _ModelEntry] = {}
+
+    def register(self, name: str, loader: Callable | str):
+        self._entries[name] = _ModelEntry(loader)
+
+    def get(self, name: str):
+        """
+        Devuelve el modelo, cargándolo si todavía no está listo.
+        Si la carga falla se relanza el error; durante
+        MODEL_RETRY_SECONDS las llamadas siguientes fallan con
+        ModelUnavailable sin volver a intentar la carga.
+        """
+        entry = self._entries[name]
+
+        if entry.state == "ready":
+            return entry.instance
+
+        with entry.lock:
+            if entry.state == "ready":
+                return entry.instance
+
+            if (
+                entry.state == "error"
+                and time.monotonic() - entry.failed_at < MODEL_RETRY_SECONDS
+            ):
+                raise ModelUnavailable(f"Modelo {name} no disponible: {entry.error}")
+
+            entry.state = "loading"
+            start = time.perf_counter()
+
+            try:
+                entry.instance = entry.resolve_loader()()
+            except Exception as e:
+                entry.state = "error"
+                entry.error = str(e)
+                entry.failed_at = time.monotonic()
+                raise
+
+            entry.load_seconds = time.perf_counter() - start
+            entry.error = None
+            entry.state = "ready"
+
+            print(f"Modelo {name} cargado en {entry.load_seconds:.1f}s")
+
+            return entry.instance
+
+    def is_ready(self, name: str) -> bool:
+        return self._entries[name].state == "ready"
+
+    async def warm_up(self, names: list[str] | None = None):
+        """
+        Carga los modelos en hilos aparte sin bloquear el event loop.
+        Los errores quedan registrados en status().
+        """
+        names = names if names is not None else list(self._entries)
+
+        async def load(name: str):
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception as e:
+                print(f"⚠️ No se pudo cargar el modelo {name}:", e)
+
+        await asyncio.gather(*(load(name) for name in names if name in self._entries))
+
+    def status(self) -> dict:
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+model_registry = ModelRegistry()
+
+model_registry.register("paddle_ocr", "ocr.ocr_reader:load_ocr")
+model_registry.register("product_classifier", "services.product_classifier:load_classifier")
+model_registry.register("vision_matcher", "agents.vision_index:load_matcher")
+
+
+def warmup_names() -> list[str]:
+    return [name.strip() for name in MODEL_WARMUP.split(",") if name.strip()]
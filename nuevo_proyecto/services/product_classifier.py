@@ -1,33 +1,307 @@
-import tensorflow as tf
-import numpy as np
+"""
+Clasificador de productos (MobileNetV2) para CPU.
+
+Usa el modelo exportado a TFLite (scripts/export_classifier_tflite.py,
+opcionalmente cuantizado a int8) y vuelve al .h5 de Keras si no existe.
+Las predicciones concurrentes se agrupan en lotes pequeños para pagar
+el costo fijo de cada llamada al modelo una sola vez por lote.
+"""
+
+import asyncio
 import json
+import os
+import threading
+import time
+
 import cv2
+import numpy as np
+
+from ocr.image_ingest import decode_bounded
+from services.cpu_executor import run_cpu
+from services.model_registry import model_registry
+
+CLASSIFIER_DECODE_SIDE = 448
+IMG_SIZE = 224
+
+CLASSIFIER_H5_PATH = os.getenv("CLASSIFIER_H5_PATH", "product_classifier.h5")
+CLASSIFIER_TFLITE_PATH = os.getenv("CLASSIFIER_TFLITE_PATH", "product_classifier.tflite")
+CLASSIFIER_LABELS_PATH = os.getenv("CLASSIFIER_LABELS_PATH", "labels.json")
+
+# "auto": TFLite si existe el archivo, si no Keras
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "auto")
+
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "8"))
+CLASSIFIER_BATCH_WINDOW_MS = float(os.getenv("CLASSIFIER_BATCH_WINDOW_MS", "5"))
+
+
+# =========================
+# Runtimes
+# =========================
+class KerasRuntime:
+    backend = "keras"
+
+    def __init__(self, path: str = CLASSIFIER_H5_PATH):
+        # tensorflow se importa solo cuando hace falta el modelo
+        import tensorflow as tf
+
+        self.model = tf.keras.models.load_model(path)
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # llamar al modelo directamente evita el overhead de model.predict
+        return np.asarray(self.model(batch, training=False))
+
+
+class TFLiteRuntime:
+    backend = "tflite"
+
+    def __init__(self, path: str = CLASSIFIER_TFLITE_PATH):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+
+        self.interpreter = Interpreter(model_path=path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self.input["shape"][0])
+
+        # el intérprete no se puede usar desde dos hilos a la vez
+        self._lock = threading.Lock()
+
+    def _resize(self, batch_size: int):
+        if batch_size == self._batch_size:
+            return
+
+        self.interpreter.resize_tensor_input(
+            self.input["index"], [batch_size, IMG_SIZE, IMG_SIZE, 3]
+        )
+        self.interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        input_dtype = self.input["dtype"]
+
+        if input_dtype != np.float32:
+            # modelo cuantizado: float -> int8/uint8
+            scale, zero_point = self.input["quantization"]
+            batch = np.clip(
+                np.round(batch / scale + zero_point),
+                np.iinfo(input_dtype).min,
+                np.iinfo(input_dtype).max,
+            )
+
+        with self._lock:
+            self._resize(len(batch))
+            self.interpreter.set_tensor(self.input["index"], batch.astype(input_dtype))
+            self.interpreter.invoke()
+            preds = self.interpreter.get_tensor(self.output["index"])
+
+        if preds.dtype != np.float32:
+            scale, zero_point = self.output["quantization"]
+            preds = (preds.astype(np.float32) - zero_point) * scale
+
+        return preds
+
+
+class Classifier:
+
+    def __init__(self, runtime, labels: dict[int, str]):
+        self.runtime = runtime
+        self.labels = labels
+
+    @property
+    def backend(self) -> str:
+        return self.runtime.backend
+
+    def predict_batch(self, batch: np.ndarray) -> list[tuple[str, float]]:
+        preds = self.runtime.predict(batch)
+        results = []
+
+        for row in preds:
+            class_id = int(np.argmax(row))
+            results.append((self.labels[class_id], float(row[class_id])))
+
+        return results
+
 
-# Cargar modelo
-model = tf.keras.models.load_model("product_classifier.h5")
+def load_runtime(backend: str = CLASSIFIER_BACKEND):
+    if backend == "tflite" or (
+        backend == "auto" and os.path.exists(CLASSIFIER_TFLITE_PATH)
+    ):
+        return TFLiteRuntime()
 
-# Cargar etiquetas
-with open("labels.json", "r") as f:
-    class_indices = json.load(f)
+    return KerasRuntime()
 
-labels = {v: k for k, v in class_indices.items()}
+
+def load_classifier() -> Classifier:
+    runtime = load_runtime()
+
+    # Cargar etiquetas
+    with open(CLASSIFIER_LABELS_PATH, "r") as f:
+        class_indices = json.load(f)
+
+    labels = {v: k for k, v in class_indices.items()}
+
+    print("Clasificador cargado con", runtime.backend)
+
+    return Classifier(runtime, labels)
+
+
+# =========================
+# Preprocesamiento
+# =========================
+def preprocess(image_bytes: bytes) -> np.ndarray | None:
+    # el modelo trabaja a 224x224: no hace falta decodificar la foto entera
+    img = decode_bounded(image_bytes, max_side=CLASSIFIER_DECODE_SIDE)
+
+    if img is None:
+        return None
+
+    return prepare_image(img)
+
+
+def prepare_image(img) -> np.ndarray:
+    # se entrenó con imágenes RGB (ImageDataGenerator)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, (IMG_SIZE, IMG_SIZE), interpolation=cv2.INTER_AREA)
+
+    return img.astype(np.float32) / 255.0
 
 
 def predict_product(image_bytes):
-    nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    img = preprocess(image_bytes)
 
     if img is None:
         return "producto_desconocido", 0.0
 
-    img = cv2.resize(img, (224, 224))
-    img = img / 255.0
-    img = np.expand_dims(img, axis=0)
+    classifier = model_registry.get("product_classifier")
+
+    return classifier.predict_batch(np.expand_dims(img, axis=0))[0]
+
+
+# =========================
+# Micro-lotes
+# =========================
+class MicroBatcher:
+    """
+    Junta las predicciones que llegan dentro de una ventana corta
+    (CLASSIFIER_BATCH_WINDOW_MS) en un solo lote de hasta
+    CLASSIFIER_BATCH_SIZE imágenes.
+    """
+
+    def __init__(
+        self,
+        max_batch: int = CLASSIFIER_BATCH_SIZE,
+        window_ms: float = CLASSIFIER_BATCH_WINDOW_MS,
+    ):
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+
+        self.batches = 0
+        self.items = 0
+        self.inference_seconds = 0.0
+        self.latency_seconds = 0.0
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def predict(self, image_bytes: bytes) -> tuple[str, float]:
+        start = time.perf_counter()
+
+        img = await run_cpu(preprocess, image_bytes)
+        if img is None:
+            return "producto_desconocido", 0.0
+
+        return await self._enqueue(img, start)
+
+    async def predict_image(self, img) -> tuple[str, float]:
+        """
+        Igual que predict() pero con la imagen ya decodificada (BGR).
+        """
+        start = time.perf_counter()
+        prepared = await run_cpu(prepare_image, img)
+
+        return await self._enqueue(prepared, start)
+
+    async def _enqueue(self, img: np.ndarray, start: float) -> tuple[str, float]:
+        self._ensure_worker()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((img, future))
+        result = await future
+
+        self.latency_seconds += time.perf_counter() - start
+
+        return result
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            images = np.stack([img for img, _ in batch])
+            futures = [future for _, future in batch]
+
+            start = time.perf_counter()
+            try:
+                classifier = await asyncio.to_thread(
+                    model_registry.get, "product_classifier"
+                )
+                results = await run_cpu(classifier.predict_batch, images)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.inference_seconds += time.perf_counter() - start
+            self.batches += 1
+            self.items += len(batch)
+
+            for future, result in zip(futures, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "avg_inference_ms": 1000 * self.inference_seconds / self.batches
+            if self.batches
+            else 0.0,
+            "avg_latency_ms": 1000 * self.latency_seconds / self.items
+            if self.items
+            else 0.0,
+            # imágenes por segundo de inferencia
+            "throughput_per_s": self.items / self.inference_seconds
+            if self.inference_seconds
+            else 0.0,
+        }
+
 
-    preds = model.predict(img, verbose=0)
-    class_id = np.argmax(preds)
-    confidence = float(preds[0][class_id])
+classifier_batcher = MicroBatcher()
 
-    product_name = labels[class_id]
 
-    return product_name, confidence
+async def predict_product_async(image_bytes):
+    # decodificar fuera del event loop y predecir en lote
+    return await classifier_batcher.predict(image_bytes)
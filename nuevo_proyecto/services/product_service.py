@@ -1,22 +1,221 @@
-from sqlalchemy import select
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.product_stock import ProductStock
 from models.product_image import ProductImage
+from services.catalog_index import CatalogSnapshot, catalog_index
+from services.fuzzy_matcher import MatchResult, fuzzy_matcher
+from rapidfuzz import fuzz
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
 import uuid
 import os
 import base64
-from difflib import get_close_matches
+
+# similitud mínima (0-1) de la búsqueda difusa; 0.6 es el cutoff que
+# usaba difflib.get_close_matches
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.6"))
+
+# undefined_function / undefined_object: falta la extensión pg_trgm
+TRIGRAM_MISSING_SQLSTATES = {"42883", "42704"}
+
+
+def _sqlstate(error: DBAPIError) -> str | None:
+    # el adaptador de asyncpg expone sqlstate; psycopg, pgcode
+    for exc in (error.orig, getattr(error.orig, "__cause__", None)):
+        code = getattr(exc, "sqlstate", None) or getattr(exc, "pgcode", None)
+        if code:
+            return code
+    return None
+
+
+class SearchRow(NamedTuple):
+    id: str
+    product_name: str
+    brand: str | None
+    size: str | None
+    quantity_on_hand: int
+    score: float
 
 
 class ProductService:
 
+    # se desactiva la primera vez que la base no tiene pg_trgm
+    trigram_search = True
+
     def __init__(self, session: AsyncSession):
         self.session = session
 
+        # archivos de imágenes escritos en la transacción en curso
+        self._written_images: list[str] = []
+
     async def list_products(self):
         result = await self.session.execute(select(ProductStock))
         return result.scalars().all()
 
+    async def list_catalog_rows(self):
+        """
+        Solo las columnas que necesita el índice del catálogo,
+        sin hidratar objetos ORM completos.
+        """
+        result = await self.session.execute(
+            select(
+                ProductStock.id,
+                ProductStock.product_name,
+                ProductStock.brand,
+                ProductStock.size,
+            )
+        )
+        return result.all()
+
+    async def get_stock(self, ids: list[str]) -> dict[str, int]:
+        """
+        Stock actual de los productos pedidos. No sale del snapshot
+        del catálogo porque cambia desde otros procesos.
+        """
+        if not ids:
+            return {}
+
+        result = await self.session.execute(
+            select(ProductStock.id, ProductStock.quantity_on_hand).where(
+                ProductStock.id.in_([uuid.UUID(str(i)) for i in ids])
+            )
+        )
+        return {str(row.id): row.quantity_on_hand or 0 for row in result.all()}
+
+    async def search_products(
+        self,
+        text: str,
+        limit: int = 10,
+        min_similarity: float = SEARCH_MIN_SIMILARITY,
+    ) -> list[SearchRow]:
+        """
+        Búsqueda difusa dentro de PostgreSQL usando pg_trgm e ILIKE
+        sobre los índices GIN de product_name y brand.
+        Devuelve como máximo `limit` filas ordenadas por similitud,
+        primero las que contienen el texto literal.
+
+        Si la base no tiene pg_trgm se hace rollback de la sesión (la
+        consulta fallida deja la transacción abortada), se desactiva la
+        búsqueda por trigramas y se busca en el catálogo en memoria.
+        Cualquier otro error de la base se propaga sin tocar la sesión.
+        """
+        text = text.strip()
+        if not text:
+            return []
+
+        if ProductService.trigram_search:
+            try:
+                return await self._search_trigram(text, limit, min_similarity)
+            except DBAPIError as e:
+                if _sqlstate(e) not in TRIGRAM_MISSING_SQLSTATES:
+                    raise
+
+                await self.session.rollback()
+                ProductService.trigram_search = False
+                print("⚠️ pg_trgm no disponible, búsqueda en memoria:", e)
+
+        return await self._search_catalog(text, limit, min_similarity)
+
+    async def _search_catalog(
+        self, text: str, limit: int, min_similarity: float
+    ) -> list[SearchRow]:
+        result = await self.match_many(
+            [text], limit=limit, cutoff=100 * min_similarity, scorer=fuzz.ratio
+        )
+        matches = result.matches(0)
+        stock = await self.get_stock([entry.id for entry, _ in matches])
+
+        return [
+            SearchRow(
+                entry.id,
+                entry.product_name,
+                entry.brand,
+                entry.size,
+                stock.get(entry.id, 0),
+                score / 100,
+            )
+            for entry, score in matches
+        ]
+
+    async def _search_trigram(
+        self, text: str, limit: int, min_similarity: float
+    ) -> list[SearchRow]:
+        # el operador % usa este umbral (por defecto 0.3); solo esta transacción
+        await self.session.execute(
+            select(
+                func.set_config(
+                    "pg_trgm.similarity_threshold", str(min_similarity), True
+                )
+            )
+        )
+
+        escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+
+        contains = or_(
+            ProductStock.product_name.ilike(pattern, escape="\\"),
+            ProductStock.brand.ilike(pattern, escape="\\"),
+        )
+        score = func.greatest(
+            func.similarity(ProductStock.product_name, text),
+            func.similarity(func.coalesce(ProductStock.brand, ""), text),
+        ).label("score")
+
+        result = await self.session.execute(
+            select(
+                ProductStock.id,
+                ProductStock.product_name,
+                ProductStock.brand,
+                ProductStock.size,
+                ProductStock.quantity_on_hand,
+                score,
+            )
+            .where(
+                or_(
+                    contains,
+                    ProductStock.product_name.op("%")(text),
+                    ProductStock.brand.op("%")(text),
+                )
+            )
+            .order_by(contains.desc(), score.desc())
+            .limit(limit)
+        )
+        return [
+            SearchRow(
+                str(row.id),
+                row.product_name,
+                row.brand,
+                row.size,
+                row.quantity_on_hand or 0,
+                float(row.score),
+            )
+            for row in result.all()
+        ]
+
+    async def get_catalog(self) -> CatalogSnapshot:
+        """
+        Devuelve el snapshot del catálogo en memoria.
+        Solo consulta la base de datos la primera vez por proceso.
+        """
+        return await catalog_index.ensure_loaded(self)
+
+    async def match_many(
+        self,
+        queries: list[str],
+        limit: int = 5,
+        cutoff: float = 0,
+        scorer=fuzz.partial_ratio,
+    ) -> MatchResult:
+        """
+        Puntúa un lote de consultas contra todo el catálogo en una sola
+        llamada vectorizada. Lo usan el chat, la corrección del OCR
+        y los procesos de conciliación.
+        """
+        catalog = await self.get_catalog()
+        return fuzzy_matcher.match_many(catalog, queries, limit, cutoff, scorer)
+
     async def create_product(self, name: str, stock: int):
         product = ProductStock(
             product_id=name.lower().replace(" ", "_"),
@@ -34,6 +233,8 @@ class ProductService:
         self.session.add(product)
         await self.session.commit()
         await self.session.refresh(product)
+
+        catalog_index.upsert(product)
         return product
 
     async def create_product_with_image(
@@ -46,14 +247,99 @@ class ProductService:
         price=None,
         expiration_date=None,
     ):
+        return await self.create_product_with_images(
+            name=name,
+            stock=stock,
+            images={"front": image_b64},
+            brand=brand,
+            size=size,
+            price=price,
+            expiration_date=expiration_date,
+        )
+
+    async def create_product_with_images(
+        self,
+        name: str,
+        stock: int,
+        images: dict[str, str],
+        brand: str | None = None,
+        size: str | None = None,
+        price=None,
+        expiration_date=None,
+    ):
+        """
+        Crea el producto y una fila de ProductImage por vista
+        (front, side_left, side_right) en una sola transacción.
+        """
+        try:
+            product = await self.add_product_with_images(
+                name=name,
+                stock=stock,
+                images={
+                    image_type: base64.b64decode(image_b64)
+                    for image_type, image_b64 in images.items()
+                },
+                brand=brand,
+                size=size,
+                price=price,
+                expiration_date=expiration_date,
+            )
+
+            await self.session.commit()
+        except Exception:
+            await self._rollback_images()
+            raise
+
+        self._written_images = []
+        await self.session.refresh(product)
+
+        catalog_index.upsert(product)
+
+        return product
+
+    async def create_products_bulk(self, items: list[dict]) -> list:
+        """
+        Inserta varios productos (con sus imágenes en bytes) en una sola
+        transacción. Cada item tiene los argumentos de
+        add_product_with_images. Si uno falla no se guarda ninguno.
+        """
+        products = []
+
+        try:
+            for item in items:
+                products.append(await self.add_product_with_images(**item))
+
+            await self.session.commit()
+        except Exception:
+            await self._rollback_images()
+            raise
+
+        self._written_images = []
+        catalog_index.upsert_many(products)
+
+        return products
+
+    async def add_product_with_images(
+        self,
+        name: str,
+        stock: int,
+        images: dict[str, bytes],
+        brand: str | None = None,
+        size: str | None = None,
+        price=None,
+        expiration_date=None,
+    ):
+        """
+        Agrega el producto y sus imágenes a la sesión sin hacer commit.
+        """
         # Crear producto
         product = ProductStock(
             product_id=name.lower().replace(" ", "_"),
             product_name=name,
             brand=brand,
             size=size,
-            price=price,
-            expiration_date=expiration_date,
+            price=_to_decimal(price),
+            expiration_date=_to_date(expiration_date),
             quantity_on_hand=stock,
             quantity_reserved=0,
             quantity_available=stock,
@@ -67,73 +353,103 @@ class ProductService:
         self.session.add(product)
         await self.session.flush()  # obtener ID sin commit
 
-        # Guardar imagen
+        # Guardar imágenes
         os.makedirs("product_images", exist_ok=True)
-        filename = f"product_images/{product.id}.jpg"
 
-        with open(filename, "wb") as f:
-            f.write(base64.b64decode(image_b64))
+        for image_type, image_bytes in images.items():
+            filename = f"product_images/{product.id}_{image_type}.jpg"
 
-        # Registrar imagen
-        image = ProductImage(
-            product_stock_id=product.id,
-            image_path=filename,
-        )
-
-        self.session.add(image)
+            with open(filename, "wb") as f:
+                f.write(image_bytes)
+            self._written_images.append(filename)
 
-        await self.session.commit()
-        await self.session.refresh(product)
+            # Registrar imagen
+            self.session.add(
+                ProductImage(
+                    product_stock_id=product.id,
+                    image_type=image_type,
+                    image_path=filename,
+                )
+            )
 
         return product
 
+    async def _rollback_images(self):
+        """
+        Deshace la transacción y borra las imágenes que ya se habían
+        escrito, para no dejar archivos sin producto.
+        """
+        await self.session.rollback()
+
+        for filename in self._written_images:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+        self._written_images = []
+
     async def find_closest_product_name(self, detected_name: str) -> str:
         """
         Busca el nombre más parecido en la base de datos.
         Si no encuentra coincidencias, devuelve el nombre original.
         """
-        result = await self.session.execute(select(ProductStock))
-        products = result.scalars().all()
-
-        product_names = [p.product_name.lower() for p in products]
-
-        match = get_close_matches(
-            detected_name.lower(),
-            product_names,
-            n=1,
-            cutoff=0.6,
-        )
+        rows = await self.search_products(detected_name, limit=1)
 
-        if match:
-            return match[0].capitalize()
+        if rows:
+            return rows[0].product_name.capitalize()
 
         return detected_name
 
-    async def correct_product_name(self, detected_name: str) -> str:
+    async def correct_product_name(
+        self, detected_name: str, catalog: CatalogSnapshot | None = None
+    ) -> str:
         """
         Corrige el nombre del producto usando coincidencias con la base de datos.
         No rompe el flujo actual.
         """
+        if catalog is None:
+            catalog = await self.get_catalog()
 
-        if not detected_name or detected_name == "producto_desconocido":
-            return detected_name
+        return correct_name_in_catalog(catalog, detected_name)
 
-        products = await self.list_products()
 
-        if not products:
-            return detected_name
+def _to_decimal(value):
+    if value in (None, ""):
+        return None
 
-        db_names = [p.product_name for p in products]
+    try:
+        return Decimal(str(value).replace(",", "."))
+    except InvalidOperation:
+        return None
 
-        # buscar coincidencia por similitud
-        match = get_close_matches(
-            detected_name,
-            db_names,
-            n=1,
-            cutoff=0.6,  # nivel de similitud
-        )
 
-        if match:
-            return match[0]  # nombre oficial de la BD
+def _to_date(value):
+    # el OCR devuelve 2026/08/01 y el chat 2026-08-01
+    if value in (None, "") or isinstance(value, date):
+        return value
+
+    try:
+        return date.fromisoformat(str(value).replace("/", "-"))
+    except ValueError:
+        return None
+
 
+def correct_name_in_catalog(catalog: CatalogSnapshot, detected_name: str) -> str:
+    if not detected_name or detected_name == "producto_desconocido":
         return detected_name
+
+    # buscar coincidencia por similitud
+    result = fuzzy_matcher.match_many(
+        catalog,
+        [detected_name],
+        limit=1,
+        cutoff=60,  # nivel de similitud
+        scorer=fuzz.ratio,
+    )
+    match = result.best(0)
+
+    if match:
+        return match[0].product_name  # nombre oficial de la BD
+
+    return detected_name
@@ -1,6 +1,17 @@
 from llm.llm_client import LLMClient
+from llm.scheduler import Priority
 from services.product_service import ProductService
-from rapidfuzz import process, fuzz
+from services.vector_index import vector_index
+import asyncio
+import os
+
+# "vector": índice local y la IA solo si el puntaje es bajo (semántico
+#           con VECTOR_EMBEDDER=ollama, solo léxico con el de hashing)
+# "llm": siempre consulta a la IA cuando no hay coincidencia directa
+SEARCH_MODE = os.getenv("SEARCH_MODE", "vector")
+
+# consultas a la IA en paralelo dentro de search_many
+SEARCH_LLM_CONCURRENCY = int(os.getenv("SEARCH_LLM_CONCURRENCY", "4"))
 
 
 class SearchService:
@@ -23,38 +34,124 @@ class SearchService:
     # ======================================================
     # SEARCH INTELIGENTE
     # ======================================================
-    async def semanticSearch(self, text: str):
+    async def semanticSearch(self, text: str, mode: str = SEARCH_MODE):
         text = text.strip().lower()
-        inventory = await self.product_service.list_products()
+        catalog = await self.product_service.get_catalog()
+
+        products = await self._search_local(catalog, text, mode)
+
+        if not products:
+            products = await self._search_with_llm(catalog, text)
+
+        return {"products": products}
+
+    # ======================================================
+    # SEARCH POR LOTES
+    # ======================================================
+    async def search_many(
+        self,
+        queries: list[str],
+        mode: str = SEARCH_MODE,
+        max_concurrency: int = SEARCH_LLM_CONCURRENCY,
+    ) -> list[list[str]]:
+        """
+        Resuelve muchas consultas contra un mismo snapshot del catálogo.
+        Las consultas repetidas se resuelven una sola vez y los fallbacks
+        con IA se ejecutan en paralelo, como máximo `max_concurrency` a la vez.
+        """
+        catalog = await self.product_service.get_catalog()
+
+        normalized = [q.strip().lower() for q in queries]
+        results: dict[str, list[str]] = {}
+        pending = []
+
+        for text in dict.fromkeys(normalized):
+            found = await self._search_local(catalog, text, mode)
+            if found:
+                results[text] = found
+            else:
+                pending.append(text)
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def resolve(text: str):
+            async with semaphore:
+                results[text] = await self._search_with_llm(catalog, text)
+
+        await asyncio.gather(*(resolve(text) for text in pending))
+
+        return [results[text] for text in normalized]
+
+    # ======================================================
+    # Etapas de búsqueda
+    # ======================================================
+    async def _search_local(self, catalog, text: str, mode: str) -> list[str]:
+        if not text:
+            return []
 
         # búsqueda directa sin IA
-        direct_matches = [
-            p.product_name for p in inventory if text in p.product_name.lower()
-        ]
+        direct_matches = [e.product_name for e in catalog.find_substring(text)]
 
         if direct_matches:
-            return {"products": direct_matches}
+            return direct_matches
+
+        # búsqueda por similitud de vectores
+        if mode == "vector":
+            hits = await vector_index.search(catalog, text)
+            return [
+                e.product_name for e, score in hits if score >= vector_index.threshold
+            ]
+
+        return []
 
+    async def _search_with_llm(self, catalog, text: str) -> list[str]:
         # fallback con IA
         enriched_text = f"Producto de supermercado: {text}"
         products = await self.identify_product(enriched_text)
 
         if not products:
-            return {"products": []}
+            return []
 
         valid_products = []
         for prod in products:
-            for p in inventory:
-                if prod.lower() in p.product_name.lower():
-                    valid_products.append(p.product_name)
+            valid_products.extend(e.product_name for e in catalog.find_substring(prod))
 
-        return {"products": list(set(valid_products))}
+        return list(set(valid_products))
 
     # ======================================================
     # ASISTENTE CONVERSACIONAL
     # ======================================================
     async def ask_inventory(self, question: str):
-        inventory = await self.product_service.list_products()
+        reply = await self.build_inventory_reply(question)
+
+        if "text" in reply:
+            return reply["text"]
+
+        return await self.llm_client.generate_text(reply["prompt"], Priority.INVENTORY)
+
+    async def ask_inventory_stream(self, question: str):
+        """
+        Igual que ask_inventory, pero entrega la respuesta de la IA
+        token por token a medida que se genera.
+        """
+        reply = await self.build_inventory_reply(question)
+
+        if "text" in reply:
+            yield reply["text"]
+            return
+
+        async for token in self.llm_client.stream_text(
+            reply["prompt"], Priority.INVENTORY
+        ):
+            yield token
+
+    async def build_inventory_reply(self, question: str) -> dict:
+        """
+        Decide la respuesta a una consulta de inventario.
+        Devuelve {"text": ...} si ya está lista o {"prompt": ...}
+        si hay que generarla con la IA.
+        """
+        catalog = await self.product_service.get_catalog()
         question_lower = question.lower()
 
         # =========================
@@ -70,14 +167,16 @@ class SearchService:
 
         for kw in register_keywords:
             if kw in question_lower:
-                return (
-                    "📦 Perfecto. Vamos a registrar un producto.\n\n"
-                    "Necesito tres imágenes:\n"
-                    "1️⃣ Frontal → nombre y marca\n"
-                    "2️⃣ Lateral izquierdo → ingredientes\n"
-                    "3️⃣ Lateral derecho → información nutricional\n\n"
-                    "Puedes subir las imágenes por el chat."
-                )
+                return {
+                    "text": (
+                        "📦 Perfecto. Vamos a registrar un producto.\n\n"
+                        "Necesito tres imágenes:\n"
+                        "1️⃣ Frontal → nombre y marca\n"
+                        "2️⃣ Lateral izquierdo → ingredientes\n"
+                        "3️⃣ Lateral derecho → información nutricional\n\n"
+                        "Puedes subir las imágenes por el chat."
+                    )
+                }
 
         # =========================
         # CONSULTA GENERAL DE INVENTARIO
@@ -92,13 +191,16 @@ class SearchService:
         ]
 
         if any(word in question_lower for word in inventory_keywords):
-            if not inventory:
-                return "El inventario se encuentra vacío."
+            if not catalog:
+                return {"text": "El inventario se encuentra vacío."}
 
+            stock = await self.product_service.get_stock(
+                [p.id for p in catalog.entries]
+            )
             product_list = "\n".join(
                 [
-                    f"• {p.product_name}: {p.quantity_on_hand} unidades"
-                    for p in inventory
+                    f"• {p.product_name}: {stock.get(p.id, 0)} unidades"
+                    for p in catalog.entries
                 ]
             )
 
@@ -114,7 +216,7 @@ class SearchService:
     Incluye una recomendación general si detectas
     algún producto con bajo stock.
     """
-            return await self.llm_client.generate_text(prompt)
+            return {"prompt": prompt}
 
         # =========================
         # BÚSQUEDA DE PRODUCTO ESPECÍFICO
@@ -127,33 +229,29 @@ class SearchService:
         detected_products = await self.identify_product(question_lower)
 
         if detected_products:
-            detected_name = detected_products[0].lower()
+            found = catalog.find_substring(detected_products[0])
 
-            for p in inventory:
-                if detected_name in p.product_name.lower():
-                    best_match = p
-                    break
+            if found:
+                best_match = found[0]
 
         # =========================
         # Fuzzy match si no hay IA
         # =========================
-        if not best_match:
-            product_names = [p.product_name for p in inventory]
-            match = process.extractOne(
-                question_lower, product_names, scorer=fuzz.partial_ratio
-            )
+        # una sola pasada vectorizada sirve para el match y las sugerencias
+        fuzzy = await self.product_service.match_many(
+            [question_lower], limit=3, cutoff=50
+        )
+        ranked = fuzzy.matches(0)
 
-            if match and match[1] > 70:
-                for p in inventory:
-                    if p.product_name == match[0]:
-                        best_match = p
-                        break
+        if not best_match and ranked and ranked[0][1] > 70:
+            best_match = ranked[0][0]
 
         # ================================
         # SI ENCUENTRA PRODUCTO
         # ================================
         if best_match:
-            stock = best_match.quantity_on_hand
+            stock_by_id = await self.product_service.get_stock([best_match.id])
+            stock = stock_by_id.get(best_match.id, 0)
 
             if stock == 0:
                 status = "sin stock"
@@ -175,23 +273,18 @@ class SearchService:
 
         Responde de forma natural, clara y profesional al usuario.
         """
-            return await self.llm_client.generate_text(prompt)
+            return {"prompt": prompt}
 
         # ================================
         # SUGERENCIAS
         # ================================
-        suggestions = []
-
-        for p in inventory:
-            score = fuzz.partial_ratio(question_lower, p.product_name.lower())
-            if score > 50:
-                suggestions.append((p.product_name, p.quantity_on_hand, score))
-
-        suggestions = sorted(suggestions, key=lambda x: x[2], reverse=True)
+        similar = [p for p, score in ranked if score > 50][:3]
+        stock = await self.product_service.get_stock([p.id for p in similar])
+        suggestions = [(p.product_name, stock.get(p.id, 0)) for p in similar]
 
         if suggestions:
             suggestion_text = "\n".join(
-                [f"• {name} ({stock} unidades)" for name, stock, _ in suggestions[:3]]
+                [f"• {name} ({units} unidades)" for name, units in suggestions]
             )
 
             prompt = f"""
@@ -209,7 +302,7 @@ class SearchService:
         Indica que el producto no existe y sugiere registrar uno nuevo.
         """
 
-            return await self.llm_client.generate_text(prompt)
+            return {"prompt": prompt}
 
         # ================================
         # RESPUESTA CONVERSACIONAL
@@ -224,7 +317,7 @@ class SearchService:
     Mensaje del usuario:
     {question}
     """
-        return await self.llm_client.generate_text(prompt)
+        return {"prompt": prompt}
 
 
 # ======================================================
@@ -234,16 +327,10 @@ async def find_similar_product(session, text: str):
     from services.product_service import ProductService
 
     service = ProductService(session)
-    products = await service.list_products()
-
-    if not products:
-        return None
-
-    product_names = [p.product_name for p in products]
-
-    match = process.extractOne(text, product_names, scorer=fuzz.partial_ratio)
+    result = await service.match_many([text], limit=1, cutoff=80)
+    match = result.best(0)
 
     if match and match[1] > 80:
-        return match[0]
+        return match[0].product_name
 
     return None
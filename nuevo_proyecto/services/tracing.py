@@ -0,0 +1,213 @@
+"""
+Medición de tiempos por etapa del pipeline.
+
+span("nombre") mide un bloque (con `with` o `async with`) y guarda la
+duración en un histograma por etapa. Si hay una traza activa
+(start_trace) también queda registrado en ella, con su etapa padre, para
+ver el desglose de una solicitud puntual. Las trazas se pueden volcar a
+JSON en TRACE_DUMP_DIR.
+"""
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+# vacío = no se guardan trazas en disco
+TRACE_DUMP_DIR = os.getenv("TRACE_DUMP_DIR", "")
+
+# límites superiores de cada bucket, en milisegundos
+BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+
+# =========================
+# Histogramas
+# =========================
+class Histogram:
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+
+    def percentile(self, q: float) -> float:
+        """
+        Aproximado: el límite superior del bucket donde cae el percentil.
+        """
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        seen = 0
+
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                if i < len(BUCKETS_MS):
+                    return min(float(BUCKETS_MS[i]), self.max_ms)
+                return self.max_ms
+
+        return self.max_ms
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": self.max_ms,
+        }
+
+
+_histograms: dict[str, Histogram] = {}
+_lock = threading.Lock()
+
+
+def _observe(name: str, ms: float):
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(ms)
+
+
+def stage_stats() -> dict:
+    with _lock:
+        return {name: h.as_dict() for name, h in sorted(_histograms.items())}
+
+
+# =========================
+# Trazas
+# =========================
+class Trace:
+
+    def __init__(self, name: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.spans: list[dict] = []
+
+    def add(self, name: str, start: float, ms: float, parent: str | None):
+        self.spans.append(
+            {
+                "name": name,
+                "parent": parent,
+                "start_ms": 1000 * (start - self.started_at),
+                "duration_ms": ms,
+            }
+        )
+
+    def timings(self) -> dict[str, float]:
+        # si una etapa se repite (varias vistas) se suman sus tiempos
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration_ms"]
+        return totals
+
+    def as_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "total_ms": 1000 * (time.perf_counter() - self.started_at),
+            "spans": self.spans,
+        }
+
+    def dump(self, directory: str = TRACE_DUMP_DIR):
+        if not directory:
+            return
+
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{self.name}-{self.id}.json")
+            with open(path, "w") as f:
+                json.dump(self.as_dict(), f, indent=2)
+        except OSError as e:
+            print("⚠️ No se pudo guardar la traza:", e)
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+_current_span: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class start_trace:
+    """
+    with start_trace("inventory_pipeline") as trace: ...
+    Las tareas creadas dentro heredan la traza.
+    """
+
+    def __init__(self, name: str):
+        self.trace = Trace(name)
+        self._token = None
+
+    def __enter__(self) -> Trace:
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self._token)
+        _observe(self.trace.name, 1000 * (time.perf_counter() - self.trace.started_at))
+
+
+class span:
+    """
+    with span("parse"): ...      async with span("llm_extraction"): ...
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._start = 0.0
+        self._parent = None
+        self._token = None
+
+    def __enter__(self):
+        self._parent = _current_span.get()
+        self._token = _current_span.set(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        ms = 1000 * (time.perf_counter() - self._start)
+        _current_span.reset(self._token)
+
+        _observe(self.name, ms)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(self.name, self._start, ms, self._parent)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, *exc):
+        self.__exit__(*exc)
+
+
+def record(name: str, seconds: float):
+    """
+    Registra una duración medida en otro lado
+    (por ejemplo dentro de un worker de OCR).
+    """
+    ms = 1000 * seconds
+    _observe(name, ms)
+
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, time.perf_counter() - seconds, ms, _current_span.get())
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
@@ -0,0 +1,344 @@
+"""
+Búsqueda local con un índice de vectores en NumPy.
+
+Los nombres, marcas y tamaños del catálogo se convierten una sola vez en
+una matriz float32 que se guarda en disco y se abre con memory mapping.
+Cada consulta se resuelve con un producto matricial (similitud coseno).
+
+La búsqueda semántica es VECTOR_EMBEDDER=ollama: los vectores salen de
+/api/embeddings de Ollama (OLLAMA_EMBEDDING_MODEL) y pueden relacionar
+sinónimos ("gaseosa" y "cola"), a cambio de una llamada corta por
+consulta.
+
+VECTOR_EMBEDDER=hashing (por defecto, sin Ollama) es solo léxica: los
+vectores son n-gramas de caracteres, toleran errores de tipeo y de OCR
+pero no relacionan sinónimos; esas consultas terminan en la IA.
+"""
+
+import asyncio
+import json
+import os
+import zlib
+
+import httpx
+import numpy as np
+
+from llm.http_client import OLLAMA_MAX_CONNECTIONS, get_http_client
+from services.catalog_index import CatalogEntry, CatalogSnapshot, normalize_text
+from services.cpu_executor import ExecutorSaturated, run_cpu
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+VECTOR_EMBEDDER = os.getenv("VECTOR_EMBEDDER", "hashing")
+
+OLLAMA_EMBEDDINGS_URL = os.getenv(
+    "OLLAMA_EMBEDDINGS_URL", "http://localhost:11434/api/embeddings"
+)
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+
+# por debajo de este puntaje se recurre a la IA; si no se define se usa
+# el umbral del embedder (los puntajes no son comparables entre embedders)
+VECTOR_MATCH_THRESHOLD = os.getenv("VECTOR_MATCH_THRESHOLD")
+
+# espera antes de escribir la matriz, para juntar varios cambios seguidos
+VECTOR_SAVE_DELAY = float(os.getenv("VECTOR_SAVE_DELAY", "5"))
+
+# lotes más chicos se calculan en el event loop (una consulta tarda µs)
+INLINE_EMBED_TEXTS = 16
+
+
+# =========================
+# Embeddings
+# =========================
+class HashingEmbedder:
+    """
+    Embeddings de n-gramas de caracteres y palabras proyectados con
+    hashing a un vector de tamaño fijo. No necesita modelo ni red.
+
+    Solo léxico: compara cómo se escribe el texto, no lo que significa.
+    Sirve para errores de tipeo y de OCR; para sinónimos usar
+    OllamaEmbedder.
+    """
+
+    version = "hash-ngram-v1"
+
+    # punto de partida, no calibrado: ajustarlo con VECTOR_MATCH_THRESHOLD
+    # sobre consultas reales del catálogo
+    threshold = 0.4
+
+    def __init__(self, dim: int = 512, ngram_range: tuple[int, int] = (2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _features(self, text: str) -> list[str]:
+        normalized = normalize_text(text)
+        features = [f"w:{w}" for w in normalized.split()]
+
+        padded = f" {normalized} "
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            features.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+
+        return features
+
+    def embed_sync(self, texts: list[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode())
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        return matrix / norms
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        if len(texts) <= INLINE_EMBED_TEXTS:
+            return self.embed_sync(texts)
+
+        return await run_cpu(self.embed_sync, texts)
+
+
+class OllamaEmbedder:
+    """
+    Embeddings semánticos de un modelo de Ollama (/api/embeddings).
+    El umbral depende del modelo: medirlo y fijarlo con
+    VECTOR_MATCH_THRESHOLD al cambiar OLLAMA_EMBEDDING_MODEL.
+    """
+
+    # punto de partida para nomic-embed-text
+    threshold = 0.7
+
+    def __init__(self, model: str = OLLAMA_EMBEDDING_MODEL):
+        self.model = model
+        self.version = f"ollama-{model}"
+
+    async def _embed_one(self, text: str, semaphore: asyncio.Semaphore) -> list[float]:
+        async with semaphore:
+            response = await get_http_client().post(
+                OLLAMA_EMBEDDINGS_URL, json={"model": self.model, "prompt": text}
+            )
+            response.raise_for_status()
+            return response.json()["embedding"]
+
+    async def embed(self, texts: list[str]) -> np.ndarray:
+        # sin ocupar todas las conexiones con Ollama
+        semaphore = asyncio.Semaphore(max(1, OLLAMA_MAX_CONNECTIONS // 2))
+        vectors = await asyncio.gather(
+            *(self._embed_one(text, semaphore) for text in texts)
+        )
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        return matrix / norms
+
+
+def make_embedder(kind: str = VECTOR_EMBEDDER):
+    if kind == "ollama":
+        return OllamaEmbedder()
+    return HashingEmbedder()
+
+
+def product_text(entry: CatalogEntry) -> str:
+    # el nombre va dos veces para que pese más que la marca y el tamaño
+    parts = [entry.product_name, entry.product_name, entry.brand, entry.size]
+    return " ".join(p for p in parts if p)
+
+
+# =========================
+# Índice de vectores
+# =========================
+class VectorIndex:
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or make_embedder()
+
+        self._catalog: CatalogSnapshot | None = None
+        self._matrix: np.ndarray | None = None
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+
+        self._lock: asyncio.Lock | None = None
+        self._save_task: asyncio.Task | None = None
+        self._save_now = asyncio.Event()
+        self._dirty = False
+
+    @property
+    def threshold(self) -> float:
+        if VECTOR_MATCH_THRESHOLD is not None:
+            return float(VECTOR_MATCH_THRESHOLD)
+        return self.embedder.threshold
+
+    @property
+    def _matrix_path(self) -> str:
+        return os.path.join(self.directory, "embeddings.npy")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    def _load(self):
+        """
+        Abre la matriz guardada en disco (memory-mapped) si fue
+        generada con el mismo embedder.
+        """
+        try:
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+
+            if meta.get("embedder") != self.embedder.version:
+                return
+
+            matrix = np.load(self._matrix_path, mmap_mode="r")
+            if matrix.ndim != 2 or matrix.shape[0] != len(meta["ids"]):
+                # matriz y metadatos de dos guardados distintos
+                return
+
+            self._matrix = matrix
+            self._ids = meta["ids"]
+            self._texts = meta["texts"]
+        except (OSError, ValueError, KeyError):
+            self._matrix = None
+            self._ids = []
+            self._texts = []
+
+    def _write(self, matrix: np.ndarray, ids: list[str], texts: list[str]):
+        """
+        Escribe en archivos temporales y los reemplaza: una matriz que
+        está abierta con mmap nunca se trunca.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        try:
+            with open(self._matrix_path + ".tmp", "wb") as f:
+                np.save(f, matrix)
+            os.replace(self._matrix_path + ".tmp", self._matrix_path)
+
+            with open(self._meta_path + ".tmp", "w") as f:
+                json.dump(
+                    {"embedder": self.embedder.version, "ids": ids, "texts": texts},
+                    f,
+                )
+            os.replace(self._meta_path + ".tmp", self._meta_path)
+        except OSError as e:
+            print("⚠️ No se pudo guardar el índice de vectores:", e)
+
+    def _schedule_save(self):
+        # un solo guardado en curso; los cambios que llegan mientras
+        # tanto se escriben en la vuelta siguiente
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_loop())
+
+    async def _save_loop(self):
+        while self._dirty:
+            try:
+                await asyncio.wait_for(self._save_now.wait(), VECTOR_SAVE_DELAY)
+            except asyncio.TimeoutError:
+                pass
+
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._matrix, self._ids, self._texts)
+
+    async def flush(self):
+        """Escribe ya el último cambio pendiente (al apagar)."""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_now.set()
+            await self._save_task
+            self._save_now.clear()
+
+    async def ensure(self, catalog: CatalogSnapshot):
+        """
+        Alinea la matriz con el snapshot del catálogo.
+        Solo se calculan embeddings de productos nuevos o modificados.
+        """
+        if catalog is self._catalog:
+            return
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if catalog is self._catalog:
+                return
+
+            if self._matrix is None:
+                await asyncio.to_thread(self._load)
+
+            ids = [e.id for e in catalog.entries]
+            texts = [product_text(e) for e in catalog.entries]
+
+            if ids == self._ids and texts == self._texts:
+                self._catalog = catalog
+                return
+
+            previous = {
+                entry_id: (row, text)
+                for row, (entry_id, text) in enumerate(zip(self._ids, self._texts))
+            }
+
+            kept, old_rows, missing = [], [], []
+            for row, (entry_id, text) in enumerate(zip(ids, texts)):
+                old = previous.get(entry_id)
+                if old is not None and old[1] == text:
+                    kept.append(row)
+                    old_rows.append(old[0])
+                else:
+                    missing.append(row)
+
+            embedded = None
+            if missing:
+                embedded = await self.embedder.embed([texts[row] for row in missing])
+
+            dim = embedded.shape[1] if embedded is not None else self._matrix.shape[1]
+            matrix = np.empty((len(ids), dim), dtype=np.float32)
+
+            if kept:
+                matrix[kept] = self._matrix[old_rows]
+            if missing:
+                matrix[missing] = embedded
+
+            self._matrix = matrix
+            self._ids = ids
+            self._texts = texts
+            self._catalog = catalog
+
+            self._schedule_save()
+
+    async def search(
+        self, catalog: CatalogSnapshot, text: str, limit: int = 5
+    ) -> list[tuple[CatalogEntry, float]]:
+        try:
+            await self.ensure(catalog)
+
+            if not self._ids:
+                return []
+
+            query = (await self.embedder.embed([text]))[0]
+        except (httpx.HTTPError, ExecutorSaturated) as e:
+            # sin vectores se sigue con la IA, como antes del índice
+            print("⚠️ Índice de vectores no disponible:", e)
+            return []
+
+        # la matriz y su snapshot se leen juntos: otra consulta pudo
+        # actualizarlos mientras se esperaba el embedding
+        matrix, indexed = self._matrix, self._catalog
+
+        k = min(limit, len(indexed.entries))
+        if k == 0:
+            return []
+
+        scores = matrix @ query
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        return [(indexed.entries[pos], float(scores[pos])) for pos in top]
+
+
+vector_index = VectorIndex()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the app imports its packages from the project root (services, llm, ...)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
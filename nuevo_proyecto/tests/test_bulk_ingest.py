@@ -0,0 +1,162 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import scripts.bulk_ingest as bulk_ingest
+from scripts.bulk_ingest import BulkIngester, find_products, load_checkpoint
+from services.catalog_index import CatalogSnapshot
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"img")
+
+
+def test_find_products_groups_views_by_folder(tmp_path):
+    _touch(tmp_path / "leche" / "front.jpg")
+    _touch(tmp_path / "leche" / "side_left.png")
+    _touch(tmp_path / "leche" / "notas.txt")
+    _touch(tmp_path / "sueltas" / "avena.jpg")
+    _touch(tmp_path / "sueltas" / "durazno.JPEG")
+
+    products = find_products(str(tmp_path))
+
+    assert [key for key, _ in products] == [
+        "leche",
+        "sueltas/avena.jpg",
+        "sueltas/durazno.JPEG",
+    ]
+    assert set(products[0][1]) == {"front", "side_left"}
+    assert list(products[1][1]) == ["front"]
+
+
+def test_find_products_order_is_stable(tmp_path):
+    for name in ["c", "a", "b"]:
+        _touch(tmp_path / name / "front.jpg")
+
+    assert find_products(str(tmp_path)) == find_products(str(tmp_path))
+    assert [key for key, _ in find_products(str(tmp_path))] == ["a", "b", "c"]
+
+
+def _write_checkpoint(path, entries, tail=""):
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.write(tail)
+
+
+def test_load_checkpoint_missing_file(tmp_path):
+    assert load_checkpoint(str(tmp_path / "nope.jsonl")) == set()
+
+
+def test_load_checkpoint_resumes_and_skips_torn_line(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    _write_checkpoint(
+        path,
+        [
+            {"key": "a", "status": "saved", "product": "Leche"},
+            {"key": "b", "status": "exists", "product": "Leche"},
+            {"key": "c", "status": "error", "message": "sin nombre"},
+        ],
+        tail='{"key": "d", "sta',
+    )
+
+    assert load_checkpoint(str(path)) == {"a", "b", "c"}
+
+
+def test_load_checkpoint_retry_errors(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    _write_checkpoint(
+        path,
+        [
+            {"key": "a", "status": "saved", "product": "Leche"},
+            {"key": "c", "status": "error", "message": "sin nombre"},
+        ],
+    )
+
+    assert load_checkpoint(str(path), retry_errors=True) == {"a"}
+
+
+def test_load_checkpoint_later_success_wins(tmp_path):
+    path = tmp_path / "ck.jsonl"
+    _write_checkpoint(
+        path,
+        [
+            {"key": "c", "status": "error", "message": "timeout"},
+            {"key": "c", "status": "saved", "product": "Avena"},
+        ],
+    )
+
+    assert load_checkpoint(str(path), retry_errors=True) == {"c"}
+
+
+def _ingester(tmp_path, catalog=()):
+    args = SimpleNamespace(
+        stock=0,
+        dry_run=False,
+        checkpoint=str(tmp_path / "ck.jsonl"),
+        batch_size=100,
+        report_every=1000,
+    )
+    ingester = BulkIngester(args, total=10)
+    ingester.catalog = CatalogSnapshot.build(catalog)
+    return ingester
+
+
+def _read_checkpoint(ingester):
+    ingester.close()
+    with open(ingester.args.checkpoint) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_process_dedupes_names_and_skips_unknown(tmp_path, monkeypatch):
+    names = iter(["Leche Entera", "leche  entera", "producto_desconocido", ""])
+
+    async def fake_pipeline(images):
+        return {"status": "need_info", "product_name": next(names)}
+
+    monkeypatch.setattr(bulk_ingest, "run_multi_image_pipeline", fake_pipeline)
+    monkeypatch.setattr(bulk_ingest, "_read_images", lambda views: {"front": b"x"})
+
+    ingester = _ingester(tmp_path)
+
+    async def run():
+        for key in ["a", "b", "c", "d"]:
+            await ingester.process(key, {"front": key})
+
+    asyncio.run(run())
+
+    statuses = [entry["status"] for entry, _, _ in ingester.pending]
+    assert statuses == ["saved", "exists", "error", "error"]
+
+
+def test_flush_retries_failed_batch_item_by_item(tmp_path):
+    ingester = _ingester(tmp_path)
+    saved = []
+
+    async def fake_save(items):
+        if len(items) > 1 or items[0]["name"] == "Roto":
+            raise RuntimeError("duplicate key")
+        saved.extend(item["name"] for item in items)
+
+    ingester._save = fake_save
+
+    for key, name in [("a", "Leche"), ("b", "Roto"), ("c", "Avena")]:
+        ingester.names.add(name.lower())
+        entry = {"key": key, "status": "saved", "product": name}
+        ingester.pending.append((entry, {}, {"front": b"x"}))
+
+    asyncio.run(ingester.flush())
+
+    assert saved == ["Leche", "Avena"]
+    assert ingester.counts == {"saved": 2, "exists": 0, "error": 1}
+    assert "roto" not in ingester.names
+
+    checkpoint = _read_checkpoint(ingester)
+    assert [(e["key"], e["status"]) for e in checkpoint] == [
+        ("a", "saved"),
+        ("b", "error"),
+        ("c", "saved"),
+    ]
+    # the failed product is picked up again with --retry-errors
+    assert load_checkpoint(ingester.args.checkpoint, retry_errors=True) == {"a", "c"}
@@ -0,0 +1,128 @@
+import asyncio
+from types import SimpleNamespace
+
+from services.catalog_index import CatalogEntry, CatalogIndex, CatalogSnapshot
+
+
+def product(id, name, brand=None, size=None):
+    return SimpleNamespace(id=id, product_name=name, brand=brand, size=size)
+
+
+def entry(id, name):
+    return CatalogEntry.from_product(product(id, name))
+
+
+def names(entries):
+    return [e.product_name for e in entries]
+
+
+def test_renaming_an_entry_drops_the_old_name():
+    snapshot = CatalogSnapshot.build(
+        [product("1", "Leche Entera"), product("2", "Arroz Blanco")]
+    )
+
+    renamed = snapshot.with_entries([entry("1", "Yogur Natural")])
+
+    assert len(renamed) == 2
+    assert renamed.version == snapshot.version + 1
+    assert renamed.get_by_name("Leche Entera") is None
+    assert renamed.get_by_name("Yogur Natural").id == "1"
+    assert renamed.find_substring("leche") == []
+    assert names(renamed.find_substring("yogur")) == ["Yogur Natural"]
+    assert renamed.best_token_overlap("leche entera") is None
+    assert renamed.best_token_overlap("yogur natural").id == "1"
+
+    # el snapshot anterior no cambia
+    assert names(snapshot.find_substring("leche")) == ["Leche Entera"]
+    assert snapshot.best_token_overlap("leche entera").id == "1"
+
+
+def test_reupserting_the_same_id_keeps_one_entry():
+    snapshot = CatalogSnapshot.build([product("1", "Leche Entera")])
+
+    again = snapshot.with_entries(
+        [entry("1", "Leche Entera"), entry("1", "Leche Entera")]
+    )
+
+    assert len(again) == 1
+    assert again.by_id == {"1": 0}
+    assert names(again.find_substring("entera")) == ["Leche Entera"]
+    assert again.best_token_overlap("leche").id == "1"
+    assert again.token_postings["leche"] == frozenset({0})
+
+
+def test_token_overlap_ties_go_to_the_first_entry_after_updates():
+    snapshot = CatalogSnapshot.build(
+        [product("1", "Leche Entera"), product("2", "Leche Descremada")]
+    )
+
+    updated = snapshot.with_entries(
+        [entry("3", "Leche Chocolatada"), entry("1", "Leche Entera")]
+    )
+
+    assert names(updated.find_substring("leche")) == [
+        "Leche Entera",
+        "Leche Descremada",
+        "Leche Chocolatada",
+    ]
+    assert updated.best_token_overlap("leche").id == "1"
+    assert updated.best_token_overlap("leche chocolatada").id == "3"
+
+
+class SlowProductService:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def list_catalog_rows(self):
+        self.reading.set()
+        await self.release.wait()
+        return self.rows
+
+
+def test_upserts_during_a_load_are_applied_to_the_new_snapshot():
+    async def scenario():
+        index = CatalogIndex()
+        service = SlowProductService([product("1", "Leche Entera")])
+
+        load = asyncio.create_task(index.ensure_loaded(service))
+        await service.reading.wait()
+
+        # llegan mientras se lee la tabla: un producto nuevo y un cambio
+        # de nombre de uno que la lectura devuelve con el nombre viejo
+        index.upsert_many([product("2", "Arroz Blanco")])
+        index.upsert(product("1", "Leche Descremada"))
+        assert len(index._pending) == 2
+
+        service.release.set()
+        snapshot = await load
+
+        assert index._pending == []
+        assert index.snapshot() is snapshot
+        return snapshot
+
+    snapshot = asyncio.run(scenario())
+
+    assert len(snapshot) == 2
+    assert snapshot.get_by_name("Leche Entera") is None
+    assert names(snapshot.find_substring("leche")) == ["Leche Descremada"]
+    assert names(snapshot.find_substring("arroz")) == ["Arroz Blanco"]
+    assert snapshot.best_token_overlap("leche descremada").id == "1"
+    assert snapshot.best_token_overlap("arroz").id == "2"
+
+
+def test_upserts_after_a_load_update_the_snapshot():
+    async def scenario():
+        index = CatalogIndex()
+        service = SlowProductService([])
+        service.release.set()
+        await index.ensure_loaded(service)
+
+        index.upsert_many([product("1", "Leche Entera")])
+        return index
+
+    index = asyncio.run(scenario())
+
+    assert index._pending == []
+    assert names(index.snapshot().find_substring("leche")) == ["Leche Entera"]
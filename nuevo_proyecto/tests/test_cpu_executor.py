@@ -0,0 +1,71 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.cpu_executor import BoundedExecutor, ExecutorSaturated
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def test_rejects_work_at_the_bound():
+    async def scenario():
+        executor = BoundedExecutor(max_workers=1, max_pending=2, name="test")
+        release = threading.Event()
+
+        running = [asyncio.create_task(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.stats()["pending"] == 2
+
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(sum, [1, 2])
+
+        release.set()
+        await asyncio.gather(*running)
+        await wait_until(lambda: executor.stats()["pending"] == 0)
+
+        assert await executor.run(sum, [1, 2]) == 3
+        stats = executor.stats()
+        executor.shutdown()
+        return stats
+
+    stats = asyncio.run(scenario())
+
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 3
+
+
+def test_cancelled_caller_keeps_the_slot_until_the_thread_finishes():
+    async def scenario():
+        executor = BoundedExecutor(max_workers=1, max_pending=1, name="test")
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait()
+
+        task = asyncio.create_task(executor.run(blocking))
+        await asyncio.to_thread(started.wait)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # el hilo sigue ocupado: el lugar no se liberó con la cancelación
+        assert executor.stats()["pending"] == 1
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(sum, [1, 2])
+
+        release.set()
+        await wait_until(lambda: executor.stats()["pending"] == 0)
+
+        assert await executor.run(sum, [1, 2]) == 3
+        executor.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from rapidfuzz import fuzz
+
+from services.catalog_index import CatalogSnapshot
+from services.fuzzy_matcher import FuzzyMatcher
+
+NAMES = ["Leche Entera", "Leche Descremada", "Arroz Blanco", "Leche"]
+
+
+def catalog(names=NAMES):
+    return CatalogSnapshot.build(
+        SimpleNamespace(id=str(i), product_name=name, brand=None, size=None)
+        for i, name in enumerate(names)
+    )
+
+
+def names(matches):
+    return [entry.product_name for entry, _ in matches]
+
+
+def test_limit_above_the_catalog_size_returns_every_entry():
+    result = FuzzyMatcher().match_many(
+        catalog(), ["leche", "arroz"], limit=10, scorer=fuzz.ratio
+    )
+
+    assert result.indices.shape == (2, len(NAMES))
+    assert names(result.matches(0))[0] == "Leche"
+    assert result.best(1)[0].product_name == "Arroz Blanco"
+
+
+def test_empty_catalog_and_empty_queries():
+    matcher = FuzzyMatcher()
+
+    result = matcher.match_many(catalog([]), ["leche", "arroz"])
+    assert result.indices.shape == (2, 0)
+    assert result.matches(0) == []
+    assert result.best(1) is None
+
+    result = matcher.match_many(catalog(), [])
+    assert result.indices.shape == (0, 0)
+
+
+def test_cutoff_drops_low_scores():
+    result = FuzzyMatcher().match_many(
+        catalog(), ["leche entera"], limit=4, cutoff=80, scorer=fuzz.ratio
+    )
+
+    found = result.matches(0)
+    assert names(found) == ["Leche Entera"]
+    assert all(score >= 80 for _, score in found)
+
+    result = FuzzyMatcher().match_many(
+        catalog(), ["fideos"], limit=4, cutoff=80, scorer=fuzz.ratio
+    )
+    assert result.best(0) is None
+
+
+def test_ties_keep_catalog_order():
+    # partial_ratio da 100 a cada producto que contiene "leche"
+    tied = [f"{'Leche' if i % 3 == 0 else 'Arroz'} {i}" for i in range(60)]
+    expected = [name for name in tied if name.startswith("Leche")]
+
+    # el top-k abarca todos los empates: el orden no depende de argpartition
+    for limit in (20, 60):
+        result = FuzzyMatcher().match_many(catalog(tied), ["leche"], limit=limit)
+        found = result.matches(0)
+
+        assert names(found) == expected
+        assert {score for _, score in found} == {100.0}
+
+
+def test_scores_are_sorted_per_query():
+    result = FuzzyMatcher().match_many(
+        catalog(), ["leche descremada", "arroz", "lech"], limit=4, scorer=fuzz.ratio
+    )
+
+    for row in range(3):
+        scores = [score for _, score in result.matches(row)]
+        assert scores == sorted(scores, reverse=True)
+
+    assert result.best(0)[0].product_name == "Leche Descremada"
+    assert result.best(2)[0].product_name == "Leche"
@@ -0,0 +1,165 @@
+import asyncio
+import sqlite3
+
+from services.cpu_executor import ExecutorSaturated
+from services.job_service import DetectionJobService, SQLiteJobStore
+
+PRODUCT = {
+    "name": "Leche",
+    "brand": None,
+    "size": "1l",
+    "price": None,
+    "expiration_date": None,
+    "views": ["front"],
+}
+
+
+def test_requeue_unfinished_keeps_arrival_order(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    for job_id in ["a", "b", "c", "d"]:
+        store.create(job_id, {"front": job_id})
+
+    store.mark_running("b")
+    store.finish("c", "done", "ok", None, None)
+
+    assert store.requeue_unfinished() == ["a", "b", "d"]
+    assert store.get("b")["status"] == "queued"
+    assert store.get("b")["started_at"] is None
+    assert store.get("c")["status"] == "done"
+    store.close()
+
+
+def test_finish_keeps_images_only_for_a_pending_product(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    store.create("a", {"front": "aGk="})
+    store.create("b", {"front": "aGk="})
+
+    store.finish("a", "done", "ok", PRODUCT, None)
+    store.finish("b", "done", "sin producto", None, None)
+
+    assert store.images("a") == {"front": "aGk="}
+    assert store.images("b") is None
+    assert store.get("a")["product"] == PRODUCT
+    store.close()
+
+
+def test_old_table_gets_the_new_columns(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE detection_jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+        "images TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, "
+        "started_at REAL, finished_at REAL)"
+    )
+    conn.commit()
+    conn.close()
+
+    store = SQLiteJobStore(path)
+    store.create("a", {"front": "aGk="})
+    store.finish("a", "done", "ok", PRODUCT, None)
+
+    assert store.get("a")["confirmed_at"] is None
+    store.close()
+
+
+def test_restart_resumes_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    # a previous process died with one job running and one queued
+    store = SQLiteJobStore(path)
+    store.create("a", {"front": "aGk="})
+    store.create("b", {"front": "aGk="})
+    store.mark_running("a")
+    store.close()
+
+    handled = []
+
+    async def handler(images):
+        handled.append(images)
+        return "ok", PRODUCT
+
+    async def run():
+        service = DetectionJobService(SQLiteJobStore(path), workers=1)
+        await service.start(handler)
+        await service._queue.join()
+        jobs = [await service.get(job_id) for job_id in ["a", "b"]]
+        await service.shutdown()
+        return jobs
+
+    jobs = asyncio.run(run())
+
+    assert len(handled) == 2
+    assert [job["status"] for job in jobs] == ["done", "done"]
+
+
+def test_saturated_job_waits_instead_of_failing(tmp_path, monkeypatch):
+    monkeypatch.setattr("services.job_service.SATURATED_RETRY_SECONDS", 0)
+    attempts = []
+
+    async def handler(images):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ExecutorSaturated("busy")
+        return "ok", None
+
+    async def run():
+        service = DetectionJobService(SQLiteJobStore(str(tmp_path / "j.db")))
+        await service.start(handler)
+        job_id = await service.submit({"front": "aGk="})
+        await service._queue.join()
+        job = await service.get(job_id)
+        await service.shutdown()
+        return job
+
+    job = asyncio.run(run())
+
+    assert len(attempts) == 3
+    assert job["status"] == "done"
+
+
+def test_confirm_saves_the_product_once(tmp_path):
+    async def handler(images):
+        return "ok", dict(PRODUCT)
+
+    saves = []
+
+    async def save(product, images):
+        saves.append((product, images))
+        await asyncio.sleep(0)
+        return product["name"]
+
+    async def failing_save(product, images):
+        raise RuntimeError("db down")
+
+    async def run():
+        service = DetectionJobService(SQLiteJobStore(str(tmp_path / "j.db")))
+        await service.start(handler)
+        job_id = await service.submit({"front": "aGk="})
+        await service._queue.join()
+
+        product = await service.pending_product(job_id)
+        product["price"] = "1.25"
+        await service.update_product(job_id, product)
+
+        # a failed save leaves the product pending
+        try:
+            await service.confirm(job_id, failing_save)
+        except RuntimeError:
+            pass
+
+        results = await asyncio.gather(
+            service.confirm(job_id, save), service.confirm(job_id, save)
+        )
+        job = await service.get(job_id)
+        pending = await service.pending_product(job_id)
+        await service.shutdown()
+        return results, job, pending
+
+    results, job, pending = asyncio.run(run())
+
+    assert sorted(results, key=str) == ["Leche", None]
+    assert len(saves) == 1
+    assert saves[0][0]["price"] == "1.25"
+    assert saves[0][1] == {"front": "aGk="}
+    assert job["confirmed_at"] is not None
+    assert pending is None
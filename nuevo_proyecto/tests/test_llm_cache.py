@@ -0,0 +1,42 @@
+import asyncio
+
+from llm.cache import SQLiteCacheBackend, TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_reads_back_from_sqlite(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        writer = TTLCache(backend=SQLiteCacheBackend(path))
+        await writer.aset("k", {"products": ["avena"]})
+
+        # a fresh process only has the file
+        cache = TTLCache(backend=SQLiteCacheBackend(path))
+        return await cache.aget("k"), await cache.aget("missing"), cache.stats()
+
+    value, missing, stats = asyncio.run(run())
+
+    assert value == {"products": ["avena"]}
+    assert missing is None
+    assert stats["disk_hits"] == 1
+    assert stats["misses"] == 1
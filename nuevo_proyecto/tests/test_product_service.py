@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from services.product_service import ProductService
+
+
+class PgError(Exception):
+    def __init__(self, sqlstate):
+        super().__init__(sqlstate)
+        self.sqlstate = sqlstate
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+def make_service(monkeypatch, sqlstate):
+    monkeypatch.setattr(ProductService, "trigram_search", True)
+    service = ProductService(FakeSession())
+
+    async def failing_trigram(text, limit, min_similarity):
+        raise DBAPIError("SELECT ...", {}, PgError(sqlstate))
+
+    async def catalog(text, limit, min_similarity):
+        return ["catalog"]
+
+    service._search_trigram = failing_trigram
+    service._search_catalog = catalog
+    return service
+
+
+def test_missing_pg_trgm_falls_back_to_the_catalog(monkeypatch):
+    service = make_service(monkeypatch, "42883")
+
+    assert asyncio.run(service.search_products("leche")) == ["catalog"]
+    assert service.session.rollbacks == 1
+    assert ProductService.trigram_search is False
+
+
+def test_other_database_errors_propagate(monkeypatch):
+    service = make_service(monkeypatch, "57014")
+
+    with pytest.raises(DBAPIError):
+        asyncio.run(service.search_products("leche"))
+
+    assert service.session.rollbacks == 0
+    assert ProductService.trigram_search is True
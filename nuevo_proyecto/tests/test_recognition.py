@@ -0,0 +1,161 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from planner import recognition
+from services.catalog_index import CatalogSnapshot
+
+CATALOG = CatalogSnapshot.build(
+    SimpleNamespace(id=str(i), product_name=name, brand=None, size=None)
+    for i, name in enumerate(["Leche Entera", "Arroz Blanco", "Yerba Mate"], 1)
+)
+
+
+class FakeClassifier:
+    def __init__(self, prediction):
+        self.prediction = prediction
+
+    async def predict_image(self, img):
+        return self.prediction
+
+
+def vision(name, votes):
+    return [{"product": name, "votes": votes, "score": 0.5}]
+
+
+CASES = [
+    # (caso, OCR, visión, clasificador, producto esperado, fuente esperada)
+    (
+        "vision_confirmed_by_ocr",
+        "LECHE ENTERA 1L",
+        vision("Leche Entera", 60),
+        ("Arroz Blanco", 0.2),
+        "Leche Entera",
+        "vision",
+    ),
+    (
+        "classifier_confirmed_by_ocr",
+        "arroz blanco largo fino",
+        [],
+        ("Arroz Blanco", 0.95),
+        "Arroz Blanco",
+        "classifier",
+    ),
+    (
+        "ocr_wins_a_conflict_with_vision",
+        "arroz blanco 1kg",
+        vision("Leche Entera", 60),
+        ("", 0.0),
+        "Arroz Blanco",
+        "ocr",
+    ),
+    (
+        "image_recognizers_disagree_without_ocr",
+        "",
+        vision("Leche Entera", 60),
+        ("Arroz Blanco", 0.95),
+        None,
+        None,
+    ),
+    (
+        "vision_alone_is_not_enough",
+        "",
+        vision("Leche Entera", 60),
+        ("", 0.0),
+        None,
+        None,
+    ),
+    (
+        "classifier_alone_is_not_enough",
+        "precio 1500",
+        [],
+        ("Yerba Mate", 0.99),
+        None,
+        None,
+    ),
+    (
+        "ocr_alone_is_enough",
+        "yerba mate suave 500g",
+        [],
+        ("", 0.0),
+        "Yerba Mate",
+        "ocr",
+    ),
+    (
+        "vision_and_classifier_agree_without_ocr",
+        "",
+        vision("Leche Entera", 48),
+        ("Leche Entera", 0.7),
+        "Leche Entera",
+        "ensemble",
+    ),
+    (
+        "weak_agreement_stays_unknown",
+        "",
+        vision("Leche Entera", 30),
+        ("Leche Entera", 0.5),
+        None,
+        None,
+    ),
+    (
+        "unknown_product_names_are_ignored",
+        "",
+        vision("Galletitas", 60),
+        ("Galletitas", 0.99),
+        None,
+        None,
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    "ocr_text, candidates, prediction, product, source",
+    [case[1:] for case in CASES],
+    ids=[case[0] for case in CASES],
+)
+def test_recognize_product(
+    monkeypatch, ocr_text, candidates, prediction, product, source
+):
+    async def extract_text_async(image_bytes):
+        return ocr_text
+
+    monkeypatch.setattr(recognition, "RECOGNITION_ENSEMBLE", True)
+    monkeypatch.setattr(recognition, "extract_text_async", extract_text_async)
+    monkeypatch.setattr(recognition, "decode_bounded", lambda data: "img")
+    monkeypatch.setattr(
+        recognition, "detect_candidates_from_image", lambda img: candidates
+    )
+    monkeypatch.setattr(recognition, "classifier_batcher", FakeClassifier(prediction))
+
+    result = asyncio.run(recognition.recognize_product(b"foto", CATALOG))
+
+    assert result["raw_text"] == ocr_text
+    assert result["source"] == source
+    if product is None:
+        assert result["product"] is None
+        assert result["confidence"] == 0.0
+    else:
+        assert result["product"].product_name == product
+        assert result["confidence"] > 0
+
+
+def test_failing_recognizer_does_not_stop_the_others(monkeypatch):
+    async def extract_text_async(image_bytes):
+        return "leche entera"
+
+    def broken_vision(img):
+        raise RuntimeError("sin índice")
+
+    monkeypatch.setattr(recognition, "RECOGNITION_ENSEMBLE", True)
+    monkeypatch.setattr(recognition, "extract_text_async", extract_text_async)
+    monkeypatch.setattr(recognition, "decode_bounded", lambda data: "img")
+    monkeypatch.setattr(recognition, "detect_candidates_from_image", broken_vision)
+    monkeypatch.setattr(
+        recognition, "classifier_batcher", FakeClassifier(("Leche Entera", 0.95))
+    )
+
+    result = asyncio.run(recognition.recognize_product(b"foto", CATALOG))
+
+    assert result["source"] == "classifier"
+    assert result["product"].product_name == "Leche Entera"
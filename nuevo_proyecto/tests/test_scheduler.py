@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from llm.scheduler import LLMQueueFull, LLMScheduler, Priority
+
+
+def test_scheduler_admits_higher_priority_first():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def call(priority, name):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        first = asyncio.create_task(call(Priority.SMALL_TALK, "first"))
+        await asyncio.sleep(0)
+        await asyncio.gather(
+            first,
+            call(Priority.SMALL_TALK, "chat"),
+            call(Priority.INVENTORY, "inventory"),
+            call(Priority.PIPELINE, "pipeline"),
+        )
+
+    asyncio.run(run())
+
+    assert order == ["first", "pipeline", "inventory", "chat"]
+
+
+def test_scheduler_rejects_when_queue_is_full():
+    scheduler = LLMScheduler(
+        max_concurrency=1,
+        queue_limits={
+            Priority.PIPELINE: 1,
+            Priority.INVENTORY: 1,
+            Priority.SMALL_TALK: 0,
+        },
+    )
+
+    async def hold(event):
+        async with scheduler.slot(Priority.PIPELINE):
+            await event.wait()
+
+    async def run():
+        event = asyncio.Event()
+        holder = asyncio.create_task(hold(event))
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMQueueFull):
+            async with scheduler.slot(Priority.SMALL_TALK):
+                pass
+
+        event.set()
+        await holder
+
+    asyncio.run(run())
+    assert scheduler.stats()["priorities"]["SMALL_TALK"]["rejected"] == 1
+
+
+def test_queue_limits_count_each_priority_separately():
+    scheduler = LLMScheduler(
+        max_concurrency=1,
+        queue_limits={
+            Priority.PIPELINE: 1,
+            Priority.INVENTORY: 2,
+            Priority.SMALL_TALK: 2,
+        },
+    )
+    order = []
+
+    async def call(priority, name, event=None):
+        async with scheduler.slot(priority):
+            order.append(name)
+            if event is not None:
+                await event.wait()
+
+    async def run():
+        event = asyncio.Event()
+        holder = asyncio.create_task(call(Priority.SMALL_TALK, "holder", event))
+        await asyncio.sleep(0)
+
+        # la cola de conversación se llena...
+        chats = [
+            asyncio.create_task(call(Priority.SMALL_TALK, f"chat{i}"))
+            for i in range(2)
+        ]
+        await asyncio.sleep(0)
+
+        with pytest.raises(LLMQueueFull):
+            await call(Priority.SMALL_TALK, "rejected")
+
+        # ...pero el inventario todavía tiene lugar en la suya
+        inventory = asyncio.create_task(call(Priority.INVENTORY, "inventory"))
+        await asyncio.sleep(0)
+
+        queued = scheduler.stats()["priorities"]
+        assert queued["SMALL_TALK"]["queued"] == 2
+        assert queued["INVENTORY"]["queued"] == 1
+
+        event.set()
+        await asyncio.gather(holder, inventory, *chats)
+
+    asyncio.run(run())
+
+    assert order == ["holder", "inventory", "chat0", "chat1"]
+    assert scheduler.stats()["queued"] == 0
+    assert all(p["queued"] == 0 for p in scheduler.stats()["priorities"].values())
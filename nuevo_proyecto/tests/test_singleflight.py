@@ -0,0 +1,45 @@
+import asyncio
+
+from llm.scheduler import Priority
+from llm.singleflight import SingleFlight, make_flight_key
+
+
+def test_single_flight_coalesces_identical_calls():
+    flight = SingleFlight()
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "respuesta"
+
+    async def run():
+        key = make_flight_key("prompt", "mistral", Priority.INVENTORY)
+        return await asyncio.gather(*(flight.do(key, generate) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["respuesta"] * 5
+    assert len(calls) == 1
+    assert flight.stats()["coalesced"] == 4
+
+def test_single_flight_survives_a_cancelled_caller():
+    flight = SingleFlight()
+
+    async def generate():
+        await asyncio.sleep(0.01)
+        return "respuesta"
+
+    async def run():
+        key = make_flight_key("prompt", "mistral", Priority.INVENTORY)
+        first = asyncio.create_task(flight.do(key, generate))
+        second = asyncio.create_task(flight.do(key, generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == "respuesta"
+
+
+def test_single_flight_key_depends_on_priority():
+    assert make_flight_key("p", "m", Priority.PIPELINE) != make_flight_key(
+        "p", "m", Priority.SMALL_TALK
+    )
@@ -0,0 +1,116 @@
+import os
+
+import cv2
+import numpy as np
+
+from agents.vision_index import (
+    DESCRIPTOR_SIZE,
+    LSHMatcher,
+    VisionIndex,
+    build_index,
+    load_index,
+)
+
+
+def write_image(path, seed: int):
+    # bloques aleatorios: suficientes esquinas para que ORB encuentre puntos
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, size=(24, 24), dtype=np.uint8)
+    img = cv2.resize(blocks, (240, 240), interpolation=cv2.INTER_NEAREST)
+    cv2.imwrite(str(path), img)
+
+
+def make_dataset(root, products: dict[str, list[int]]):
+    for name, seeds in products.items():
+        folder = root / name
+        folder.mkdir(parents=True, exist_ok=True)
+        for seed in seeds:
+            write_image(folder / f"{seed}.png", seed)
+
+
+def test_rebuild_reuses_unchanged_folders(tmp_path):
+    dataset, index_dir = tmp_path / "dataset", str(tmp_path / "index")
+    make_dataset(dataset, {"arroz": [1, 2], "leche": [3], "yerba": [4]})
+
+    report = build_index(str(dataset), index_dir)
+    assert report == {
+        "rebuilt": ["arroz", "leche", "yerba"],
+        "reused": [],
+        "removed": [],
+    }
+
+    first = load_index(index_dir)
+    arroz = first.features()["arroz"].copy()
+    assert len(first) == 3
+    assert all(p["count"] > 0 for p in first.products.values())
+    assert first.descriptors.shape[1] == DESCRIPTOR_SIZE
+
+    report = build_index(str(dataset), index_dir)
+    assert report["rebuilt"] == []
+    assert report["reused"] == ["arroz", "leche", "yerba"]
+
+    # un archivo nuevo en leche, yerba eliminado, arroz sin cambios
+    write_image(dataset / "leche" / "5.png", 5)
+    for img in os.listdir(dataset / "yerba"):
+        os.remove(dataset / "yerba" / img)
+    os.rmdir(dataset / "yerba")
+
+    report = build_index(str(dataset), index_dir)
+    assert report == {"rebuilt": ["leche"], "reused": ["arroz"], "removed": ["yerba"]}
+
+    rebuilt = load_index(index_dir)
+    assert set(rebuilt.products) == {"arroz", "leche"}
+    assert np.array_equal(rebuilt.features()["arroz"], arroz)
+    assert rebuilt.products["leche"]["count"] > first.products["leche"]["count"]
+
+
+def test_touching_a_file_without_changes_reuses_it(tmp_path):
+    dataset, index_dir = tmp_path / "dataset", str(tmp_path / "index")
+    make_dataset(dataset, {"arroz": [1]})
+    build_index(str(dataset), index_dir)
+
+    path = dataset / "arroz" / "1.png"
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 60))
+
+    report = build_index(str(dataset), index_dir)
+    assert report["reused"] == ["arroz"]
+    assert load_index(index_dir).products["arroz"]["files"]["1.png"]["mtime"] == (
+        stat.st_mtime + 60
+    )
+
+
+def synthetic_index(rows_per_product: int = 200) -> VisionIndex:
+    rng = np.random.default_rng(0)
+    names = ["arroz", "leche", "yerba"]
+    descriptors = rng.integers(
+        0, 256, size=(len(names) * rows_per_product, DESCRIPTOR_SIZE), dtype=np.uint8
+    )
+    products = {
+        name: {"offset": i * rows_per_product, "count": rows_per_product, "files": {}}
+        for i, name in enumerate(names)
+    }
+    return VisionIndex(descriptors, products)
+
+
+def test_lsh_matcher_ranks_the_source_product_first():
+    index = synthetic_index()
+    matcher = LSHMatcher(index)
+
+    # filas de leche con un bit cambiado, como una foto nueva del mismo producto
+    query = index.features()["leche"][:100].copy()
+    query[:, 0] ^= 1
+
+    results = matcher.query(query, top_k=3)
+
+    assert results[0]["product"] == "leche"
+    assert results[0]["votes"] >= 50
+    assert results[0]["score"] == results[0]["votes"] / len(query)
+    assert all(r["votes"] <= results[0]["votes"] for r in results)
+
+
+def test_lsh_matcher_without_products():
+    empty = VisionIndex(np.empty((0, DESCRIPTOR_SIZE), dtype=np.uint8), {})
+    matcher = LSHMatcher(empty)
+
+    assert matcher.query(np.zeros((4, DESCRIPTOR_SIZE), dtype=np.uint8)) == []